@@ -0,0 +1,316 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+from typing import Any, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import chess
+
+import chess_game
+from eval_cache import EvalCache
+from negamax import NegamaxSearch
+from search_stats import SearchStats
+from transposition import TranspositionTable
+
+DEFAULT_DEPTH = 4
+# Positions queued per worker beyond the one it is searching
+IN_FLIGHT_PER_WORKER = 2
+
+
+class AnalysisResult(NamedTuple):
+    fen: str
+    score: Optional[float]
+    move: Optional[str]
+    pv: List[str]
+    nodes: int
+    seconds: float
+    error: Optional[str] = None
+
+
+# A position to analyse with its own limits: (fen, depth, time_limit)
+Job = Tuple[str, int, Optional[float]]
+
+# Per-process search state set up by the pool initializer
+_worker_search: Optional[NegamaxSearch] = None
+_worker_stats: Optional[SearchStats] = None
+
+
+def _init_worker(table_entries: int, eval_cache: Optional[EvalCache] = None) -> None:
+    global _worker_search, _worker_stats
+    _worker_stats = SearchStats()
+    _worker_search = NegamaxSearch(
+        chess_game.ChessAdapter(eval_cache=eval_cache),
+        TranspositionTable(table_entries),
+        chess_game.ChessMoveOrderer(),
+        _worker_stats,
+    )
+
+
+def parse_job(line: str, depth: int = DEFAULT_DEPTH, time_limit: Optional[float] = None) -> Job:
+    """Read a FEN, or an EPD line whose depth and movetime (ms) operations override the limits."""
+    line = line.strip()
+    try:
+        board = chess.Board(line)
+    except ValueError:
+        board, operations = chess.Board.from_epd(line)
+        depth = int(operations.get("depth", depth))
+        if "movetime" in operations:
+            time_limit = float(operations["movetime"]) / 1000
+    return board.fen(), depth, time_limit
+
+
+def analyse_job(job: Job) -> AnalysisResult:
+    """Search one position in a worker; every position starts from empty search tables.
+
+    Cached leaf scores only depend on the position, so any evaluation cache
+    is kept and shared with the other workers.
+    """
+    fen, depth, time_limit = job
+    search, stats = _worker_search, _worker_stats
+    search.table.clear()
+    search.move_orderer.clear()
+    stats.reset()
+    board = chess.Board(fen)
+    start = time.perf_counter()
+    score, move, _ = search.iterate(board, board.turn == chess.WHITE, depth, time_limit)
+    return AnalysisResult(
+        fen,
+        score,
+        None if move is None else move.uci(),
+        [pv_move.uci() for pv_move in search.pv],
+        stats.nodes,
+        time.perf_counter() - start,
+    )
+
+
+def _parse_lines(
+    lines: Iterable[str], depth: int, time_limit: Optional[float]
+) -> Iterator[Tuple[Optional[Job], Optional[AnalysisResult]]]:
+    # Yields (job, None) for good lines and (None, failed result) for bad ones
+    for line in lines:
+        if not line.strip() or line.startswith("#"):
+            continue
+        try:
+            yield parse_job(line, depth, time_limit), None
+        except ValueError as error:
+            yield None, AnalysisResult(line.strip(), None, None, [], 0, 0.0, str(error))
+
+
+def _failed_job(job: Job, error: Exception) -> AnalysisResult:
+    # A search that raised in its worker is reported like a bad line, not raised into the stream
+    return AnalysisResult(job[0], None, None, [], 0, 0.0, str(error) or type(error).__name__)
+
+
+def _job_result(future: "Future[AnalysisResult]", job: Job) -> AnalysisResult:
+    try:
+        return future.result()
+    except Exception as error:
+        return _failed_job(job, error)
+
+
+def analyse_stream(
+    lines: Iterable[str],
+    depth: int = DEFAULT_DEPTH,
+    time_limit: Optional[float] = None,
+    workers: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    table_entries: int = 1 << 16,
+    eval_cache_entries: int = 0,
+) -> Iterator[AnalysisResult]:
+    """Analyse positions from lines across a process pool, yielding each result as it finishes.
+
+    Lines are read lazily and at most max_in_flight positions are submitted
+    at a time, so memory stays flat however long the input is and a slow
+    consumer holds back the reading. Results come in completion order. With
+    eval_cache_entries all workers share an evaluation cache of that size.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * IN_FLIGHT_PER_WORKER
+    eval_cache = EvalCache.create_shared(eval_cache_entries) if eval_cache_entries else None
+    try:
+        yield from _analyse_in_pool(lines, depth, time_limit, workers, max_in_flight, table_entries, eval_cache)
+    finally:
+        if eval_cache is not None:
+            eval_cache.close()
+
+
+def _analyse_in_pool(
+    lines: Iterable[str],
+    depth: int,
+    time_limit: Optional[float],
+    workers: int,
+    max_in_flight: int,
+    table_entries: int,
+    eval_cache: Optional[EvalCache],
+) -> Iterator[AnalysisResult]:
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(table_entries, eval_cache)
+    ) as pool:
+        # Job of each submitted search, by its future
+        pending = {}
+        for job, failed in _parse_lines(lines, depth, time_limit):
+            if failed is not None:
+                yield failed
+                continue
+            if len(pending) >= max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield _job_result(future, pending.pop(future))
+            pending[pool.submit(analyse_job, job)] = job
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield _job_result(future, pending.pop(future))
+
+
+def result_json(result: AnalysisResult) -> str:
+    return json.dumps(result._asdict())
+
+
+async def handle_client(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    pool: Executor,
+    depth: int,
+    time_limit: Optional[float],
+    max_in_flight: int,
+) -> None:
+    """Analyse the lines a client sends and write back one JSON result per line as each finishes."""
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(max_in_flight)
+    tasks = set()
+
+    async def run(job: Job) -> None:
+        try:
+            try:
+                result = await loop.run_in_executor(pool, analyse_job, job)
+            except Exception as error:
+                result = _failed_job(job, error)
+            writer.write((result_json(result) + "\n").encode())
+            await writer.drain()
+        finally:
+            slots.release()
+
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        for job, failed in _parse_lines([line.decode()], depth, time_limit):
+            if failed is not None:
+                writer.write((result_json(failed) + "\n").encode())
+                continue
+            # Stop reading from this client until one of its positions is done
+            await slots.acquire()
+            task = asyncio.ensure_future(run(job))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def serve(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    depth: int = DEFAULT_DEPTH,
+    time_limit: Optional[float] = None,
+    workers: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    table_entries: int = 1 << 16,
+    eval_cache_entries: int = 0,
+) -> None:
+    """Serve analyse_stream over TCP, with every client sharing one worker pool.
+
+    A client sends positions one per line, in the same formats as the CLI,
+    and half-closes its side when done; the results stream back as JSON lines.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * IN_FLIGHT_PER_WORKER
+    eval_cache = EvalCache.create_shared(eval_cache_entries) if eval_cache_entries else None
+    try:
+        # Workers start on demand; forked ones would inherit the open client
+        # sockets and keep them from closing, so they are spawned instead
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(table_entries, eval_cache),
+        ) as pool:
+            server = await asyncio.start_server(
+                lambda reader, writer: handle_client(reader, writer, pool, depth, time_limit, max_in_flight),
+                host,
+                port,
+            )
+            async with server:
+                await server.serve_forever()
+    finally:
+        if eval_cache is not None:
+            eval_cache.close()
+
+
+async def analyse_remote(lines: Iterable[str], host: str, port: int, output: Any = sys.stdout) -> None:
+    """Send lines to a running serve() and print the JSON results as they arrive."""
+    reader, writer = await asyncio.open_connection(host, port)
+
+    async def send() -> None:
+        for line in lines:
+            writer.write(line.rstrip("\n").encode() + b"\n")
+            await writer.drain()
+        writer.write_eof()
+
+    sender = asyncio.ensure_future(send())
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        output.write(line.decode())
+        output.flush()
+    await sender
+    writer.close()
+    await writer.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyse a stream of FEN or EPD positions.")
+    parser.add_argument("input", nargs="?", default="-", help='file of positions, "-" for stdin')
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    parser.add_argument("--time", type=float, default=None, help="seconds per position")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-in-flight", type=int, default=None, help="positions submitted but not yet reported")
+    parser.add_argument("--eval-cache", type=int, default=0, help="entries in an evaluation cache shared by the workers")
+    parser.add_argument("--serve", metavar="PORT", type=int, default=None, help="serve the analysis over TCP")
+    parser.add_argument("--connect", metavar="HOST:PORT", default=None, help="send the positions to a server")
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        asyncio.run(
+            serve(
+                "127.0.0.1",
+                args.serve,
+                args.depth,
+                args.time,
+                args.workers,
+                args.max_in_flight,
+                eval_cache_entries=args.eval_cache,
+            )
+        )
+        sys.exit(0)
+    source = sys.stdin if args.input == "-" else open(args.input)
+    try:
+        if args.connect is not None:
+            host, _, port = args.connect.rpartition(":")
+            asyncio.run(analyse_remote(source, host or "127.0.0.1", int(port)))
+        else:
+            results = analyse_stream(
+                source, args.depth, args.time, args.workers, args.max_in_flight, eval_cache_entries=args.eval_cache
+            )
+            for result in results:
+                print(result_json(result), flush=True)
+    finally:
+        if source is not sys.stdin:
+            source.close()
@@ -0,0 +1,131 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, List, NamedTuple, Optional, Sequence
+
+from negamax import NegamaxSearch
+from search_control import SearchBudget
+
+
+class SearchResult(NamedTuple):
+    score: float
+    move: Any
+    depth: int
+    pv: List[Any]
+    nodes: int
+    # Set when the search failed and move is only a legal fallback
+    error: Optional[str] = None
+
+
+class BackgroundSearch:
+    """Runs NegamaxSearch.iterate in a worker thread, one search at a time.
+
+    Finished searches are put on the results queue for the owning thread to
+    pick up, for example from a Tk after() callback, so the worker never
+    touches anything but the state it was given. Hand it a state it can own,
+    such as board.copy(). The search object, with its table and move orderer,
+    is reused by every search and must not be used elsewhere while one runs.
+
+    A ponder search runs without a deadline or node limit. ponder_hit() turns
+    it into the real search and starts its clock and node count; cancel()
+    throws it away. With on_result every finished search is handed to that
+    function, called from the worker thread, instead of being queued. A
+    search that raises still posts a result, with the first legal move and
+    the error, so whoever waits for a move gets one.
+    """
+
+    def __init__(self, search: NegamaxSearch, on_result: Optional[Callable[[SearchResult], None]] = None):
+        self.search = search
+        self.on_result = on_result
+        self.results: "queue.Queue[SearchResult]" = queue.Queue()
+        self.budget: Optional[SearchBudget] = None
+        self.pondering = False
+        self.time_limit: Optional[float] = None
+        self.node_limit: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._cancelled = False
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(
+        self,
+        state: Any,
+        is_maximizing_player: bool,
+        max_depth: int,
+        time_limit: Optional[float] = None,
+        ponder: bool = False,
+        pv: Sequence[Any] = (),
+        node_limit: Optional[int] = None,
+    ) -> None:
+        self.cancel()
+        self._cancelled = False
+        self.budget = SearchBudget(None if ponder else time_limit, None if ponder else node_limit)
+        self.pondering = ponder
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(state, is_maximizing_player, max_depth, self.budget, pv),
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _run(
+        self, state: Any, is_maximizing_player: bool, max_depth: int, budget: SearchBudget, pv: Sequence[Any]
+    ) -> None:
+        self.search.budget = budget
+        try:
+            score, move, depth = self.search.iterate(state, is_maximizing_player, max_depth, pv=pv)
+            result = SearchResult(score, move, depth, list(self.search.pv), budget.nodes)
+        except Exception as error:
+            result = self._failed_result(state, budget, error)
+        finally:
+            self.search.budget = None
+        if self._cancelled:
+            return
+        if self.on_result is not None:
+            self.on_result(result)
+        else:
+            self.results.put(result)
+
+    def _failed_result(self, state: Any, budget: SearchBudget, error: Exception) -> SearchResult:
+        # The search undoes its moves on the way out, so state is the root again
+        try:
+            moves = self.search.adapter.get_possible_moves(state)
+        except Exception:
+            moves = []
+        move = moves[0] if moves else None
+        return SearchResult(0.0, move, 0, [] if move is None else [move], budget.nodes, repr(error))
+
+    def ponder_hit(self) -> None:
+        """The predicted move was played: keep the ponder search as the real one."""
+        self.pondering = False
+        if self.budget is not None and self.time_limit is not None:
+            self.budget.deadline = time.monotonic() + self.time_limit
+        if self.budget is not None and self.node_limit is not None:
+            self.budget.node_limit = self.budget.nodes + self.node_limit
+
+    def stop(self) -> None:
+        """Finish now; the best move of the deepest completed iteration is still posted."""
+        if self.budget is not None:
+            self.budget.stop()
+
+    def wait(self) -> None:
+        """Block until the running search, if any, has posted its result."""
+        if self._thread is not None:
+            self._thread.join()
+
+    def cancel(self) -> None:
+        """Stop the running search and discard any result it posted."""
+        self._cancelled = True
+        self.stop()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.pondering = False
+        while True:
+            try:
+                self.results.get_nowait()
+            except queue.Empty:
+                break
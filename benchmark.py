@@ -0,0 +1,325 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import chess
+
+import chess_game
+import fastboard
+import tictactoe
+from move_ordering import MoveOrderer
+from negamax import GameAdapter, NegamaxSearch
+from search_stats import SearchStats
+from transposition import TranspositionTable
+
+# Standard perft positions with their known leaf counts for depth 1, 2, 3...
+PERFT_POSITIONS = [
+    ("start", chess.STARTING_FEN, [20, 400, 8902, 197281]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862]),
+    ("perft3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238]),
+    ("perft4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467]),
+    ("perft5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379]),
+    (
+        "perft6",
+        "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+        [46, 2079, 89890],
+    ),
+]
+
+DEFAULT_SUITE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bench.epd")
+
+# Tic-tac-toe positions row by row, "." for an empty cell; X moves when the counts are equal
+TICTACTOE_POSITIONS = [
+    ("empty", "........."),
+    ("corner", "X........"),
+    ("center", "....X...."),
+    ("fork-threat", "X...O...X"),
+    ("block", "XX..O...."),
+]
+
+# Relative drop in nodes per second past which compare() reports a regression
+NPS_THRESHOLD = 0.10
+
+
+def perft(state: Any, depth: int, get_possible_moves: Callable, make_move: Callable, undo_move: Callable) -> int:
+    """Count the leaf nodes of the legal move tree, through the same callbacks minimax uses."""
+    moves = get_possible_moves(state)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        make_move(state, move, True)
+        nodes += perft(state, depth - 1, get_possible_moves, make_move, undo_move)
+        undo_move(state, move, True)
+    return nodes
+
+
+def run_perft(max_depth: int = 3, fast_board: bool = False) -> List[Dict[str, Any]]:
+    results = []
+    for name, fen, expected in PERFT_POSITIONS:
+        depth = min(max_depth, len(expected))
+        if fast_board:
+            state = fastboard.FastBoard.from_board(chess.Board(fen))
+            callbacks = (fastboard.FastBoard.legal_moves, fastboard.make_move, fastboard.undo_move)
+        else:
+            state = chess.Board(fen)
+            callbacks = (chess_game.get_possible_moves, chess_game.make_move, chess_game.undo_move)
+        start = time.perf_counter()
+        nodes = perft(state, depth, *callbacks)
+        seconds = time.perf_counter() - start
+        results.append(
+            {
+                "id": name,
+                "depth": depth,
+                "nodes": nodes,
+                "expected": expected[depth - 1],
+                "ok": nodes == expected[depth - 1],
+                "seconds": seconds,
+                "nps": nodes / seconds if seconds else 0.0,
+            }
+        )
+    return results
+
+
+def search_position(
+    adapter: GameAdapter,
+    state: Any,
+    is_maximizing_player: bool,
+    depth: int,
+    table: Optional[TranspositionTable],
+    move_orderer: Optional[MoveOrderer],
+    search_options: Optional[Dict[str, bool]] = None,
+    format_move: Callable[[Any], str] = str,
+) -> Dict[str, Any]:
+    """Deepen one position to depth, timing each iteration and tracking the best move.
+
+    search_options are NegamaxSearch keyword arguments such as null_move=True.
+    """
+    stats = SearchStats()
+    search = NegamaxSearch(adapter, table, move_orderer, stats, **(search_options or {}))
+    time_to_depth = []
+    best_moves = []
+    score: Optional[float] = None
+    pv: List[Any] = []
+    start = time.perf_counter()
+    for current in range(1, depth + 1):
+        line: List[Any] = []
+        score, move = search.aspiration_search(state, current, is_maximizing_player, score, pv, line)
+        pv = line
+        time_to_depth.append(time.perf_counter() - start)
+        best_moves.append(format_move(move))
+    seconds = time_to_depth[-1]
+    changes = sum(best_moves[index] != best_moves[index - 1] for index in range(1, len(best_moves)))
+    return {
+        "depth": depth,
+        "score": score,
+        "best_move": best_moves[-1],
+        "best_moves": best_moves,
+        "best_move_changes": changes,
+        "nodes": stats.nodes,
+        "seconds": seconds,
+        "nps": stats.nodes / seconds if seconds else 0.0,
+        "time_to_depth": time_to_depth,
+        "ebf": stats.effective_branching_factor(),
+        "first_move_cutoff_rate": stats.first_move_cutoff_rate(),
+        "null_move_cutoffs": stats.null_move_cutoffs,
+        "reductions": stats.reductions,
+        "reduction_re_searches": stats.reduction_re_searches,
+        "aspiration_fails": stats.aspiration_fails,
+    }
+
+
+def load_suite(path: str) -> List[Tuple[str, chess.Board]]:
+    positions = []
+    with open(path) as suite:
+        for number, line in enumerate(suite, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            board, operations = chess.Board.from_epd(line)
+            positions.append((str(operations.get("id", number)), board))
+    return positions
+
+
+def run_chess(
+    suite_path: str = DEFAULT_SUITE,
+    depth: int = 3,
+    search_options: Optional[Dict[str, bool]] = None,
+    fast_board: bool = False,
+) -> List[Dict[str, Any]]:
+    results = []
+    for name, board in load_suite(suite_path):
+        # Fresh table and orderer per position so every entry is independent
+        if fast_board:
+            state = fastboard.FastBoard.from_board(board)
+            adapter, orderer, format_move = (
+                fastboard.FastBoardAdapter(), fastboard.FastMoveOrderer(), lambda move: str(state.to_chess_move(move))
+            )
+        else:
+            state, adapter, orderer, format_move = board, chess_game.ChessAdapter(), chess_game.ChessMoveOrderer(), str
+        record = search_position(
+            adapter,
+            state,
+            board.turn == chess.WHITE,
+            depth,
+            TranspositionTable(),
+            orderer,
+            search_options,
+            format_move,
+        )
+        record.update(id=name, fen=board.fen())
+        results.append(record)
+    return results
+
+
+def parse_tictactoe(cells: str) -> Tuple[List[List[str]], bool]:
+    board = [[" " if cell == "." else cell for cell in cells[row * 3:row * 3 + 3]] for row in range(3)]
+    return board, cells.count("X") == cells.count("O")
+
+
+def run_tictactoe(depth: int = 9) -> List[Dict[str, Any]]:
+    results = []
+    for name, cells in TICTACTOE_POSITIONS:
+        board, x_to_move = parse_tictactoe(cells)
+        record = search_position(
+            tictactoe.TicTacToeAdapter(),
+            tictactoe.TicTacToeBoard.from_list(board),
+            x_to_move,
+            depth,
+            TranspositionTable(),
+            MoveOrderer(),
+        )
+        record.update(id=name, cells=cells)
+        results.append(record)
+    return results
+
+
+def run_benchmark(
+    suite_path: str = DEFAULT_SUITE,
+    depth: int = 3,
+    perft_depth: int = 3,
+    tictactoe_depth: int = 9,
+    skip_perft: bool = False,
+    search_options: Optional[Dict[str, bool]] = None,
+    fast_board: bool = False,
+) -> Dict[str, Any]:
+    """Run every section; search_options and fast_board only apply to chess."""
+    start = time.perf_counter()
+    report: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "chess_version": chess.__version__,
+        "search_options": dict(search_options or {}),
+        "fast_board": fast_board,
+        "perft": [] if skip_perft else run_perft(perft_depth, fast_board),
+        "chess": run_chess(suite_path, depth, search_options, fast_board),
+        "tictactoe": run_tictactoe(tictactoe_depth),
+    }
+    for section in ("perft", "chess", "tictactoe"):
+        nodes = sum(entry["nodes"] for entry in report[section])
+        seconds = sum(entry["seconds"] for entry in report[section])
+        report[f"{section}_total"] = {"nodes": nodes, "seconds": seconds, "nps": nodes / seconds if seconds else 0.0}
+    report["seconds"] = time.perf_counter() - start
+    return report
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], threshold: float = NPS_THRESHOLD) -> List[str]:
+    """List the regressions of new against old.
+
+    Perft count mismatches are always regressions. Speed is compared on each
+    section's total, as single positions finish too quickly to time reliably,
+    and regresses when it drops by more than threshold. A search entry also
+    regresses when it needs more nodes or picks a different best move at the
+    same depth, which means the search itself changed rather than its speed.
+    """
+    problems = []
+    for entry in new.get("perft", []):
+        if not entry["ok"]:
+            problems.append(f"perft {entry['id']}: {entry['nodes']} nodes, expected {entry['expected']}")
+    for section in ("perft", "chess", "tictactoe"):
+        before_total = old.get(f"{section}_total", {}).get("nps")
+        after_total = new.get(f"{section}_total", {}).get("nps")
+        if before_total and after_total and after_total < before_total * (1 - threshold):
+            problems.append(f"{section}: {after_total:.0f} nps, was {before_total:.0f}")
+        if section == "perft":
+            continue
+        before = {entry["id"]: entry for entry in old.get(section, [])}
+        for entry in new.get(section, []):
+            previous = before.get(entry["id"])
+            if previous is None or previous["depth"] != entry["depth"]:
+                continue
+            label = f"{section} {entry['id']}"
+            if entry["nodes"] > previous["nodes"]:
+                problems.append(f"{label}: {entry['nodes']} nodes, was {previous['nodes']}")
+            if entry["best_move"] != previous["best_move"]:
+                problems.append(f"{label}: best move {entry['best_move']}, was {previous['best_move']}")
+    return problems
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    for entry in report["perft"]:
+        status = "ok" if entry["ok"] else f"FAIL (expected {entry['expected']})"
+        print(f"perft {entry['id']:<16} d{entry['depth']} {entry['nodes']:>9} {entry['nps']:>9.0f} nps {status}")
+    for section in ("chess", "tictactoe"):
+        for entry in report[section]:
+            print(
+                f"{section:<9} {entry['id']:<16} d{entry['depth']} {entry['nodes']:>9} {entry['nps']:>9.0f} nps "
+                f"{entry['seconds']:.2f}s {entry['best_move']} changes {entry['best_move_changes']}"
+            )
+    for section in ("perft", "chess", "tictactoe"):
+        total = report[f"{section}_total"]
+        print(f"{section} total: {total['nodes']} nodes {total['seconds']:.2f}s {total['nps']:.0f} nps")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perft, search speed and best-move benchmarks.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="run the benchmark")
+    run.add_argument("--suite", default=DEFAULT_SUITE, help="EPD file of search positions")
+    run.add_argument("--depth", type=int, default=3, help="chess search depth")
+    run.add_argument("--perft-depth", type=int, default=3)
+    run.add_argument("--tictactoe-depth", type=int, default=9)
+    run.add_argument("--skip-perft", action="store_true")
+    run.add_argument("--output", default=None, help="JSON file to write the results to")
+    run.add_argument("--null-move", action="store_true", help="null-move pruning in the chess searches")
+    run.add_argument("--reductions", action="store_true", help="late-move reductions in the chess searches")
+    run.add_argument("--aspiration", action="store_true", help="aspiration windows in the chess searches")
+    run.add_argument("--no-pvs", action="store_true", help="full-window search of every move")
+    run.add_argument("--fast-board", action="store_true", help="perft and chess searches on fastboard.FastBoard")
+    check = commands.add_parser("compare", help="flag regressions between two result files")
+    check.add_argument("old")
+    check.add_argument("new")
+    check.add_argument("--threshold", type=float, default=NPS_THRESHOLD, help="allowed relative drop in nps")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        search_options = {
+            "pvs": not args.no_pvs,
+            "null_move": args.null_move,
+            "reductions": args.reductions,
+            "aspiration": args.aspiration,
+        }
+        report = run_benchmark(
+            args.suite,
+            args.depth,
+            args.perft_depth,
+            args.tictactoe_depth,
+            args.skip_perft,
+            search_options,
+            args.fast_board,
+        )
+        print_report(report)
+        if args.output:
+            with open(args.output, "w") as output:
+                json.dump(report, output, indent=2)
+    else:
+        with open(args.old) as old_file, open(args.new) as new_file:
+            problems = compare(json.load(old_file), json.load(new_file), args.threshold)
+        for problem in problems:
+            print(problem)
+        print(f"{len(problems)} regression(s)")
+        sys.exit(1 if problems else 0)
@@ -1,8 +1,18 @@
 import chess
-from typing import List
+import chess.polyglot
+import json
+import math
+from functools import partial
+from typing import List, Optional, Tuple
 import random
-from minimax import minimax
-from tqdm import tqdm
+from eval_cache import EvalCache
+from game_session import GameSession
+from move_ordering import MoveOrderer
+from negamax import GameAdapter, NegamaxSearch, profile_adapter
+from opening_book import OpeningBook
+from tablebase import Tablebase
+from search_stats import SearchStats
+from transposition import TranspositionTable
 
 def get_possible_moves(state: chess.Board) -> List[chess.Move]:
     return list(state.legal_moves)
@@ -18,11 +28,67 @@ def make_move(
 
 def undo_move(state: chess.Board, move: chess.Move, is_maximizing_player: bool) -> None:
     state.pop()
+
+# Pass the turn, for null-move pruning
+def make_null_move(state: chess.Board) -> None:
+    state.push(chess.Move.null())
+
+def undo_null_move(state: chess.Board) -> None:
+    state.pop()
+
+# Passing is never legal in check and is not tried twice in a row. With only
+# king and pawns left zugzwang is common, so a pass proves nothing there.
+def null_move_allowed(state: chess.Board) -> bool:
+    if state.is_check() or (state.move_stack and not state.move_stack[-1]):
+        return False
+    return bool(state.occupied_co[state.turn] & ~(state.pawns | state.kings))
+
+# Late quiet moves may be searched at reduced depth; captures, promotions,
+# checks and evasions never are
+def can_reduce(state: chess.Board, move: chess.Move) -> bool:
+    if move.promotion is not None or state.is_capture(move) or state.is_check():
+        return False
+    return not state.gives_check(move)
     
 def is_game_over(state: chess.Board) -> bool:
     return state.is_game_over()
 
-#@cached
+# Zobrist key of the position, usable with minimax's transposition table
+def hash_key(state: chess.Board) -> int:
+    return chess.polyglot.zobrist_hash(state)
+
+# Piece values used to rank captures by most valuable victim, least valuable attacker
+MVV_LVA_VALUES = {
+    chess.PAWN: 1,
+    chess.KNIGHT: 3,
+    chess.BISHOP: 3,
+    chess.ROOK: 5,
+    chess.QUEEN: 9,
+    chess.KING: 10,
+}
+
+class ChessMoveOrderer(MoveOrderer):
+    """Hash move, MVV-LVA captures and promotions, killers, then history."""
+
+    def move_key(self, state: chess.Board, move: chess.Move) -> int:
+        # History is kept per side to move and from/to square pair
+        return (state.turn << 12) | (move.from_square << 6) | move.to_square
+
+    def score_move(self, state: chess.Board, move: chess.Move) -> int:
+        return mvv_lva_score(state, move)
+
+# Positive score for captures and promotions, 0 for quiet moves
+def mvv_lva_score(state: chess.Board, move: chess.Move) -> int:
+    score = 0
+    if move.promotion is not None:
+        score += 10 * MVV_LVA_VALUES[move.promotion]
+    if state.is_capture(move):
+        # En passant leaves the target square empty, the victim is a pawn
+        victim = state.piece_type_at(move.to_square) or chess.PAWN
+        attacker = state.piece_type_at(move.from_square)
+        score += 10 * MVV_LVA_VALUES[victim] - MVV_LVA_VALUES[attacker] + 10
+    return score
+
 def evaluate_board(state: chess.Board) -> float:
     # Check if the game is over
     if state.is_game_over():
@@ -33,8 +99,10 @@ def evaluate_board(state: chess.Board) -> float:
             return -1000.0
         elif result == '1/2-1/2':  # Draw
             return 0.0
+    return evaluate_position(state)
 
-    # Evaluation for the ongoing game
+# Evaluation for the ongoing game, without checking whether it is over
+def evaluate_position(state: chess.Board) -> float:
     piece_values = {
         chess.PAWN: 1,
         chess.KNIGHT: 3,
@@ -76,6 +144,307 @@ def evaluate_board(state: chess.Board) -> float:
     return score
 
 
+# Piece-square tables that reproduce evaluate_board's ongoing-game terms.
+# Indexed [color][piece_type][square], black entries are negative.
+def build_piece_square_tables(
+    piece_values=None, center_bonus=0.001, pawn_rank_bonus=0.001
+) -> List[List[List[float]]]:
+    if piece_values is None:
+        piece_values = {
+            chess.PAWN: 1,
+            chess.KNIGHT: 3,
+            chess.BISHOP: 3,
+            chess.ROOK: 5,
+            chess.QUEEN: 9,
+        }
+    tables = [[[0.0] * 64 for _ in range(7)] for _ in range(2)]
+    for piece_type in chess.PIECE_TYPES:
+        for square in chess.SQUARES:
+            value = piece_values.get(piece_type, 0)
+            if square in [24, 40]:
+                value += center_bonus
+            if piece_type == chess.PAWN:
+                value += pawn_rank_bonus * chess.square_rank(square)
+            tables[chess.WHITE][piece_type][square] = value
+            tables[chess.BLACK][piece_type][square] = -value
+    return tables
+
+PIECE_SQUARE_TABLES = build_piece_square_tables()
+
+# Tables written by eval_tuning, in the layout of PIECE_SQUARE_TABLES
+def load_piece_square_tables(path: str) -> List[List[List[float]]]:
+    with open(path) as file:
+        return json.load(file)["tables"]
+
+# Full O(64) evaluation of the piece-square terms, used to seed running totals
+def piece_square_score(state: chess.Board, tables=PIECE_SQUARE_TABLES) -> float:
+    score = 0.0
+    for square, piece in state.piece_map().items():
+        score += tables[piece.color][piece.piece_type][square]
+    return score
+
+# Change in piece-square score caused by a legal move, computed before it is pushed
+def move_delta(state: chess.Board, move: chess.Move, tables=PIECE_SQUARE_TABLES) -> float:
+    own = tables[state.turn]
+    opponent = tables[not state.turn]
+    from_square = move.from_square
+    to_square = move.to_square
+    piece_type = state.piece_type_at(from_square)
+    delta = own[move.promotion or piece_type][to_square] - own[piece_type][from_square]
+    if piece_type == chess.KING and abs(to_square - from_square) == 2:
+        # Castling also moves the rook: h-file to f-file or a-file to d-file
+        rank_start = from_square & ~7
+        if to_square > from_square:
+            delta += own[chess.ROOK][rank_start + 5] - own[chess.ROOK][rank_start + 7]
+        else:
+            delta += own[chess.ROOK][rank_start + 3] - own[chess.ROOK][rank_start]
+    elif piece_type == chess.PAWN and to_square == state.ep_square:
+        # The pawn taken en passant sits beside the capturing pawn
+        captured_square = (from_square & ~7) | (to_square & 7)
+        delta -= opponent[chess.PAWN][captured_square]
+    else:
+        captured = state.piece_type_at(to_square)
+        if captured is not None:
+            delta -= opponent[captured][to_square]
+    return delta
+
+
+class IncrementalEvaluator:
+    """Evaluation mode that keeps the piece-square score as a running total.
+
+    Use its make_move, undo_move and evaluate_board in place of the module
+    functions for a search rooted at the board passed to reset(). Each move
+    updates the total from its delta, so a leaf costs O(1) instead of a scan
+    of all 64 squares. With check=True every leaf is also evaluated from
+    scratch and a mismatch raises AssertionError.
+    """
+
+    def __init__(self, state: chess.Board, tables=None, check: bool = False):
+        self.tables = PIECE_SQUARE_TABLES if tables is None else tables
+        self.check = check
+        self.reset(state)
+
+    def reset(self, state: chess.Board) -> None:
+        self.scores = [piece_square_score(state, self.tables)]
+
+    def make_move(self, state: chess.Board, move: chess.Move, is_maximizing_player: bool) -> None:
+        self.scores.append(self.scores[-1] + move_delta(state, move, self.tables))
+        state.push(move)
+
+    def undo_move(self, state: chess.Board, move: chess.Move, is_maximizing_player: bool) -> None:
+        state.pop()
+        self.scores.pop()
+
+    def make_null_move(self, state: chess.Board) -> None:
+        self.scores.append(self.scores[-1])
+        state.push(chess.Move.null())
+
+    def undo_null_move(self, state: chess.Board) -> None:
+        state.pop()
+        self.scores.pop()
+
+    def evaluate_board(self, state: chess.Board) -> float:
+        if state.is_game_over():
+            return evaluate_board(state)
+        return self.evaluate_position(state)
+
+    def evaluate_position(self, state: chess.Board) -> float:
+        score = self.scores[-1]
+        if self.check:
+            if self.tables is PIECE_SQUARE_TABLES:
+                expected = evaluate_position(state)
+            else:
+                expected = piece_square_score(state, self.tables)
+            if not math.isclose(score, expected, abs_tol=1e-9):
+                raise AssertionError(
+                    f"incremental score {score} != full score {expected} for {state.fen()}"
+                )
+        return score
+
+
+class QuiescenceEvaluator:
+    """Quiescence search that resolves captures and promotions at the horizon.
+
+    Pass its quiescence method to minimax, which calls it at depth 0 with the
+    current alpha-beta window. From there it searches captures and promotions
+    only, standing pat on the static score and skipping captures that cannot
+    lift the score back to alpha even with delta_margin to spare. max_ply
+    caps how deep the capture sequences may go. make_move, undo_move and
+    evaluate_board default to the module functions; pass an
+    IncrementalEvaluator's methods to use it instead.
+    """
+
+    def __init__(
+        self,
+        make_move=make_move,
+        undo_move=undo_move,
+        evaluate_board=evaluate_board,
+        max_ply: int = 8,
+        delta_margin: float = 2.0,
+    ):
+        self.make_move = make_move
+        self.undo_move = undo_move
+        self.static_evaluation = evaluate_board
+        self.max_ply = max_ply
+        self.delta_margin = delta_margin
+
+    def quiescence(self, state: chess.Board, alpha: float, beta: float) -> float:
+        # minimax scores from White's view, the search from the side to move's
+        if state.turn == chess.WHITE:
+            return self.search(state, alpha, beta, 0)
+        return -self.search(state, -beta, -alpha, 0)
+
+    def evaluate_board(self, state: chess.Board) -> float:
+        return self.quiescence(state, float("-inf"), float("inf"))
+
+    def tactical_moves(self, state: chess.Board) -> List[chess.Move]:
+        moves = list(state.generate_legal_captures())
+        promotion_rank = chess.BB_RANK_7 if state.turn == chess.WHITE else chess.BB_RANK_2
+        # Pawn pushes from the seventh rank are the non-capturing promotions
+        moves.extend(state.generate_legal_moves(state.pawns & promotion_rank, ~state.occupied))
+        moves.sort(key=lambda move: mvv_lva_score(state, move), reverse=True)
+        return moves
+
+    def search(self, state: chess.Board, alpha: float, beta: float, ply: int) -> float:
+        sign = 1 if state.turn == chess.WHITE else -1
+        stand_pat = sign * self.static_evaluation(state)
+        if stand_pat >= beta or ply >= self.max_ply:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        is_white = state.turn == chess.WHITE
+        for move in self.tactical_moves(state):
+            if move.promotion is None:
+                victim = state.piece_type_at(move.to_square) or chess.PAWN
+                if stand_pat + MVV_LVA_VALUES[victim] + self.delta_margin < alpha:
+                    continue
+            self.make_move(state, move, is_white)
+            score = -self.search(state, -beta, -alpha, ply + 1)
+            self.undo_move(state, move, is_white)
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+
+# Score of a finished game from White's view, or None while it goes on. Same
+# outcomes as is_game_over(), but the legal-move check is left to the caller
+# and the costly draw rules only run when they could apply.
+def terminal_score(state: chess.Board, has_legal_moves: bool) -> Optional[float]:
+    if not has_legal_moves:
+        if state.is_check():
+            return -1000.0 if state.turn == chess.WHITE else 1000.0
+        return 0.0
+    if not (state.pawns | state.rooks | state.queens) and state.is_insufficient_material():
+        return 0.0
+    if state.halfmove_clock >= 150:
+        return 0.0
+    # Five occurrences of a position take at least 16 reversible plies
+    if state.halfmove_clock >= 16 and state.is_fivefold_repetition():
+        return 0.0
+    return None
+
+# Key for caching leaf scores. Repetition and the 75-move rule make the score
+# depend on more than the position, so positions where they could apply are
+# not cached. The key hashes the bitboards directly, which is far cheaper than
+# a Zobrist hash. Only integers go into it, since they hash the same in every
+# process; None does not before Python 3.12, so a missing ep square is -1.
+def eval_cache_key(state: chess.Board) -> Optional[int]:
+    if state.halfmove_clock >= 16:
+        return None
+    ep_square = -1 if state.ep_square is None else state.ep_square
+    return hash((
+        state.pawns, state.knights, state.bishops, state.rooks, state.queens, state.kings,
+        state.occupied_co[chess.WHITE], int(state.turn), state.castling_rights, ep_square,
+    ))
+
+# Legal moves and terminal score from a single move generation
+def expand(state: chess.Board) -> Tuple[List[chess.Move], Optional[float]]:
+    moves = list(state.generate_legal_moves())
+    return moves, terminal_score(state, bool(moves))
+
+
+class ChessAdapter(GameAdapter):
+    """The functions of this module as one adapter for negamax.NegamaxSearch.
+
+    Interior nodes are expanded with a single legal-move generation and leaves
+    only look for one legal move before scoring. With incremental=True the
+    search runs on an IncrementalEvaluator that is reset at the root of every
+    search; quiescence_plies > 0 adds a QuiescenceEvaluator at the leaves.
+    An eval_cache keeps leaf scores across searches and, when it lives in
+    shared memory, across processes. With a tablebase, positions it covers
+    are scored from it at the leaves and treated as finished games below the
+    root, so the root's moves are ranked by their exact distance to mate.
+    The null-move and reduction hooks let NegamaxSearch search selectively.
+    tables replaces PIECE_SQUARE_TABLES, e.g. with load_piece_square_tables().
+    """
+
+    def __init__(
+        self,
+        incremental: bool = True,
+        quiescence_plies: int = 0,
+        eval_cache: Optional[EvalCache] = None,
+        tablebase: Optional[Tablebase] = None,
+        tables=None,
+    ):
+        self.get_possible_moves = get_possible_moves
+        self.is_game_over = is_game_over
+        self.hash_key = hash_key
+        self.expand = expand
+        self.null_move_allowed = null_move_allowed
+        self.can_reduce = can_reduce
+        self.evaluator = IncrementalEvaluator(chess.Board(), tables) if incremental else None
+        if self.evaluator is not None:
+            self.make_move = self.evaluator.make_move
+            self.undo_move = self.evaluator.undo_move
+            self.make_null_move = self.evaluator.make_null_move
+            self.undo_null_move = self.evaluator.undo_null_move
+            self.evaluate_position = self.evaluator.evaluate_position
+        else:
+            self.make_move = make_move
+            self.undo_move = undo_move
+            self.make_null_move = make_null_move
+            self.undo_null_move = undo_null_move
+            self.evaluate_position = evaluate_position if tables is None else partial(piece_square_score, tables=tables)
+        self.tablebase = tablebase
+        self.root_plies = 0
+        if tablebase is not None:
+            self.expand = self.expand_with_tablebase
+            self.evaluate_board = self.evaluate_with_tablebase
+        if eval_cache is not None:
+            self.evaluate_board = eval_cache.wrap(self.evaluate_board, eval_cache_key)
+        self.quiescence = None
+        if quiescence_plies > 0:
+            self.quiescence = QuiescenceEvaluator(
+                self.make_move, self.undo_move, self.evaluate_board, max_ply=quiescence_plies
+            ).quiescence
+
+    def start_search(self, state: chess.Board) -> None:
+        self.root_plies = len(state.move_stack)
+        if self.evaluator is not None:
+            self.evaluator.reset(state)
+
+    def evaluate_board(self, state: chess.Board) -> float:
+        # A leaf only needs to know whether one legal move exists
+        score = terminal_score(state, any(state.generate_legal_moves()))
+        if score is not None:
+            return score
+        return self.evaluate_position(state)
+
+    def evaluate_with_tablebase(self, state: chess.Board) -> float:
+        score = self.tablebase.score(state)
+        if score is not None:
+            return score
+        return ChessAdapter.evaluate_board(self, state)
+
+    def expand_with_tablebase(self, state: chess.Board) -> Tuple[List[chess.Move], Optional[float]]:
+        # The root is always expanded so the search has a move to return
+        if len(state.move_stack) != self.root_plies:
+            score = self.tablebase.score(state)
+            if score is not None:
+                return [], score
+        return expand(state)
+
+
 # Function to simulate a random opponent move
 def random_opponent_move(state: chess.Board) -> chess.Move:
     legal_moves = list(state.legal_moves)
@@ -85,24 +454,17 @@ def random_opponent_move(state: chess.Board) -> chess.Move:
 # Function to play a single game
 def play_game_random_opponent(depth) -> float:
     state = chess.Board()
+    # The session carries the table and the expected line from move to move
+    session = GameSession(NegamaxSearch(ChessAdapter(), TranspositionTable(), ChessMoveOrderer()), depth)
     is_maximizing_player = True
     while not state.is_game_over():
         if is_maximizing_player:
-            eval, move = minimax(
-                state,
-                get_possible_moves,
-                make_move,
-                undo_move,
-                is_game_over,
-                evaluate_board,
-                depth=depth,
-                is_maximizing_player=True,
-            )
+            move = session.choose_move(state, is_maximizing_player=True)
             #display_board(state)
-            #print(eval)
         else:
             move = random_opponent_move(state)
         state.push(move)
+        session.played(move)
         is_maximizing_player = not is_maximizing_player
 
     result = state.result()
@@ -116,24 +478,24 @@ def play_game_random_opponent(depth) -> float:
     else:
         return 0.0  # Draw
 
-def test_against_random(N, depth=2):
-    # Run 100 games
-    ai_wins = 0
-    opponent_wins = 0
-    draws = 0
-    for _ in tqdm(range(N)):
-        result = play_game_random_opponent(depth)
-        if result == 1.0:
-            ai_wins += 1
-        elif result == -1.0:
-            opponent_wins += 1
-        else:
-            draws += 1
+def test_against_random(N, depth=2, workers=None, seed=0):
+    # Imported here because the match runner itself builds on this module
+    from match_runner import EngineConfig, run_match
+
+    summary = run_match(
+        "chess",
+        EngineConfig(name="minimax", depth=depth),
+        EngineConfig(name="random", random=True),
+        N,
+        workers=workers,
+        seed=seed,
+        alternate_colors=False,
+    )
 
     # Print the results
-    print("AI wins:", ai_wins)
-    print("Opponent wins:", opponent_wins)
-    print("Draws:", draws)
+    print("AI wins:", summary["wins"])
+    print("Opponent wins:", summary["losses"])
+    print("Draws:", summary["draws"])
 
 
 # Function to display the chessboard with Unicode piece representation
@@ -176,8 +538,19 @@ def parse_user_input(move_str: str) -> chess.Move:
     return chess.Move(square_from, square_to)
 
 # Function to play a single game against a human player
-def play_game(depth) -> float:
+def play_game(depth, time_limit=None, profile=False, book_path=None, tablebase_directory=None) -> float:
     state = chess.Board()
+    # Play from the opening book until the game leaves it
+    book = OpeningBook(book_path) if book_path else None
+    # Endgames covered by the tablebase are played perfectly
+    tablebase = Tablebase(tablebase_directory) if tablebase_directory else None
+    # With profile the search statistics of every CPU move are printed
+    stats = SearchStats() if profile else None
+    search = NegamaxSearch(
+        profile_adapter(ChessAdapter(tablebase=tablebase), stats), TranspositionTable(), ChessMoveOrderer(), stats
+    )
+    # Searches build on the previous move's, and a predicted reply is answered at once
+    session = GameSession(search, depth, time_limit)
     is_human_turn = True
     while not state.is_game_over():
         if is_human_turn:
@@ -189,9 +562,22 @@ def play_game(depth) -> float:
                 user_move_str = input("Enter your move (e.g., 'e2e4'): ")
                 user_move = parse_user_input(user_move_str)
             move = user_move
+        elif book is not None and (move := book.choose_move(state, random)) is not None:
+            print(f"Book move {move}")
+        elif tablebase is not None and (move := tablebase.best_move(state)) is not None:
+            print(f"Tablebase move {move}")
         else:
-            move = minimax(state, get_possible_moves, make_move, undo_move, is_game_over, evaluate_board, depth=depth, is_maximizing_player=False)[1]
+            # Deepen until the time budget, if any, runs out, never past depth
+            move = session.choose_move(state, is_maximizing_player=False)
+            metrics = session.metrics[-1]
+            if metrics.instant:
+                print(f"Expected reply, {move} played at once")
+            elif stats is not None:
+                print(f"{move}: {stats.summary()} reused_nodes={metrics.reused_nodes}")
+        if stats is not None and not is_human_turn:
+            stats.reset()
         state.push(move)
+        session.played(move)
         is_human_turn = not is_human_turn
 
     result = state.result()
@@ -1,8 +1,16 @@
 import chess
+import queue
+import random
 import tkinter as tk
 from PIL import ImageTk, Image
-from functools import partial
-from minimax import minimax
+from functools import lru_cache, partial
+from background_search import BackgroundSearch
+from game_session import GameSession
+from negamax import NegamaxSearch, profile_adapter
+from opening_book import OpeningBook
+from search_stats import SearchStats
+from tablebase import Tablebase
+from transposition import TranspositionTable
 import chess_game
 import time
 from playsound import playsound
@@ -12,14 +20,56 @@ from tkinter import messagebox
 # Constants
 BOARD_SIZE = 800
 SQUARE_SIZE = BOARD_SIZE // 8
+# How often the event loop checks on a running CPU search, in milliseconds
+POLL_INTERVAL = 50
+TITLE = "Chess Game"
+
+
+# Decoded and resized piece images are kept for the life of the process, so a
+# new window or a new square size never reads the same PNG twice
+@lru_cache(maxsize=None)
+def decode_image(path):
+    image = Image.open(path)
+    image.load()
+    return image
+
+
+@lru_cache(maxsize=None)
+def resized_image(path, size):
+    return decode_image(path).resize((size, size), Image.ANTIALIAS)
+
 
 # Create the chessboard GUI
 class ChessUI(tk.Tk):
-    def __init__(self, depth=3):
+    def __init__(self, depth=3, time_limit=None, ponder=True, profile=False, book_path=None, tablebase_directory=None):
         super().__init__()
         #self.root = tk.Tk()
         self.depth = depth
-        self.title("Chess Game")
+        # Seconds per CPU move; None searches the full depth every time
+        self.time_limit = time_limit
+        self.table = TranspositionTable()
+        self.move_orderer = chess_game.ChessMoveOrderer()
+        # With profile the search statistics of every CPU move are printed
+        self.stats = SearchStats() if profile else None
+        # Endgames covered by the tablebase are played perfectly
+        self.tablebase = Tablebase(tablebase_directory) if tablebase_directory else None
+        self.search = NegamaxSearch(
+            profile_adapter(chess_game.ChessAdapter(tablebase=self.tablebase), self.stats),
+            self.table,
+            self.move_orderer,
+            self.stats,
+        )
+        # CPU moves are searched in a worker thread so the window stays responsive
+        self.background = BackgroundSearch(self.search)
+        # Carries the expected line between moves and answers predicted replies at once
+        self.session = GameSession(self.search, depth, time_limit)
+        # Search the human's expected reply while they think
+        self.ponder = ponder
+        self.predicted_move = None
+        self.thinking = False
+        # Opening moves come straight from the book while the game is in it
+        self.book = OpeningBook(book_path) if book_path else None
+        self.title(TITLE)
         self.geometry(f"{BOARD_SIZE}x{BOARD_SIZE}")
 
         # Create the chessboard canvas
@@ -27,6 +77,7 @@ class ChessUI(tk.Tk):
         self.canvas.pack(side=tk.LEFT)
 
         # Load chess piece images
+        self.photo_images = {}
         self.piece_images = {
             chess.PAWN: {
                 chess.WHITE: self.load_image("images/pawn_white.png"),
@@ -65,58 +116,92 @@ class ChessUI(tk.Tk):
         self.board = chess.Board()
         self.selected_piece = None
         self.evaluation = 0.5
+        self.target_cache = {}
 
         # Draw the initial chessboard
+        self.create_board_items()
         self.draw_board()
 
         # Bind the click event to handle moves
         self.canvas.bind("<Button-1>", self.handle_click)
+        # Escape makes the CPU play the best move it has found so far
+        self.bind("<Escape>", self.move_now)
         
 
-    def load_image(self, path):
-        image = Image.open(path)
-        image = image.resize((SQUARE_SIZE, SQUARE_SIZE), Image.ANTIALIAS)
-        return ImageTk.PhotoImage(image)
+    def load_image(self, path, size=SQUARE_SIZE):
+        # PhotoImages belong to this window, the decoded pixels are shared
+        key = (path, size)
+        if key not in self.photo_images:
+            self.photo_images[key] = ImageTk.PhotoImage(resized_image(path, size))
+        return self.photo_images[key]
+
+    def create_board_items(self):
+        # Every canvas item is created once here; draw_board only reconfigures them
+        self.piece_items = {}
+        self.target_items = {}
+        self.rendered_pieces = {}
+        self.highlighted = set()
+        for square in chess.SQUARES:
+            x1, y1 = self.square_origin(square)
+            row = 7 - chess.square_rank(square)
+            color = "#FFFACD" if (row + chess.square_file(square)) % 2 == 0 else "#7D946C"
+            self.canvas.create_rectangle(x1, y1, x1 + SQUARE_SIZE, y1 + SQUARE_SIZE, fill=color)
+        for square in chess.SQUARES:
+            x1, y1 = self.square_origin(square)
+            self.piece_items[square] = self.canvas.create_image(x1, y1, anchor=tk.NW)
+        for square in chess.SQUARES:
+            x1, y1 = self.square_origin(square)
+            self.target_items[square] = self.canvas.create_rectangle(
+                x1, y1, x1 + SQUARE_SIZE, y1 + SQUARE_SIZE, outline="yellow", width=4, state=tk.HIDDEN
+            )
+        self.selection_item = self.canvas.create_rectangle(
+            0, 0, SQUARE_SIZE, SQUARE_SIZE, outline="blue", width=4, state=tk.HIDDEN
+        )
+
+    def square_origin(self, square):
+        return chess.square_file(square) * SQUARE_SIZE, (7 - chess.square_rank(square)) * SQUARE_SIZE
+
+    def legal_targets(self):
+        # Target squares by from square, worked out once per position
+        key = chess_game.hash_key(self.board)
+        targets = self.target_cache.get(key)
+        if targets is None:
+            targets = {}
+            for move in self.board.legal_moves:
+                targets.setdefault(move.from_square, set()).add(move.to_square)
+            self.target_cache[key] = targets
+        return targets
 
     def draw_board(self):
-        self.canvas.delete("all")
-        for rank in range(8):
-            for file in range(8):
-                x1 = file * SQUARE_SIZE
-                y1 = rank * SQUARE_SIZE
-                x2 = x1 + SQUARE_SIZE
-                y2 = y1 + SQUARE_SIZE
-
-                color = "#FFFACD" if (rank + file) % 2 == 0 else "#7D946C"
-                self.canvas.create_rectangle(x1, y1, x2, y2, fill=color)
-
-                square = chess.square(file, 7 - rank)
-                piece = self.board.piece_at(square)
-                if piece:
-                    image = self.piece_images[piece.piece_type][piece.color]
-                    self.canvas.create_image(x1, y1, anchor=tk.NW, image=image)
-                #print(f"Chosen piece square {self.selected_piece}, check with {square}")
-                if self.selected_piece == square:
-                    print("MATCH", self.selected_piece, square)
-                    self.canvas.create_rectangle(x1, y1, x2, y2, outline="blue", width=4)
-                    moves = self.board.legal_moves
-                    for move in moves:
-                        if move.from_square == self.selected_piece:
-                            print(f"FROM possibility {move.from_square}, selected {self.selected_piece}")
-                            target_square = move.to_square
-                            target_rank = 7 - chess.square_rank(target_square)
-                            target_file = chess.square_file(target_square)
-                            target_x1 = target_file * SQUARE_SIZE
-                            target_y1 = target_rank * SQUARE_SIZE
-                            target_x2 = target_x1 + SQUARE_SIZE
-                            target_y2 = target_y1 + SQUARE_SIZE
-                            self.canvas.create_rectangle(target_x1, target_y1, target_x2, target_y2, outline="yellow", width=4)
+        # Only squares whose piece changed since the last draw are touched
+        pieces = self.board.piece_map()
+        for square in set(pieces) | set(self.rendered_pieces):
+            piece = pieces.get(square)
+            if piece != self.rendered_pieces.get(square):
+                image = "" if piece is None else self.piece_images[piece.piece_type][piece.color]
+                self.canvas.itemconfigure(self.piece_items[square], image=image)
+        self.rendered_pieces = pieces
+
+        if self.selected_piece is None:
+            self.canvas.itemconfigure(self.selection_item, state=tk.HIDDEN)
+            targets = set()
+        else:
+            x1, y1 = self.square_origin(self.selected_piece)
+            self.canvas.coords(self.selection_item, x1, y1, x1 + SQUARE_SIZE, y1 + SQUARE_SIZE)
+            self.canvas.itemconfigure(self.selection_item, state=tk.NORMAL)
+            targets = self.legal_targets().get(self.selected_piece, set())
+        for square in targets ^ self.highlighted:
+            state = tk.NORMAL if square in targets else tk.HIDDEN
+            self.canvas.itemconfigure(self.target_items[square], state=state)
+        self.highlighted = set(targets)
 
         if self.board.is_game_over():
             print("Game over")
             return
 
     def handle_click(self, event):
+        if self.thinking:
+            return
         rank = event.y // SQUARE_SIZE
         file = event.x // SQUARE_SIZE
         square = chess.square(file, 7 - rank)
@@ -159,6 +244,7 @@ class ChessUI(tk.Tk):
                     #     self.board.push(chess.Move.from_uci(move.uci() + "q"))
                     # else:
                     self.board.push(move)
+                    self.session.played(move)
                     playsound("sounds/move_sound.wav", block=False)
                     self.selected_piece = None
                 else:
@@ -167,27 +253,99 @@ class ChessUI(tk.Tk):
         print("Drawing board")
         print(self.board)
         self.draw_board()
-        self.update()
         print("Making cpu move")
         self.make_cpu_move()  # Call CPU move after the human player's move
-        print("Drawing board 2")
-        self.draw_board()
 
     def make_cpu_move(self):
-        if not self.board.is_game_over() and not self.board.turn:
-            # CPU's turn, make a move using minimax algorithm
-            self.evaluation, move = minimax(
-                self.board,
-                chess_game.get_possible_moves,
-                chess_game.make_move,
-                chess_game.undo_move,
-                chess_game.is_game_over,
-                chess_game.evaluate_board,
-                depth=self.depth,
-                is_maximizing_player=True, # False
+        if self.board.is_game_over() or self.board.turn:
+            return
+        book_move = self.book.choose_move(self.board, random) if self.book is not None else None
+        if book_move is not None:
+            self.background.cancel()
+            print(f"Book move {book_move}")
+            self.play_cpu_move(book_move)
+            return
+        tablebase_move = self.tablebase.best_move(self.board) if self.tablebase is not None else None
+        if tablebase_move is not None:
+            self.background.cancel()
+            print(f"Tablebase move {tablebase_move}")
+            self.play_cpu_move(tablebase_move)
+            return
+        # CPU's turn, search in the background and poll for the move
+        last_move = self.board.peek() if self.board.move_stack else None
+        if self.background.pondering and last_move == self.predicted_move:
+            print("Ponder hit")
+            self.background.ponder_hit()
+        else:
+            self.background.cancel()
+            instant_move = self.session.instant_move(self.board, self.board.turn == chess.WHITE)
+            if instant_move is not None:
+                print(f"Expected reply, {instant_move} played at once")
+                self.play_cpu_move(instant_move)
+                self.start_pondering([instant_move] + self.session.line)
+                return
+            if self.stats is not None:
+                self.stats.reset()
+            self.session.start_move()
+            self.background.start(
+                self.board.copy(),
+                self.board.turn == chess.WHITE,
+                self.depth,
+                self.time_limit,
+                pv=self.session.seed(),
             )
-            self.board.push(move)
-            playsound("sounds/move_sound.wav", block=False)
+        self.predicted_move = None
+        self.thinking = True
+        self.after(POLL_INTERVAL, self.poll_cpu_move)
+
+    def poll_cpu_move(self):
+        try:
+            result = self.background.results.get_nowait()
+        except queue.Empty:
+            self.title(f"{TITLE} - thinking ({self.background.budget.nodes} nodes)")
+            self.after(POLL_INTERVAL, self.poll_cpu_move)
+            return
+        self.thinking = False
+        self.title(TITLE)
+        self.evaluation = result.score
+        if result.error is not None:
+            print(f"Search failed, playing a legal move: {result.error}")
+        self.session.finish_move(result.move, result.depth, result.nodes, result.pv)
+        reused_nodes = self.session.metrics[-1].reused_nodes
+        print(
+            f"CPU move {result.move} depth {result.depth} score {result.score} nodes {result.nodes}"
+            f" reused {reused_nodes}"
+        )
+        if self.stats is not None:
+            # After a ponder hit this includes the pondering
+            print(self.stats.summary())
+            self.stats.reset()
+        self.play_cpu_move(result.move)
+        self.start_pondering(result.pv)
+
+    def play_cpu_move(self, move):
+        self.board.push(move)
+        self.session.played(move)
+        playsound("sounds/move_sound.wav", block=False)
+        self.draw_board()
+
+    def start_pondering(self, pv):
+        # pv starts with the move just played, the next one is the expected reply
+        if not self.ponder or len(pv) < 2 or not self.board.is_legal(pv[1]):
+            return
+        board = self.board.copy()
+        board.push(pv[1])
+        if board.is_game_over():
+            return
+        self.predicted_move = pv[1]
+        self.session.start_move()
+        self.background.start(
+            board, board.turn == chess.WHITE, self.depth, self.time_limit, ponder=True, pv=pv[2:]
+        )
+
+    def move_now(self, event=None):
+        if self.thinking:
+            self.background.stop()
 
 # Start the chess game
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+import struct
+from multiprocessing import shared_memory
+from typing import Any, Callable, Optional
+
+# One slot: 8 bytes of check word and 8 bytes of score
+ENTRY_BYTES = 16
+KEY_MASK = (1 << 64) - 1
+# A score's bits as the slots hold them, in native byte order like the memoryview casts
+_SCORE_FORMAT = struct.Struct("d")
+_BITS_FORMAT = struct.Struct("Q")
+
+
+class EvalCache:
+    """Direct-mapped cache of evaluations keyed by a 64-bit position key.
+
+    Memory is fixed at size slots and a new score simply overwrites whatever
+    shared its slot. Each slot holds the score and the key XORed with the
+    score's bits, so a slot another process is halfway through writing fails
+    the check on probe and counts as a miss rather than a wrong score.
+
+    create_shared() places the slots in multiprocessing shared memory. Such a
+    cache pickles as a reference to that memory, so handing it to a pool
+    initializer lets every worker read and fill the same slots. A cache in
+    local memory pickles as a new empty one. The hit and miss counters are
+    kept per process.
+    """
+
+    def __init__(self, size: int = 1 << 16, buffer: Any = None):
+        self.size = size
+        if buffer is None:
+            buffer = bytearray(size * ENTRY_BYTES)
+        self._view = memoryview(buffer)[: size * ENTRY_BYTES]
+        half = size * 8
+        self._checks = self._view[:half].cast("Q")
+        self._scores = self._view[half:].cast("d")
+        self._score_bits = self._view[half:].cast("Q")
+        self._shared_memory: Optional[shared_memory.SharedMemory] = None
+        self._owner = False
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_megabytes(cls, megabytes: float) -> "EvalCache":
+        return cls(int(megabytes * 1024 * 1024) // ENTRY_BYTES)
+
+    @classmethod
+    def create_shared(cls, size: int = 1 << 16) -> "EvalCache":
+        """New cache in shared memory; its creator must close() it to free the memory."""
+        memory = shared_memory.SharedMemory(create=True, size=size * ENTRY_BYTES)
+        memory.buf[: size * ENTRY_BYTES] = bytes(size * ENTRY_BYTES)
+        cache = cls(size, memory.buf)
+        cache._shared_memory = memory
+        cache._owner = True
+        return cache
+
+    @classmethod
+    def attach(cls, name: str, size: int) -> "EvalCache":
+        memory = shared_memory.SharedMemory(name=name)
+        cache = cls(size, memory.buf)
+        cache._shared_memory = memory
+        return cache
+
+    def __reduce__(self):
+        if self._shared_memory is None:
+            return (EvalCache, (self.size,))
+        return (EvalCache.attach, (self._shared_memory.name, self.size))
+
+    def close(self) -> None:
+        """Let go of shared memory, freeing it if this process created it."""
+        if self._shared_memory is None:
+            return
+        for view in (self._checks, self._scores, self._score_bits, self._view):
+            view.release()
+        self._shared_memory.close()
+        if self._owner:
+            self._shared_memory.unlink()
+        self._shared_memory = None
+
+    def __enter__(self) -> "EvalCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def clear(self) -> None:
+        self._view[:] = bytes(len(self._view))
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, key: int) -> Optional[float]:
+        key &= KEY_MASK
+        index = key % self.size
+        bits = self._score_bits[index]
+        # An empty slot reads as key 0, so that key is never a hit
+        if key and self._checks[index] ^ bits == key:
+            score = self._scores[index]
+            # The score must not have changed between reading its bits and its value
+            if self._score_bits[index] == bits:
+                self.hits += 1
+                return score
+        self.misses += 1
+        return None
+
+    def store(self, key: int, score: float) -> None:
+        key &= KEY_MASK
+        index = key % self.size
+        # The check pairs the key with this writer's score, never with what a
+        # concurrent writer may have put in the slot since
+        bits = _BITS_FORMAT.unpack(_SCORE_FORMAT.pack(score))[0]
+        self._score_bits[index] = bits
+        self._checks[index] = key ^ bits
+
+    def hit_rate(self) -> float:
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+    def wrap(self, evaluate: Callable[[Any], float], key: Callable[[Any], Optional[int]]) -> Callable[[Any], float]:
+        """Cached version of evaluate; key returns None for states that must not be cached."""
+        probe = self.probe
+        store = self.store
+
+        def cached(state: Any) -> float:
+            position_key = key(state)
+            if position_key is None:
+                return evaluate(state)
+            score = probe(position_key)
+            if score is None:
+                score = evaluate(state)
+                store(position_key, score)
+            return score
+
+        return cached
@@ -0,0 +1,323 @@
+import argparse
+import json
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import chess
+import numpy as np
+
+import chess_game
+from match_runner import ChessEngine, EngineConfig
+from opening_book import read_games
+
+# A stored position: signed piece type per square, White's positive, and the
+# game result in half points for White (2 win, 1 draw, 0 loss)
+RECORD = np.dtype([("squares", np.int8, 64), ("result", np.uint8)])
+RESULT_HALF_POINTS = {"1-0": 2, "1/2-1/2": 1, "0-1": 0}
+
+# Texel's logistic: a score of s pawns predicts White scores 1 / (1 + 10 ** (-s / 4))
+SCALE = math.log(10) / 4
+
+# Piece codes of the planes: White pawn to king, then Black pawn to king
+PLANE_CODES = np.array([*chess.PIECE_TYPES, *(-piece_type for piece_type in chess.PIECE_TYPES)], np.int8)
+
+# Positions fed through NumPy at once, to keep the plane arrays small
+CHUNK = 4096
+
+
+def encode_board(board: chess.Board) -> np.ndarray:
+    squares = np.zeros(64, np.int8)
+    for square, piece in board.piece_map().items():
+        squares[square] = piece.piece_type if piece.color else -piece.piece_type
+    return squares
+
+
+def encode_boards(boards: Iterable[chess.Board]) -> np.ndarray:
+    return np.array([encode_board(board) for board in boards], np.int8).reshape(-1, 64)
+
+
+def piece_planes(squares: np.ndarray) -> np.ndarray:
+    """One 0/1 plane of 64 squares per piece code: (n, 64) codes become (n, 12, 64)."""
+    return (squares[:, None, :] == PLANE_CODES[None, :, None]).astype(np.float32)
+
+
+def signed_features(squares: np.ndarray) -> np.ndarray:
+    """Piece planes with Black's negated, shape (n, 2, 6, 64).
+
+    The score is their dot product with the tables' magnitudes: White's
+    tables as they are and Black's, which are negative, negated.
+    """
+    planes = piece_planes(squares).reshape(len(squares), 2, 6, 64)
+    planes[:, 1] *= -1
+    return planes
+
+
+class BatchEvaluator:
+    """chess_game.piece_square_score for many positions per NumPy call.
+
+    Positions are encoded as piece planes and scored with one matrix
+    product against the tables, CHUNK positions at a time. Like
+    evaluate_position it does not look for finished games.
+    """
+
+    def __init__(self, tables=None):
+        tables = chess_game.PIECE_SQUARE_TABLES if tables is None else tables
+        white = [tables[chess.WHITE][piece_type] for piece_type in chess.PIECE_TYPES]
+        black = [tables[chess.BLACK][piece_type] for piece_type in chess.PIECE_TYPES]
+        self.weights = np.array(white + black, np.float64).reshape(-1)
+
+    def evaluate(self, squares: np.ndarray) -> np.ndarray:
+        """Scores of (n, 64) encoded positions."""
+        squares = np.asarray(squares, np.int8).reshape(-1, 64)
+        scores = np.empty(len(squares))
+        for start in range(0, len(squares), CHUNK):
+            planes = piece_planes(squares[start:start + CHUNK])
+            scores[start:start + CHUNK] = planes.reshape(len(planes), -1) @ self.weights
+        return scores
+
+    def evaluate_boards(self, boards: Iterable[chess.Board]) -> np.ndarray:
+        return self.evaluate(encode_boards(boards))
+
+
+def game_positions(
+    board: chess.Board, moves: Iterable[chess.Move], result: str, skip_plies: int = 8
+) -> Iterator[Tuple[chess.Board, str]]:
+    """The positions of a game labelled with its result, leaving out noisy ones.
+
+    The opening plies are skipped, as are positions in check or right after
+    a capture, where the material is about to change. The board is yielded
+    in place, so copy it to keep it.
+    """
+    for ply, move in enumerate(moves):
+        captured = board.is_capture(move)
+        board.push(move)
+        if ply + 1 >= skip_plies and not captured and not board.is_check():
+            yield board, result
+
+
+def pgn_positions(paths: List[str], skip_plies: int = 8) -> Iterator[Tuple[chess.Board, str]]:
+    for path in paths:
+        for game in read_games(path):
+            result = game.headers.get("Result", "*")
+            if result in RESULT_HALF_POINTS:
+                yield from game_positions(game.board(), game.mainline_moves(), result, skip_plies)
+
+
+def _self_play_game(config: EngineConfig, seed: int, opening_plies: int, max_plies: int) -> Tuple[List[str], str]:
+    # Both sides share one engine configuration; random opening plies vary the games
+    rng = random.Random(seed)
+    state = chess.Board()
+    engines = {chess.WHITE: ChessEngine(config, rng), chess.BLACK: ChessEngine(config, rng)}
+    while not state.is_game_over() and len(state.move_stack) < max_plies:
+        if len(state.move_stack) < opening_plies:
+            move = rng.choice(list(state.legal_moves))
+        else:
+            move = engines[state.turn].choose_move(state)
+        state.push(move)
+    result = state.result() if state.is_game_over() else "1/2-1/2"
+    return [move.uci() for move in state.move_stack], result
+
+
+def self_play_positions(
+    games: int,
+    config: Optional[EngineConfig] = None,
+    opening_plies: int = 8,
+    max_plies: int = 300,
+    seed: int = 0,
+    workers: Optional[int] = None,
+    skip_plies: int = 8,
+) -> Iterator[Tuple[chess.Board, str]]:
+    """Labelled positions from games the engine plays against itself across a process pool.
+
+    Game i is seeded with seed + i; unfinished games count as draws, as in match_runner.
+    """
+    config = config or EngineConfig(depth=1)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        played = pool.map(
+            _self_play_game,
+            [config] * games,
+            range(seed, seed + games),
+            [opening_plies] * games,
+            [max_plies] * games,
+            chunksize=4,
+        )
+        for moves, result in played:
+            yield from game_positions(
+                chess.Board(), (chess.Move.from_uci(move) for move in moves), result, skip_plies
+            )
+
+
+def write_dataset(positions: Iterable[Tuple[chess.Board, str]], path: str) -> int:
+    """Append labelled positions to a file of RECORDs and return how many were written.
+
+    Positions are buffered CHUNK at a time, so any number can be streamed in.
+    """
+    buffer = np.zeros(CHUNK, RECORD)
+    count = filled = 0
+    with open(path, "ab") as output:
+        for board, result in positions:
+            buffer[filled]["squares"] = encode_board(board)
+            buffer[filled]["result"] = RESULT_HALF_POINTS[result]
+            filled += 1
+            if filled == CHUNK:
+                output.write(buffer.tobytes())
+                count += filled
+                filled = 0
+        output.write(buffer[:filled].tobytes())
+    return count + filled
+
+
+def open_dataset(path: str) -> np.ndarray:
+    """Memory-map a file of RECORDs; rows are only read when indexed."""
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, RECORD)
+    return np.memmap(path, RECORD, mode="r")
+
+
+class TexelTuner:
+    """Fit piece values and piece-square tables to game results, Texel style.
+
+    A position's score s predicts White's result as sigmoid(scale * s), and
+    the mean squared error to the real results is minimised by Adam over
+    mini-batches read from a memory-mapped dataset, so memory stays flat
+    however many positions there are. Each table is a piece value, shared
+    by both colours, plus per-square offsets, which are pulled towards zero
+    by regularization. The colours' offsets are fitted separately, as the
+    evaluation's Black tables are not mirrors of White's, so the tuner
+    starts out reproducing the given tables exactly. Kings have no value.
+    """
+
+    def __init__(
+        self, tables=None, scale: float = SCALE, learning_rate: float = 0.002, regularization: float = 1e-4
+    ):
+        tables = chess_game.PIECE_SQUARE_TABLES if tables is None else tables
+        # Magnitudes indexed [0 White, 1 Black][piece type - 1][square]
+        magnitudes = np.array(
+            [[tables[color][piece_type] for piece_type in chess.PIECE_TYPES] for color in (chess.WHITE, chess.BLACK)],
+            np.float64,
+        )
+        magnitudes[1] *= -1
+        self.values = magnitudes.mean(axis=(0, 2))
+        self.values[chess.KING - 1] = 0.0
+        self.offsets = magnitudes - self.values[None, :, None]
+        self.scale = scale
+        self.learning_rate = learning_rate
+        self.regularization = regularization
+        # Adam moments for the values and the offsets
+        self._moments = [np.zeros_like(self.values), np.zeros_like(self.offsets)]
+        self._squares = [np.zeros_like(self.values), np.zeros_like(self.offsets)]
+        self.steps = 0
+
+    def magnitudes(self) -> np.ndarray:
+        return self.values[None, :, None] + self.offsets
+
+    def tables(self) -> List[List[List[float]]]:
+        """The fitted tables in the layout of chess_game.PIECE_SQUARE_TABLES."""
+        white, black = self.magnitudes()
+        tables = [[[0.0] * 64 for _ in range(7)] for _ in range(2)]
+        for index, piece_type in enumerate(chess.PIECE_TYPES):
+            tables[chess.WHITE][piece_type] = white[index].tolist()
+            tables[chess.BLACK][piece_type] = (-black[index]).tolist()
+        return tables
+
+    def save(self, path: str) -> None:
+        values = {chess.piece_name(piece): round(value, 4) for piece, value in zip(chess.PIECE_TYPES, self.values)}
+        with open(path, "w") as output:
+            json.dump({"piece_values": values, "tables": self.tables()}, output)
+
+    def _predict(self, records: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        features = signed_features(records["squares"]).reshape(len(records), -1)
+        scores = features @ self.magnitudes().reshape(-1)
+        predicted = 1 / (1 + np.exp(-self.scale * scores))
+        return features, predicted, records["result"] / 2
+
+    def loss(self, dataset: np.ndarray) -> float:
+        """Mean squared error over a whole dataset, read CHUNK records at a time."""
+        total = 0.0
+        for start in range(0, len(dataset), CHUNK):
+            _, predicted, results = self._predict(dataset[start:start + CHUNK])
+            total += float(np.sum((predicted - results) ** 2))
+        return total / max(1, len(dataset))
+
+    def step(self, records: np.ndarray) -> float:
+        """One Adam step on a mini-batch; returns its loss before the step."""
+        features, predicted, results = self._predict(records)
+        error = predicted - results
+        # Derivative of the mean squared error with respect to each score
+        slope = 2 * error * predicted * (1 - predicted) * self.scale / len(records)
+        table_gradient = (features.T @ slope).reshape(self.offsets.shape)
+        gradients = [table_gradient.sum(axis=(0, 2)), table_gradient + self.regularization * self.offsets]
+        gradients[0][chess.KING - 1] = 0.0
+        self.steps += 1
+        for parameter, gradient, moment, square in zip(
+            (self.values, self.offsets), gradients, self._moments, self._squares
+        ):
+            moment *= 0.9
+            moment += 0.1 * gradient
+            square *= 0.999
+            square += 0.001 * gradient**2
+            corrected = moment / (1 - 0.9**self.steps)
+            parameter -= self.learning_rate * corrected / (np.sqrt(square / (1 - 0.999**self.steps)) + 1e-8)
+        return float(np.mean(error**2))
+
+    def tune(self, dataset: np.ndarray, epochs: int = 4, batch_size: int = 1024, seed: int = 0) -> List[float]:
+        """Run epochs over the dataset in shuffled mini-batches and return the loss after each."""
+        rng = np.random.default_rng(seed)
+        starts = np.arange(0, len(dataset), batch_size)
+        losses = []
+        for _ in range(epochs):
+            for start in rng.permutation(starts):
+                self.step(dataset[start:start + batch_size])
+            losses.append(self.loss(dataset))
+        return losses
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build labelled position sets and tune the evaluation on them.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="append positions from PGN files and self-play to a dataset")
+    build.add_argument("output")
+    build.add_argument("--pgn", nargs="*", default=[])
+    build.add_argument("--self-play", type=int, default=0, help="games the engine plays against itself")
+    build.add_argument("--depth", type=int, default=1, help="search depth of the self-play engine")
+    build.add_argument("--opening-plies", type=int, default=8, help="random plies starting each self-play game")
+    build.add_argument("--skip-plies", type=int, default=8, help="plies at the start of each game left out")
+    build.add_argument("--workers", type=int, default=None)
+    build.add_argument("--seed", type=int, default=0)
+    tune = commands.add_parser("tune", help="fit the piece values and tables to a dataset")
+    tune.add_argument("dataset")
+    tune.add_argument("--output", required=True, help="JSON file for chess_game.load_piece_square_tables")
+    tune.add_argument("--epochs", type=int, default=4)
+    tune.add_argument("--batch-size", type=int, default=1024)
+    tune.add_argument("--learning-rate", type=float, default=0.002)
+    tune.add_argument("--regularization", type=float, default=1e-4)
+    tune.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = write_dataset(pgn_positions(args.pgn, args.skip_plies), args.output)
+        if args.self_play:
+            played = self_play_positions(
+                args.self_play,
+                EngineConfig(depth=args.depth),
+                args.opening_plies,
+                seed=args.seed,
+                workers=args.workers,
+                skip_plies=args.skip_plies,
+            )
+            count += write_dataset(played, args.output)
+        print(f"{count} positions appended to {args.output}")
+    else:
+        dataset = open_dataset(args.dataset)
+        tuner = TexelTuner(learning_rate=args.learning_rate, regularization=args.regularization)
+        print(f"{len(dataset)} positions, initial loss {tuner.loss(dataset):.5f}")
+        for epoch, loss in enumerate(tuner.tune(dataset, args.epochs, args.batch_size, args.seed)):
+            print(f"epoch {epoch + 1}: loss {loss:.5f}")
+        tuner.save(args.output)
+        values = ", ".join(
+            f"{chess.piece_name(piece)} {value:.2f}" for piece, value in zip(chess.PIECE_TYPES, tuner.values)
+        )
+        print(f"{values}; written to {args.output}")
@@ -0,0 +1,749 @@
+import random
+import sys
+import time
+from typing import List, Optional, Tuple
+
+import chess
+import chess.polyglot
+
+import chess_game
+from move_ordering import MoveOrderer
+from negamax import GameAdapter
+
+# Pieces are signed piece types, positive for White and negative for Black,
+# on a 0x88 board: square = 16 * rank + file, off the board when square & 0x88
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+WHITE, BLACK = 1, -1
+
+# A move is from | to << 7 | promotion << 14 | flag << 17
+DOUBLE_PUSH = 1
+EN_PASSANT = 2
+CASTLING = 3
+NULL_MOVE = 0
+
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+
+KNIGHT_DELTAS = (33, 31, 18, 14, -14, -18, -31, -33)
+KING_DELTAS = (16, -16, 1, -1, 17, 15, -15, -17)
+BISHOP_DELTAS = (17, 15, -15, -17)
+ROOK_DELTAS = (16, -16, 1, -1)
+
+SQUARES = [square for square in range(128) if not square & 0x88]
+
+
+def to_0x88(square: int) -> int:
+    return (square >> 3) * 16 + (square & 7)
+
+
+def from_0x88(square: int) -> int:
+    return (square >> 4) * 8 + (square & 7)
+
+
+def _ray(square: int, delta: int) -> Tuple[int, ...]:
+    squares = []
+    square += delta
+    while not square & 0x88:
+        squares.append(square)
+        square += delta
+    return tuple(squares)
+
+
+# Attack tables by 0x88 square; slider rays run outwards from the square
+KNIGHT_TARGETS = [()] * 128
+KING_TARGETS = [()] * 128
+BISHOP_RAYS = [()] * 128
+ROOK_RAYS = [()] * 128
+for _square in SQUARES:
+    KNIGHT_TARGETS[_square] = tuple(_square + d for d in KNIGHT_DELTAS if not (_square + d) & 0x88)
+    KING_TARGETS[_square] = tuple(_square + d for d in KING_DELTAS if not (_square + d) & 0x88)
+    BISHOP_RAYS[_square] = tuple(ray for ray in (_ray(_square, d) for d in BISHOP_DELTAS) if ray)
+    ROOK_RAYS[_square] = tuple(ray for ray in (_ray(_square, d) for d in ROOK_DELTAS) if ray)
+QUEEN_RAYS = [BISHOP_RAYS[square] + ROOK_RAYS[square] for square in range(128)]
+# Rays from a square with the slider that attacks along them
+KING_RAYS = [
+    tuple((ray, BISHOP) for ray in BISHOP_RAYS[square]) + tuple((ray, ROOK) for ray in ROOK_RAYS[square])
+    for square in range(128)
+]
+
+# DIRECTION[a - b + 119] is the queen step leading from b to a, 0 when unaligned
+DIRECTION = [0] * 239
+for _delta in KING_DELTAS:
+    for _steps in range(1, 8):
+        DIRECTION[_delta * _steps + 119] = _delta
+
+# Castling rights kept after a move touches a square
+CASTLING_KEEP = [15] * 128
+CASTLING_KEEP[0x04] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_KEEP[0x07] = 15 & ~WHITE_KINGSIDE
+CASTLING_KEEP[0x00] = 15 & ~WHITE_QUEENSIDE
+CASTLING_KEEP[0x74] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_KEEP[0x77] = 15 & ~BLACK_KINGSIDE
+CASTLING_KEEP[0x70] = 15 & ~BLACK_QUEENSIDE
+
+# Polyglot Zobrist keys, so hashes equal chess.polyglot.zobrist_hash
+_RANDOM = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+ZOBRIST_PIECES = [[0] * 128 for _ in range(13)]
+for _piece_type in range(PAWN, KING + 1):
+    for _color in (WHITE, BLACK):
+        _kind = 2 * (_piece_type - 1) + (_color == WHITE)
+        for _square in SQUARES:
+            ZOBRIST_PIECES[_color * _piece_type + 6][_square] = _RANDOM[64 * _kind + from_0x88(_square)]
+ZOBRIST_CASTLING = [0] * 16
+for _rights in range(16):
+    for _bit in range(4):
+        if _rights >> _bit & 1:
+            ZOBRIST_CASTLING[_rights] ^= _RANDOM[768 + _bit]
+ZOBRIST_EP_FILE = _RANDOM[772:780]
+ZOBRIST_WHITE_TO_MOVE = _RANDOM[780]
+
+# Piece-square scores from White's view, the ones chess_game evaluates with
+PIECE_SCORES = [[0.0] * 128 for _ in range(13)]
+for _piece_type in range(PAWN, KING + 1):
+    for _square in SQUARES:
+        PIECE_SCORES[_piece_type + 6][_square] = chess_game.PIECE_SQUARE_TABLES[chess.WHITE][_piece_type][from_0x88(_square)]
+        PIECE_SCORES[6 - _piece_type][_square] = chess_game.PIECE_SQUARE_TABLES[chess.BLACK][_piece_type][from_0x88(_square)]
+
+# Values for ordering captures, as in chess_game.MVV_LVA_VALUES
+MVV_LVA_VALUES = [0, 1, 3, 3, 5, 9, 10]
+
+
+class FastBoard:
+    """Chess position on a 0x88 array for use inside a search.
+
+    Moves are plain ints and make/unmake change the board in place, pushing
+    what unmake needs onto parallel lists, so a node creates no Move or
+    Board objects. The Zobrist hash, with python-chess's polyglot keys, and
+    chess_game's piece-square score are kept up to date move by move.
+    Convert with from_board() and to_chess_move() at the root only.
+    """
+
+    def __init__(self):
+        self.squares = [EMPTY] * 128
+        # Squares of each side's pieces, White's at index 0
+        self.piece_squares = (set(), set())
+        self.kings = [0, 0]
+        self.turn = WHITE
+        self.castling = 0
+        self.ep_square = -1
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.hash = 0
+        self.ep_hash = 0
+        self.score = 0.0
+        self._captured: List[int] = []
+        self._castling: List[int] = []
+        self._ep_square: List[int] = []
+        self._ep_hash: List[int] = []
+        self._halfmove_clock: List[int] = []
+        self._score: List[float] = []
+        # Moves made since the root, NULL_MOVE for a pass
+        self.moves: List[int] = []
+        # Hashes of the earlier positions, for repetitions
+        self.history: List[int] = []
+
+    @classmethod
+    def from_board(cls, board: chess.Board) -> "FastBoard":
+        fast = cls()
+        for square, piece in board.piece_map().items():
+            fast._put(to_0x88(square), piece.piece_type if piece.color else -piece.piece_type)
+        fast.turn = WHITE if board.turn == chess.WHITE else BLACK
+        fast.castling = (
+            bool(board.castling_rights & chess.BB_H1) * WHITE_KINGSIDE
+            | bool(board.castling_rights & chess.BB_A1) * WHITE_QUEENSIDE
+            | bool(board.castling_rights & chess.BB_H8) * BLACK_KINGSIDE
+            | bool(board.castling_rights & chess.BB_A8) * BLACK_QUEENSIDE
+        )
+        fast.ep_square = -1 if board.ep_square is None else to_0x88(board.ep_square)
+        fast.halfmove_clock = board.halfmove_clock
+        fast.fullmove_number = board.fullmove_number
+        fast.score = sum(PIECE_SCORES[fast.squares[square] + 6][square] for square in SQUARES)
+        fast.hash = fast._full_hash()
+        # Earlier positions back to the last capture or pawn move
+        earlier = board.copy()
+        for _ in range(min(board.halfmove_clock, len(board.move_stack))):
+            earlier.pop()
+            fast.history.append(chess.polyglot.zobrist_hash(earlier))
+        fast.history.reverse()
+        return fast
+
+    def _put(self, square: int, piece: int) -> None:
+        self.squares[square] = piece
+        self.piece_squares[piece < 0].add(square)
+        if piece == KING or piece == -KING:
+            self.kings[piece < 0] = square
+
+    def _full_hash(self) -> int:
+        key = 0
+        for square in SQUARES:
+            if self.squares[square]:
+                key ^= ZOBRIST_PIECES[self.squares[square] + 6][square]
+        key ^= ZOBRIST_CASTLING[self.castling]
+        self.ep_hash = self._ep_key(self.ep_square)
+        key ^= self.ep_hash
+        if self.turn == WHITE:
+            key ^= ZOBRIST_WHITE_TO_MOVE
+        return key
+
+    def _ep_key(self, ep_square: int) -> int:
+        # Polyglot only hashes the square when a pawn stands ready to take
+        if ep_square < 0:
+            return 0
+        pawn = PAWN * self.turn
+        behind = ep_square - 16 * self.turn
+        for side in (behind - 1, behind + 1):
+            if not side & 0x88 and self.squares[side] == pawn:
+                return ZOBRIST_EP_FILE[ep_square & 7]
+        return 0
+
+    def to_board(self) -> chess.Board:
+        board = chess.Board(None)
+        for square in SQUARES:
+            piece = self.squares[square]
+            if piece:
+                board.set_piece_at(from_0x88(square), chess.Piece(abs(piece), piece > 0))
+        board.turn = self.turn == WHITE
+        board.castling_rights = (
+            (self.castling & WHITE_KINGSIDE and chess.BB_H1)
+            | (self.castling & WHITE_QUEENSIDE and chess.BB_A1)
+            | (self.castling & BLACK_KINGSIDE and chess.BB_H8)
+            | (self.castling & BLACK_QUEENSIDE and chess.BB_A8)
+        )
+        board.ep_square = None if self.ep_square < 0 else from_0x88(self.ep_square)
+        board.halfmove_clock = self.halfmove_clock
+        board.fullmove_number = self.fullmove_number
+        return board
+
+    def to_chess_move(self, move: int) -> chess.Move:
+        promotion = move >> 14 & 7
+        return chess.Move(from_0x88(move & 127), from_0x88(move >> 7 & 127), promotion or None)
+
+    def from_chess_move(self, move: chess.Move) -> int:
+        for candidate in self.legal_moves():
+            if self.to_chess_move(candidate) == move:
+                return candidate
+        raise ValueError(f"illegal move {move}")
+
+    def is_attacked(self, square: int, by: int) -> bool:
+        """Whether a piece of color by attacks square."""
+        squares = self.squares
+        pawn = PAWN * by
+        for source in (square - 16 * by - 1, square - 16 * by + 1):
+            if not source & 0x88 and squares[source] == pawn:
+                return True
+        knight = KNIGHT * by
+        for source in KNIGHT_TARGETS[square]:
+            if squares[source] == knight:
+                return True
+        king = KING * by
+        for source in KING_TARGETS[square]:
+            if squares[source] == king:
+                return True
+        queen = QUEEN * by
+        bishop = BISHOP * by
+        for ray in BISHOP_RAYS[square]:
+            for source in ray:
+                piece = squares[source]
+                if piece:
+                    if piece == bishop or piece == queen:
+                        return True
+                    break
+        rook = ROOK * by
+        for ray in ROOK_RAYS[square]:
+            for source in ray:
+                piece = squares[source]
+                if piece:
+                    if piece == rook or piece == queen:
+                        return True
+                    break
+        return False
+
+    def is_check(self) -> bool:
+        return self.is_attacked(self.kings[self.turn < 0], -self.turn)
+
+    def pinned(self) -> List[int]:
+        """Squares of the side to move's pieces pinned to its king."""
+        squares = self.squares
+        color = self.turn
+        queen = -QUEEN * color
+        pinned = []
+        for ray, slider in KING_RAYS[self.kings[color < 0]]:
+            shield = -1
+            for square in ray:
+                piece = squares[square]
+                if not piece:
+                    continue
+                if shield < 0 and piece * color > 0:
+                    shield = square
+                    continue
+                if shield >= 0 and (piece == queen or piece == -slider * color):
+                    pinned.append(shield)
+                break
+        return pinned
+
+    def pseudo_legal_moves(self) -> List[int]:
+        squares = self.squares
+        color = self.turn
+        moves = []
+        append = moves.append
+        for source in self.piece_squares[color < 0]:
+            piece_type = squares[source] * color
+            if piece_type == PAWN:
+                self._pawn_moves(source, moves)
+            elif piece_type == KNIGHT or piece_type == KING:
+                for target in (KNIGHT_TARGETS if piece_type == KNIGHT else KING_TARGETS)[source]:
+                    if squares[target] * color <= 0:
+                        append(source | target << 7)
+            else:
+                rays = BISHOP_RAYS if piece_type == BISHOP else ROOK_RAYS if piece_type == ROOK else QUEEN_RAYS
+                for ray in rays[source]:
+                    for target in ray:
+                        occupant = squares[target] * color
+                        if occupant <= 0:
+                            append(source | target << 7)
+                        if occupant:
+                            break
+        if self.castling:
+            self._castling_moves(moves)
+        return moves
+
+    def _pawn_moves(self, source: int, moves: List[int]) -> None:
+        squares = self.squares
+        color = self.turn
+        forward = source + 16 * color
+        last_rank = (forward >> 4) == (7 if color == WHITE else 0)
+        if squares[forward] == EMPTY:
+            if last_rank:
+                for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                    moves.append(source | forward << 7 | promotion << 14)
+            else:
+                moves.append(source | forward << 7)
+                if (source >> 4) == (1 if color == WHITE else 6) and squares[forward + 16 * color] == EMPTY:
+                    moves.append(source | (forward + 16 * color) << 7 | DOUBLE_PUSH << 17)
+        for target in (forward - 1, forward + 1):
+            if target & 0x88:
+                continue
+            if squares[target] * color < 0:
+                if last_rank:
+                    for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        moves.append(source | target << 7 | promotion << 14)
+                else:
+                    moves.append(source | target << 7)
+            elif target == self.ep_square:
+                moves.append(source | target << 7 | EN_PASSANT << 17)
+
+    def _castling_moves(self, moves: List[int]) -> None:
+        squares = self.squares
+        color = self.turn
+        king, kingside, queenside = (0x04, WHITE_KINGSIDE, WHITE_QUEENSIDE) if color == WHITE else (
+            0x74, BLACK_KINGSIDE, BLACK_QUEENSIDE
+        )
+        if not self.castling & (kingside | queenside) or self.is_attacked(king, -color):
+            return
+        if (
+            self.castling & kingside
+            and squares[king + 1] == EMPTY
+            and squares[king + 2] == EMPTY
+            and not self.is_attacked(king + 1, -color)
+        ):
+            moves.append(king | (king + 2) << 7 | CASTLING << 17)
+        if (
+            self.castling & queenside
+            and squares[king - 1] == EMPTY
+            and squares[king - 2] == EMPTY
+            and squares[king - 3] == EMPTY
+            and not self.is_attacked(king - 1, -color)
+        ):
+            moves.append(king | (king - 2) << 7 | CASTLING << 17)
+
+    def legal_moves(self) -> List[int]:
+        color = self.turn
+        king = self.kings[color < 0]
+        moves = self.pseudo_legal_moves()
+        in_check = self.is_attacked(king, -color)
+        # Out of check, only king moves, pinned pieces and en passant need a test;
+        # in check, other moves must also take the checker or block its ray
+        blocks = self._check_blocks(king) if in_check else ()
+        pinned = self.pinned()
+        squares = self.squares
+        legal = []
+        for move in moves:
+            source = move & 127
+            if in_check and source != king and move >> 17 != EN_PASSANT and (move >> 7 & 127) not in blocks:
+                continue
+            if source == king:
+                # Lift the king so squares behind it along a checking ray count as attacked
+                squares[king] = EMPTY
+                safe = not self.is_attacked(move >> 7 & 127, -color)
+                squares[king] = KING * color
+                if safe:
+                    legal.append(move)
+            elif source in pinned or move >> 17 == EN_PASSANT:
+                if self._is_legal_by_making(move):
+                    legal.append(move)
+            else:
+                legal.append(move)
+        return legal
+
+    def _check_blocks(self, king: int) -> List[int]:
+        # Squares where a piece would stop the check, none against a double check
+        squares = self.squares
+        color = self.turn
+        checkers = []
+        for source in (king + 16 * color - 1, king + 16 * color + 1):
+            if not source & 0x88 and squares[source] == -PAWN * color:
+                checkers.append(source)
+        for source in KNIGHT_TARGETS[king]:
+            if squares[source] == -KNIGHT * color:
+                checkers.append(source)
+        for ray, slider in KING_RAYS[king]:
+            for source in ray:
+                piece = squares[source]
+                if piece:
+                    if piece == -QUEEN * color or piece == -slider * color:
+                        checkers.append(source)
+                    break
+        if len(checkers) != 1:
+            return []
+        checker = checkers[0]
+        blocks = [checker]
+        step = DIRECTION[checker - king + 119]
+        if step and abs(squares[checker]) != PAWN:
+            square = king + step
+            while square != checker:
+                blocks.append(square)
+                square += step
+        return blocks
+
+    def _is_legal_by_making(self, move: int) -> bool:
+        color = self.turn
+        self.make(move)
+        legal = not self.is_attacked(self.kings[color < 0], -color)
+        self.unmake(move)
+        return legal
+
+    def has_legal_move(self) -> bool:
+        """Whether legal_moves() is non-empty, usually found without generating it."""
+        squares = self.squares
+        color = self.turn
+        if not self.is_attacked(self.kings[color < 0], -color):
+            # Out of check any unpinned piece with a move will do
+            pinned = self.pinned()
+            for source in self.piece_squares[color < 0]:
+                piece_type = squares[source] * color
+                if source in pinned or piece_type == KING:
+                    continue
+                if piece_type == PAWN:
+                    forward = source + 16 * color
+                    if squares[forward] == EMPTY:
+                        return True
+                    for target in (forward - 1, forward + 1):
+                        if not target & 0x88 and squares[target] * color < 0:
+                            return True
+                elif piece_type == KNIGHT:
+                    for target in KNIGHT_TARGETS[source]:
+                        if squares[target] * color <= 0:
+                            return True
+                else:
+                    rays = BISHOP_RAYS if piece_type == BISHOP else ROOK_RAYS if piece_type == ROOK else QUEEN_RAYS
+                    for ray in rays[source]:
+                        if squares[ray[0]] * color <= 0:
+                            return True
+        return bool(self.legal_moves())
+
+    def make(self, move: int) -> None:
+        squares = self.squares
+        color = self.turn
+        source = move & 127
+        target = move >> 7 & 127
+        promotion = move >> 14 & 7
+        flag = move >> 17
+        piece = squares[source]
+        captured = squares[target]
+        own, other = self.piece_squares[color < 0], self.piece_squares[color > 0]
+
+        self._captured.append(captured)
+        self._castling.append(self.castling)
+        self._ep_square.append(self.ep_square)
+        self._ep_hash.append(self.ep_hash)
+        self._halfmove_clock.append(self.halfmove_clock)
+        self._score.append(self.score)
+        self.history.append(self.hash)
+        self.moves.append(move)
+
+        key = self.hash ^ self.ep_hash ^ ZOBRIST_WHITE_TO_MOVE ^ ZOBRIST_CASTLING[self.castling]
+        score = self.score
+        key ^= ZOBRIST_PIECES[piece + 6][source]
+        score -= PIECE_SCORES[piece + 6][source]
+        if captured:
+            key ^= ZOBRIST_PIECES[captured + 6][target]
+            score -= PIECE_SCORES[captured + 6][target]
+            other.discard(target)
+        placed = promotion * color if promotion else piece
+        key ^= ZOBRIST_PIECES[placed + 6][target]
+        score += PIECE_SCORES[placed + 6][target]
+        squares[source] = EMPTY
+        squares[target] = placed
+        own.discard(source)
+        own.add(target)
+
+        if flag == EN_PASSANT:
+            taken = target - 16 * color
+            key ^= ZOBRIST_PIECES[6 - PAWN * color][taken]
+            score -= PIECE_SCORES[6 - PAWN * color][taken]
+            squares[taken] = EMPTY
+            other.discard(taken)
+        elif flag == CASTLING:
+            rook_from, rook_to = (target + 1, target - 1) if target > source else (target - 2, target + 1)
+            rook = squares[rook_from]
+            key ^= ZOBRIST_PIECES[rook + 6][rook_from] ^ ZOBRIST_PIECES[rook + 6][rook_to]
+            score += PIECE_SCORES[rook + 6][rook_to] - PIECE_SCORES[rook + 6][rook_from]
+            squares[rook_from] = EMPTY
+            squares[rook_to] = rook
+            own.discard(rook_from)
+            own.add(rook_to)
+        if piece * color == KING:
+            self.kings[color < 0] = target
+
+        self.castling &= CASTLING_KEEP[source] & CASTLING_KEEP[target]
+        key ^= ZOBRIST_CASTLING[self.castling]
+        self.halfmove_clock = 0 if captured or piece * color == PAWN else self.halfmove_clock + 1
+        if color == BLACK:
+            self.fullmove_number += 1
+        self.turn = -color
+        self.ep_square = (source + target) >> 1 if flag == DOUBLE_PUSH else -1
+        self.ep_hash = self._ep_key(self.ep_square) if flag == DOUBLE_PUSH else 0
+        self.hash = key ^ self.ep_hash
+        self.score = score
+
+    def unmake(self, move: int) -> None:
+        squares = self.squares
+        self.turn = color = -self.turn
+        source = move & 127
+        target = move >> 7 & 127
+        promotion = move >> 14 & 7
+        flag = move >> 17
+        captured = self._captured.pop()
+        self.moves.pop()
+        own, other = self.piece_squares[color < 0], self.piece_squares[color > 0]
+
+        piece = PAWN * color if promotion else squares[target]
+        squares[source] = piece
+        squares[target] = captured
+        own.discard(target)
+        own.add(source)
+        if captured:
+            other.add(target)
+        if flag == EN_PASSANT:
+            taken = target - 16 * color
+            squares[taken] = -PAWN * color
+            other.add(taken)
+        elif flag == CASTLING:
+            rook_from, rook_to = (target + 1, target - 1) if target > source else (target - 2, target + 1)
+            squares[rook_from] = squares[rook_to]
+            squares[rook_to] = EMPTY
+            own.discard(rook_to)
+            own.add(rook_from)
+        if piece * color == KING:
+            self.kings[color < 0] = source
+
+        if color == BLACK:
+            self.fullmove_number -= 1
+        self.castling = self._castling.pop()
+        self.ep_square = self._ep_square.pop()
+        self.ep_hash = self._ep_hash.pop()
+        self.halfmove_clock = self._halfmove_clock.pop()
+        self.score = self._score.pop()
+        self.hash = self.history.pop()
+
+    def make_null(self) -> None:
+        self._ep_square.append(self.ep_square)
+        self._ep_hash.append(self.ep_hash)
+        self._halfmove_clock.append(self.halfmove_clock)
+        self.history.append(self.hash)
+        self.moves.append(NULL_MOVE)
+        self.hash ^= self.ep_hash ^ ZOBRIST_WHITE_TO_MOVE
+        self.ep_square = -1
+        self.ep_hash = 0
+        self.halfmove_clock += 1
+        self.turn = -self.turn
+
+    def unmake_null(self) -> None:
+        self.turn = -self.turn
+        self.ep_square = self._ep_square.pop()
+        self.ep_hash = self._ep_hash.pop()
+        self.halfmove_clock = self._halfmove_clock.pop()
+        self.hash = self.history.pop()
+        self.moves.pop()
+
+    def is_insufficient_material(self) -> bool:
+        # Bare kings, a single minor piece, or bishops all on one square color
+        minors = []
+        for square in self.piece_squares[0] | self.piece_squares[1]:
+            piece_type = abs(self.squares[square])
+            if piece_type in (PAWN, ROOK, QUEEN):
+                return False
+            if piece_type != KING:
+                minors.append((piece_type, square))
+        if len(minors) <= 1:
+            return True
+        if all(piece_type == BISHOP for piece_type, _ in minors):
+            return len({((square >> 4) + square) & 1 for _, square in minors}) == 1
+        return False
+
+    def is_fivefold_repetition(self) -> bool:
+        if self.halfmove_clock < 16:
+            return False
+        recent = self.history[-self.halfmove_clock:]
+        return recent.count(self.hash) >= 4
+
+    def terminal_score(self, has_legal_moves: bool) -> Optional[float]:
+        """chess_game.terminal_score for this board."""
+        if not has_legal_moves:
+            if self.is_check():
+                return -1000.0 if self.turn == WHITE else 1000.0
+            return 0.0
+        if self.halfmove_clock >= 150 or self.is_insufficient_material() or self.is_fivefold_repetition():
+            return 0.0
+        return None
+
+    def perft(self, depth: int) -> int:
+        moves = self.legal_moves()
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            self.make(move)
+            nodes += self.perft(depth - 1)
+            self.unmake(move)
+        return nodes
+
+
+def make_move(state: FastBoard, move: int, is_maximizing_player: bool) -> None:
+    state.make(move)
+
+
+def undo_move(state: FastBoard, move: int, is_maximizing_player: bool) -> None:
+    state.unmake(move)
+
+
+def expand(state: FastBoard) -> Tuple[List[int], Optional[float]]:
+    moves = state.legal_moves()
+    return moves, state.terminal_score(bool(moves))
+
+
+def evaluate_board(state: FastBoard) -> float:
+    score = state.terminal_score(state.has_legal_move())
+    return state.score if score is None else score
+
+
+def null_move_allowed(state: FastBoard) -> bool:
+    # The same safeguards as chess_game.null_move_allowed
+    if state.is_check() or (state.moves and state.moves[-1] == NULL_MOVE):
+        return False
+    squares = state.squares
+    return any(abs(squares[square]) not in (PAWN, KING) for square in state.piece_squares[state.turn < 0])
+
+
+def can_reduce(state: FastBoard, move: int) -> bool:
+    if move >> 14 & 7 or state.squares[move >> 7 & 127] or move >> 17 == EN_PASSANT or state.is_check():
+        return False
+    state.make(move)
+    gives_check = state.is_check()
+    state.unmake(move)
+    return not gives_check
+
+
+class FastBoardAdapter(GameAdapter):
+    """Search on a FastBoard with the evaluation and game rules of chess_game.ChessAdapter.
+
+    The state is a FastBoard and moves are its ints, so convert the root
+    with FastBoard.from_board() and the best move with to_chess_move().
+    """
+
+    def __init__(self):
+        self.get_possible_moves = FastBoard.legal_moves
+        self.make_move = make_move
+        self.undo_move = undo_move
+        self.expand = expand
+        self.evaluate_board = evaluate_board
+        self.hash_key = lambda state: state.hash
+        self.make_null_move = FastBoard.make_null
+        self.undo_null_move = FastBoard.unmake_null
+        self.null_move_allowed = null_move_allowed
+        self.can_reduce = can_reduce
+
+    def is_game_over(self, state: FastBoard) -> bool:
+        moves = state.legal_moves()
+        return state.terminal_score(bool(moves)) is not None
+
+
+class FastMoveOrderer(MoveOrderer):
+    """chess_game.ChessMoveOrderer for FastBoard moves."""
+
+    def move_key(self, state: FastBoard, move: int) -> int:
+        return (state.turn > 0) << 14 | (move & 0x3FFF)
+
+    def score_move(self, state: FastBoard, move: int) -> int:
+        score = 0
+        promotion = move >> 14 & 7
+        if promotion:
+            score += 10 * MVV_LVA_VALUES[promotion]
+        squares = state.squares
+        victim = abs(squares[move >> 7 & 127]) or (PAWN if move >> 17 == EN_PASSANT else 0)
+        if victim:
+            score += 10 * MVV_LVA_VALUES[victim] - MVV_LVA_VALUES[abs(squares[move & 127])] + 10
+        return score
+
+
+def validate(board: chess.Board, depth: int, fast: Optional[FastBoard] = None) -> int:
+    """Walk the move trees of python-chess and FastBoard together and return the perft count.
+
+    Every node must have the same legal moves, FEN and Zobrist hash in both,
+    otherwise AssertionError names the first position that differs.
+    """
+    if fast is None:
+        fast = FastBoard.from_board(board)
+    if fast.hash != chess.polyglot.zobrist_hash(board) or fast.to_board().fen() != board.fen():
+        raise AssertionError(f"position differs from {board.fen()}: {fast.to_board().fen()}")
+    moves = {fast.to_chess_move(move): move for move in fast.legal_moves()}
+    if set(moves) != set(board.legal_moves):
+        raise AssertionError(f"moves differ for {board.fen()}: {set(moves) ^ set(board.legal_moves)}")
+    if depth == 0:
+        return 1
+    nodes = 0
+    for chess_move, move in moves.items():
+        board.push(chess_move)
+        fast.make(move)
+        nodes += validate(board, depth - 1, fast)
+        fast.unmake(move)
+        board.pop()
+    return nodes
+
+
+if __name__ == "__main__":
+    # Perft against python-chess over the benchmark positions and random games
+    from benchmark import PERFT_POSITIONS, perft
+
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    for name, fen, expected in PERFT_POSITIONS:
+        start = time.perf_counter()
+        nodes = validate(chess.Board(fen), depth)
+        status = "ok" if depth > len(expected) or nodes == expected[depth - 1] else f"FAIL (expected {expected[depth - 1]})"
+        print(f"{name}: perft {depth} = {nodes} {status} ({time.perf_counter() - start:.1f}s)")
+    rng = random.Random(0)
+    for game in range(20):
+        board = chess.Board()
+        while not board.is_game_over() and board.ply() < 200:
+            board.push(rng.choice(list(board.legal_moves)))
+            validate(board, 1)
+    print("random games ok")
+    for name, fen, _ in PERFT_POSITIONS:
+        fast = FastBoard.from_board(chess.Board(fen))
+        start = time.perf_counter()
+        nodes = fast.perft(depth)
+        fast_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        perft(chess.Board(fen), depth, chess_game.get_possible_moves, chess_game.make_move, chess_game.undo_move)
+        chess_seconds = time.perf_counter() - start
+        print(f"{name}: {nodes / fast_seconds:.0f} nodes/s, python-chess {nodes / chess_seconds:.0f} nodes/s")
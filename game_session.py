@@ -0,0 +1,126 @@
+import time
+from typing import Any, List, NamedTuple, Optional, Sequence
+
+from negamax import NegamaxSearch
+from search_control import SearchBudget
+
+
+class MoveMetrics(NamedTuple):
+    move: Any
+    depth: int
+    # Nodes searched for this move, and how many of them were answered by
+    # table entries that the searches of earlier moves stored
+    nodes: int
+    reused_nodes: int
+    # The opponent played the reply the previous search expected
+    predicted: bool
+    # The move came straight from the previous search, without searching
+    instant: bool
+    seconds: float
+
+
+class GameSession:
+    """One NegamaxSearch kept for a whole game, each move building on the last.
+
+    The transposition table, the move orderer's history and the principal
+    variation all carry over from move to move. Tell the session about every
+    move played, its own and the opponent's, with played(). While the game
+    follows the last principal variation the next search is seeded with the
+    rest of it. When the opponent plays the expected reply and the table
+    still holds the resulting position with the expected answer, searched
+    to within two plies of the last search's depth, that answer is played
+    instantly. Every move's MoveMetrics is appended to metrics.
+    """
+
+    def __init__(
+        self, search: NegamaxSearch, max_depth: int, time_limit: Optional[float] = None, instant: bool = True
+    ):
+        self.search = search
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.instant = instant
+        self.metrics: List[MoveMetrics] = []
+        # Rest of the last principal variation, from the first move not yet played
+        self.line: List[Any] = []
+        # Moves played along the line since it was searched
+        self.followed = 0
+        self.searched_depth = 0
+        self._start = 0.0
+        self._reused_hits = 0
+
+    def played(self, move: Any) -> None:
+        """Record a move made in the game, by either side."""
+        if self.line and self.line[0] == move:
+            self.line.pop(0)
+            self.followed += 1
+        else:
+            self.line = []
+            self.followed = 0
+
+    def predicted(self) -> bool:
+        # Our move and the reply both followed the line
+        return self.followed >= 2 and bool(self.line)
+
+    def instant_move(self, state: Any, is_maximizing_player: bool) -> Optional[Any]:
+        """The expected answer to a predicted reply when the table still backs it, else None."""
+        if not self.instant or not self.predicted():
+            return None
+        # Timed like a move, but the table only ages when a search follows
+        self._start = time.perf_counter()
+        entry = self.search.table_entry(state, is_maximizing_player)
+        self._mark_reused_hits()
+        move = self.line[0]
+        # Bounds are fine too: the line already names this move as the best found
+        if (
+            entry is None
+            or entry[4] != move
+            or entry[1] < max(1, self.searched_depth - 2)
+            or move not in self.search.adapter.get_possible_moves(state)
+        ):
+            return None
+        self.finish_move(move, entry[1], 0, self.line, instant=True)
+        return move
+
+    def start_move(self) -> None:
+        """Mark the start of a move's search, e.g. before handing it to a BackgroundSearch."""
+        self._start = time.perf_counter()
+        if self.search.table is not None:
+            self.search.table.new_generation()
+        self._mark_reused_hits()
+
+    def _mark_reused_hits(self) -> None:
+        # Reused hits from here on count towards the move being made
+        table = self.search.table
+        if table is not None:
+            self._reused_hits = table.reused_hits
+
+    def seed(self) -> List[Any]:
+        """Moves to search first: the rest of the line after a predicted reply."""
+        return list(self.line) if self.predicted() else []
+
+    def finish_move(self, move: Any, depth: int, nodes: int, pv: Sequence[Any], instant: bool = False) -> None:
+        """Record a finished search; pv starts with the move about to be played."""
+        table = self.search.table
+        reused = 0 if table is None else table.reused_hits - self._reused_hits
+        self.metrics.append(
+            MoveMetrics(move, depth, nodes, reused, self.predicted(), instant, time.perf_counter() - self._start)
+        )
+        if not instant:
+            self.searched_depth = depth
+        self.line = list(pv) if pv and pv[0] == move else [move]
+        self.followed = 0
+
+    def choose_move(self, state: Any, is_maximizing_player: bool) -> Any:
+        """Find the move to play in state, instantly after a predicted reply when possible."""
+        move = self.instant_move(state, is_maximizing_player)
+        if move is not None:
+            return move
+        self.start_move()
+        budget = SearchBudget(self.time_limit)
+        self.search.budget = budget
+        try:
+            _, move, depth = self.search.iterate(state, is_maximizing_player, self.max_depth, pv=self.seed())
+        finally:
+            self.search.budget = None
+        self.finish_move(move, depth, budget.nodes, self.search.pv)
+        return move
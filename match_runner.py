@@ -0,0 +1,397 @@
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import chess
+from tqdm import tqdm
+
+import chess_game
+import fastboard
+import tictactoe
+from move_ordering import MoveOrderer
+from negamax import NegamaxSearch, profile_adapter
+from opening_book import OpeningBook
+from search_stats import SearchStats
+from tablebase import Tablebase
+from transposition import TranspositionTable
+
+
+@dataclass
+class EngineConfig:
+    """How one side of a match picks its moves."""
+
+    name: str = "minimax"
+    random: bool = False
+    depth: int = 2
+    time_limit: Optional[float] = None
+    use_table: bool = True
+    use_ordering: bool = True
+    quiescence_plies: int = 0
+    # Tic-tac-toe only: play from the solved table instead of searching
+    solved: bool = False
+    # Record search statistics for every move in the game record
+    profile: bool = False
+    # Chess only: Polyglot book file to play from while the game is in it
+    book: Optional[str] = None
+    # Chess only: directory of endgame tables to probe during the search
+    tablebases: Optional[str] = None
+    # Selective search, see NegamaxSearch
+    pvs: bool = True
+    null_move: bool = False
+    reductions: bool = False
+    aspiration: bool = False
+    # Chess only: piece-square tables saved by eval_tuning
+    weights: Optional[str] = None
+    # Chess only: search on a fastboard.FastBoard, without quiescence, tablebases or weights
+    fast_board: bool = False
+
+
+def parse_engine(spec: str) -> EngineConfig:
+    """Parse "random" or comma-separated key=value pairs such as "depth=3,use_table=0"."""
+    if spec == "random":
+        return EngineConfig(name="random", random=True)
+    types = {field.name: field.type for field in fields(EngineConfig)}
+    options: Dict[str, Any] = {}
+    for pair in spec.split(","):
+        key, _, value = pair.partition("=")
+        key = key.strip()
+        if key not in types:
+            raise ValueError(f"unknown engine option {key!r}")
+        if key in ("name", "book", "tablebases", "weights"):
+            options[key] = value
+        elif types[key] in (bool, "bool"):
+            options[key] = value.lower() in ("1", "true", "yes")
+        elif types[key] in (int, "int"):
+            options[key] = int(value)
+        else:
+            options[key] = float(value)
+    if "name" not in options:
+        options["name"] = spec
+    return EngineConfig(**options)
+
+
+def search_options(config: EngineConfig) -> Dict[str, bool]:
+    return {
+        "pvs": config.pvs,
+        "null_move": config.null_move,
+        "reductions": config.reductions,
+        "aspiration": config.aspiration,
+    }
+
+
+@lru_cache(maxsize=None)
+def load_book(path: str) -> OpeningBook:
+    # One mapping per process, shared by every game it plays
+    return OpeningBook(path)
+
+
+@lru_cache(maxsize=None)
+def load_tablebase(directory: str) -> Tablebase:
+    return Tablebase(directory)
+
+
+@lru_cache(maxsize=None)
+def load_weights(path: str) -> List[List[List[float]]]:
+    return chess_game.load_piece_square_tables(path)
+
+
+class ChessEngine:
+    """Search state of one chess player for the length of a game."""
+
+    def __init__(self, config: EngineConfig, rng: random.Random):
+        self.config = config
+        self.rng = rng
+        self.stats = SearchStats() if config.profile else None
+        self.move_stats: List[Dict[str, Any]] = []
+        if config.fast_board:
+            if config.quiescence_plies or config.tablebases or config.weights:
+                raise ValueError("fast_board engines support no quiescence, tablebases or weights")
+            adapter, orderer = fastboard.FastBoardAdapter(), fastboard.FastMoveOrderer()
+        else:
+            adapter = chess_game.ChessAdapter(
+                quiescence_plies=config.quiescence_plies,
+                tablebase=load_tablebase(config.tablebases) if config.tablebases else None,
+                tables=load_weights(config.weights) if config.weights else None,
+            )
+            orderer = chess_game.ChessMoveOrderer()
+        self.search = NegamaxSearch(
+            profile_adapter(adapter, self.stats),
+            TranspositionTable() if config.use_table else None,
+            orderer if config.use_ordering else None,
+            self.stats,
+            **search_options(config),
+        )
+        self.book = load_book(config.book) if config.book else None
+        self.tablebase = load_tablebase(config.tablebases) if config.tablebases else None
+
+    def choose_move(self, state: chess.Board) -> chess.Move:
+        config = self.config
+        if config.random:
+            return self.rng.choice(list(state.legal_moves))
+        if self.book is not None:
+            move = self.book.choose_move(state, self.rng)
+            if move is not None:
+                return move
+            # Once out of book a game hardly ever returns to it
+            self.book = None
+        if self.tablebase is not None:
+            move = self.tablebase.best_move(state)
+            if move is not None:
+                return move
+        root = fastboard.FastBoard.from_board(state) if config.fast_board else state
+        if config.time_limit is not None or config.aspiration:
+            # Aspiration windows come from the previous iteration's score
+            _, move, _ = self.search.iterate(root, state.turn, config.depth, config.time_limit)
+        else:
+            _, move = self.search.search(root, config.depth, state.turn)
+        record_move_stats(self)
+        if config.fast_board and move is not None:
+            return root.to_chess_move(move)
+        return move
+
+
+class TicTacToeEngine:
+    """Search state of one tic-tac-toe player for the length of a game."""
+
+    def __init__(self, config: EngineConfig, rng: random.Random):
+        self.config = config
+        self.rng = rng
+        self.stats = SearchStats() if config.profile else None
+        self.move_stats: List[Dict[str, Any]] = []
+        self.search = NegamaxSearch(
+            profile_adapter(tictactoe.TicTacToeAdapter(), self.stats),
+            TranspositionTable() if config.use_table else None,
+            MoveOrderer() if config.use_ordering else None,
+            self.stats,
+            **search_options(config),
+        )
+
+    def choose_move(self, board: List[List[str]], is_maximizing: bool) -> Any:
+        if self.config.random:
+            return self.rng.choice(tictactoe.get_possible_moves(board))
+        if self.config.solved:
+            return tictactoe.optimal_move(board)
+        _, move = self.search.search(tictactoe.TicTacToeBoard.from_list(board), self.config.depth, is_maximizing)
+        record_move_stats(self)
+        return move
+
+
+def record_move_stats(engine: Any) -> None:
+    # Keep the statistics of the move just searched and start afresh for the next one
+    if engine.stats is not None:
+        engine.move_stats.append(engine.stats.to_dict())
+        engine.stats.reset()
+
+
+def engine_stats(engines: Dict[Any, Any], white_key: Any) -> Dict[str, Any]:
+    # Per-move statistics of the profiled sides, for the game record
+    stats = {}
+    for key, engine in engines.items():
+        if engine.stats is not None:
+            stats["white" if key == white_key else "black"] = engine.move_stats
+    return stats
+
+
+def play_chess_game(
+    white: EngineConfig, black: EngineConfig, rng: random.Random, opening_plies: int, max_plies: int
+) -> Dict[str, Any]:
+    state = chess.Board()
+    engines = {chess.WHITE: ChessEngine(white, rng), chess.BLACK: ChessEngine(black, rng)}
+    while not state.is_game_over() and len(state.move_stack) < max_plies:
+        if len(state.move_stack) < opening_plies:
+            move = rng.choice(list(state.legal_moves))
+        else:
+            move = engines[state.turn].choose_move(state)
+        state.push(move)
+    result = state.result() if state.is_game_over() else "1/2-1/2"
+    record = {"result": result, "plies": len(state.move_stack)}
+    stats = engine_stats(engines, chess.WHITE)
+    if stats:
+        record["stats"] = stats
+    return record
+
+
+def play_tictactoe_game(
+    white: EngineConfig, black: EngineConfig, rng: random.Random, opening_plies: int, max_plies: int
+) -> Dict[str, Any]:
+    board = [[" ", " ", " "] for _ in range(3)]
+    engines = {True: TicTacToeEngine(white, rng), False: TicTacToeEngine(black, rng)}
+    is_maximizing = True
+    plies = 0
+    while not tictactoe.is_game_over(board):
+        if plies < opening_plies:
+            move = rng.choice(tictactoe.get_possible_moves(board))
+        else:
+            move = engines[is_maximizing].choose_move(board, is_maximizing)
+        tictactoe.make_move(board, move, is_maximizing)
+        is_maximizing = not is_maximizing
+        plies += 1
+    if tictactoe.is_winner(board, "X"):
+        result = "1-0"
+    elif tictactoe.is_winner(board, "O"):
+        result = "0-1"
+    else:
+        result = "1/2-1/2"
+    record = {"result": result, "plies": plies}
+    stats = engine_stats(engines, True)
+    if stats:
+        record["stats"] = stats
+    return record
+
+
+GAMES = {
+    "chess": play_chess_game,
+    "tictactoe": play_tictactoe_game,
+}
+
+WHITE_SCORES = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}
+
+
+def play_match_game(
+    game: str,
+    engine_a: EngineConfig,
+    engine_b: EngineConfig,
+    index: int,
+    seed: int,
+    a_is_white: bool,
+    opening_plies: int,
+    max_plies: int,
+) -> Dict[str, Any]:
+    """Play one seeded game and report it from engine A's point of view."""
+    rng = random.Random(seed)
+    white, black = (engine_a, engine_b) if a_is_white else (engine_b, engine_a)
+    start = time.perf_counter()
+    record = GAMES[game](white, black, rng, opening_plies, max_plies)
+    white_score = WHITE_SCORES[record["result"]]
+    record.update(
+        game=index,
+        seed=seed,
+        white=white.name,
+        black=black.name,
+        score_a=white_score if a_is_white else 1.0 - white_score,
+        seconds=time.perf_counter() - start,
+    )
+    return record
+
+
+def summarize(scores: List[float]) -> Dict[str, Any]:
+    """Win/draw/loss totals for engine A with a 95% confidence interval on its score."""
+    games = len(scores)
+    wins = sum(score == 1.0 for score in scores)
+    draws = sum(score == 0.5 for score in scores)
+    losses = games - wins - draws
+    mean = sum(scores) / games if games else 0.0
+    variance = sum((score - mean) ** 2 for score in scores) / games if games else 0.0
+    margin = 1.96 * math.sqrt(variance / games) if games else 0.0
+    low, high = max(0.0, mean - margin), min(1.0, mean + margin)
+    return {
+        "games": games,
+        "wins": wins,
+        "draws": draws,
+        "losses": losses,
+        "score": mean,
+        "score_ci": (low, high),
+        "elo": elo_difference(mean),
+        "elo_ci": (elo_difference(low), elo_difference(high)),
+    }
+
+
+def elo_difference(score: float) -> float:
+    if score <= 0.0:
+        return float("-inf")
+    if score >= 1.0:
+        return float("inf")
+    return -400 * math.log10(1 / score - 1)
+
+
+def run_match(
+    game: str,
+    engine_a: EngineConfig,
+    engine_b: EngineConfig,
+    games: int,
+    workers: Optional[int] = None,
+    seed: int = 0,
+    output_path: Optional[str] = None,
+    alternate_colors: bool = True,
+    opening_plies: int = 0,
+    max_plies: int = 500,
+) -> Dict[str, Any]:
+    """Play a match across a process pool and return summarize() of the results.
+
+    Game i is seeded with seed + i, so any single game can be replayed. With
+    alternate_colors engine A takes white in even games and black in odd
+    ones. Each finished game is appended to output_path as one JSON line.
+    """
+    workers = workers or os.cpu_count() or 1
+    scores = []
+    output = open(output_path, "a") if output_path else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(
+                    play_match_game,
+                    game,
+                    engine_a,
+                    engine_b,
+                    index,
+                    seed + index,
+                    index % 2 == 0 or not alternate_colors,
+                    opening_plies,
+                    max_plies,
+                )
+                for index in range(games)
+            ]
+            for future in tqdm(as_completed(futures), total=games):
+                record = future.result()
+                scores.append(record["score_a"])
+                if output is not None:
+                    output.write(json.dumps(record) + "\n")
+                    output.flush()
+    finally:
+        if output is not None:
+            output.close()
+    return summarize(scores)
+
+
+def print_summary(name_a: str, name_b: str, summary: Dict[str, Any]) -> None:
+    low, high = summary["score_ci"]
+    elo_low, elo_high = summary["elo_ci"]
+    print(f"{name_a} vs {name_b}: +{summary['wins']} ={summary['draws']} -{summary['losses']}")
+    print(f"Score: {summary['score']:.3f} (95% CI {low:.3f}-{high:.3f})")
+    print(f"Elo: {summary['elo']:+.0f} (95% CI {elo_low:+.0f} to {elo_high:+.0f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play a seeded engine match across processes.")
+    parser.add_argument("--game", choices=sorted(GAMES), default="chess")
+    parser.add_argument("--engine-a", default="depth=2", help='"random" or key=value pairs, e.g. "depth=3,use_table=0"')
+    parser.add_argument("--engine-b", default="random")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSONL file to append per-game results to")
+    parser.add_argument("--opening-plies", type=int, default=0, help="random plies played before the engines take over")
+    parser.add_argument("--max-plies", type=int, default=500)
+    args = parser.parse_args()
+
+    engine_a = parse_engine(args.engine_a)
+    engine_b = parse_engine(args.engine_b)
+    summary = run_match(
+        args.game,
+        engine_a,
+        engine_b,
+        args.games,
+        workers=args.workers,
+        seed=args.seed,
+        output_path=args.output,
+        opening_plies=args.opening_plies,
+        max_plies=args.max_plies,
+    )
+    print_summary(engine_a.name, engine_b.name, summary)
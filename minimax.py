@@ -1,8 +1,16 @@
-from typing import Any, Callable, List, Tuple, TypeVar
+from typing import Any, Callable, List, Optional, Sequence, Tuple, TypeVar
+
+from move_ordering import MoveOrderer
+from negamax import MINIMIZING_PLAYER_KEY, CallbackAdapter, NegamaxSearch
+from search_control import SearchBudget
+from search_stats import SearchStats
+from transposition import TranspositionTable
 
 State = TypeVar("State")
 Move = TypeVar("Move")
 
+# Compatibility shim over negamax.NegamaxSearch: wraps the callbacks in an
+# adapter and runs one search, so the recursion no longer passes them per node
 def minimax(
     state: State,
     get_possible_moves: Callable[[State], List[Move]],
@@ -14,60 +22,61 @@ def minimax(
     is_maximizing_player: bool,
     alpha: float = float("-inf"),
     beta: float = float("inf"),
+    hash_key: Optional[Callable[[State], int]] = None,
+    table: Optional[TranspositionTable] = None,
+    budget: Optional[SearchBudget] = None,
+    pv: Sequence[Move] = (),
+    pv_line: Optional[List[Move]] = None,
+    move_orderer: Optional[MoveOrderer] = None,
+    stats: Optional[SearchStats] = None,
+    ply: int = 0,
+    quiescence: Optional[Callable[[State, float, float], float]] = None,
 ) -> Tuple[float, Any]:
-    if depth == 0 or is_game_over(state):
-        return evaluate_board(state), None
+    adapter = CallbackAdapter(
+        get_possible_moves,
+        make_move,
+        undo_move,
+        is_game_over,
+        evaluate_board,
+        hash_key,
+        quiescence,
+    )
+    search = NegamaxSearch(adapter, table, move_orderer, stats, budget)
+    return search.search(state, depth, is_maximizing_player, alpha, beta, pv, pv_line, ply)
+
 
-    if is_maximizing_player:
-        max_eval = float("-inf")
-        best_move = None
-        #sorted_moves = sorted(get_possible_moves(state), key=lambda move: evaluate_board(make_move(state, move, is_maximizing_player)))
-        for move in get_possible_moves(state):
-            make_move(state, move, is_maximizing_player)
-            evaluation, _ = minimax(
-                state,
-                get_possible_moves,
-                make_move,
-                undo_move,
-                is_game_over,
-                evaluate_board,
-                depth - 1,
-                False,
-                alpha,
-                beta,
-            )
-            undo_move(state, move, is_maximizing_player)
-            if evaluation > max_eval:
-                max_eval = evaluation
-                best_move = move
-            alpha = max(alpha, max_eval)
-            if alpha > beta:
-                break
-        return max_eval, best_move
-    else:
-        min_eval = float("inf")
-        best_move = None
-        #sorted_moves = sorted(get_possible_moves(state), key=lambda move: -evaluate_board(make_move(state, move, is_maximizing_player)))
+def iterative_deepening(
+    state: State,
+    get_possible_moves: Callable[[State], List[Move]],
+    make_move: Callable[[State, Move, bool], None],
+    undo_move: Callable[[State, Move, bool], None],
+    is_game_over: Callable[[State], bool],
+    evaluate_board: Callable[[State], float],
+    is_maximizing_player: bool,
+    max_depth: int = 64,
+    time_limit: Optional[float] = None,
+    node_limit: Optional[int] = None,
+    hash_key: Optional[Callable[[State], int]] = None,
+    table: Optional[TranspositionTable] = None,
+    budget: Optional[SearchBudget] = None,
+    move_orderer: Optional[MoveOrderer] = None,
+    stats: Optional[SearchStats] = None,
+    quiescence: Optional[Callable[[State, float, float], float]] = None,
+) -> Tuple[float, Any, int]:
+    """Search depth 1, 2, 3... until max_depth or until the budget runs out.
 
-        for move in get_possible_moves(state):
-            make_move(state, move, is_maximizing_player)
-            evaluation, _ = minimax(
-                state,
-                get_possible_moves,
-                make_move,
-                undo_move,
-                is_game_over,
-                evaluate_board,
-                depth - 1,
-                True,
-                alpha,
-                beta,
-            )
-            undo_move(state, move, is_maximizing_player)
-            if evaluation < min_eval:
-                min_eval = evaluation
-                best_move = move
-            beta = min(beta, min_eval)
-            if alpha > beta:
-                break
-        return min_eval, best_move
+    Each iteration searches the previous principal variation first. Returns
+    the score and move of the deepest completed iteration together with that
+    depth. Depth 1 always runs to completion so there is always a move.
+    """
+    adapter = CallbackAdapter(
+        get_possible_moves,
+        make_move,
+        undo_move,
+        is_game_over,
+        evaluate_board,
+        hash_key,
+        quiescence,
+    )
+    search = NegamaxSearch(adapter, table, move_orderer, stats, budget)
+    return search.iterate(state, is_maximizing_player, max_depth, time_limit, node_limit)
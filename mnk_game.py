@@ -0,0 +1,338 @@
+import argparse
+import random
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from move_ordering import MoveOrderer
+from negamax import GameAdapter, NegamaxSearch
+from transposition import TranspositionTable
+
+# Score of a won game, less one per stone on the board so quicker wins score higher
+WIN_SCORE = 1000.0
+# Empty cells this far from a stone, in rows or columns, are considered for a move
+DEFAULT_RADIUS = 2
+
+
+class Geometry:
+    """Everything about an m,n,k board that does not depend on the stones.
+
+    Cell (row, col) is bit row * stride + col of a player's mask. Each row is
+    followed by radius unused bits, so shifting a mask by up to radius
+    columns never wraps a stone onto the next row. Built once per board
+    shape by geometry().
+    """
+
+    def __init__(self, rows: int, cols: int, k: int, radius: int = DEFAULT_RADIUS):
+        if not 1 <= k <= max(rows, cols):
+            raise ValueError(f"no line of {k} fits a {rows}x{cols} board")
+        self.rows, self.cols, self.k, self.radius = rows, cols, k, radius
+        self.stride = cols + radius
+        self.cells = [row * self.stride + col for row in range(rows) for col in range(cols)]
+        self.board_mask = sum(1 << cell for cell in self.cells)
+        # Every run of k cells in a row, column or diagonal
+        self.line_masks: List[int] = []
+        self.line_cells: List[Tuple[int, ...]] = []
+        for row in range(rows):
+            for col in range(cols):
+                for row_step, col_step in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    end_row, end_col = row + row_step * (k - 1), col + col_step * (k - 1)
+                    if 0 <= end_row < rows and 0 <= end_col < cols:
+                        cells = tuple(self.cell(row + row_step * i, col + col_step * i) for i in range(k))
+                        self.line_cells.append(cells)
+                        self.line_masks.append(sum(1 << cell for cell in cells))
+        # Indexes of the lines through each cell
+        self.lines_through: List[List[int]] = [[] for _ in range(rows * self.stride)]
+        for line, cells in enumerate(self.line_cells):
+            for cell in cells:
+                self.lines_through[cell].append(line)
+        self.neighbour_shifts = [
+            row * self.stride + col for row in range(-radius, radius + 1) for col in range(-radius, radius + 1)
+        ]
+        # Heuristic value of a line holding only one side's stones, by their number
+        self.line_weights = [0.0] + [0.01 * 8 ** (count - 1) for count in range(1, k)] + [0.0]
+        rng = random.Random(0x3A7C)
+        self.zobrist = [(rng.getrandbits(64), rng.getrandbits(64)) for _ in range(rows * self.stride)]
+
+    def cell(self, row: int, col: int) -> int:
+        return row * self.stride + col
+
+    def row_col(self, cell: int) -> Tuple[int, int]:
+        return divmod(cell, self.stride)
+
+    def near(self, stones: int) -> int:
+        """Cells within radius rows and columns of a stone, stones included."""
+        near = 0
+        for shift in self.neighbour_shifts:
+            near |= stones << shift if shift >= 0 else stones >> -shift
+        return near & self.board_mask
+
+
+@lru_cache(maxsize=None)
+def geometry(rows: int, cols: int, k: int, radius: int = DEFAULT_RADIUS) -> Geometry:
+    return Geometry(rows, cols, k, radius)
+
+
+class MNKBoard:
+    """An m,n,k-game position: X and O take turns and k in a row wins.
+
+    X moves first and is the maximizing player, as in tictactoe. Stones are
+    two bitmasks, and moves are cell numbers from Geometry.cell(). make and
+    unmake only touch the lines through the cell played: they keep each
+    line's stone counts, the heuristic score, the Zobrist hash, the lines
+    where one side needs a single stone more and those where it needs two,
+    and find a win from the counts of those lines alone.
+    """
+
+    def __init__(self, rows: int = 15, cols: int = 15, k: int = 5, radius: int = DEFAULT_RADIUS):
+        self.geometry = geometry(rows, cols, k, radius)
+        lines = len(self.geometry.line_masks)
+        self.stones = [0, 0]
+        self.counts = [[0] * lines, [0] * lines]
+        # Lines where a side has k - 1 stones and the other side none
+        self.threats = (set(), set())
+        # Lines where a side has at least k - 2 stones and the other side none
+        self.open_lines = (set(), set())
+        self.turn = 0
+        self.moves: List[int] = []
+        self.winner: Optional[int] = None
+        self.score = 0.0
+        self.hash = 0
+
+    def is_full(self) -> bool:
+        return len(self.moves) == len(self.geometry.cells)
+
+    def make(self, cell: int) -> None:
+        side = self.turn
+        geometry = self.geometry
+        self.stones[side] |= 1 << cell
+        self.hash ^= geometry.zobrist[cell][side]
+        self.moves.append(cell)
+        self._count(cell, side, 1)
+        self.turn = 1 - side
+
+    def unmake(self, cell: int) -> None:
+        side = 1 - self.turn
+        self.stones[side] &= ~(1 << cell)
+        self.hash ^= self.geometry.zobrist[cell][side]
+        self.moves.pop()
+        self.winner = None
+        self._count(cell, side, -1)
+        self.turn = side
+
+    def _count(self, cell: int, side: int, change: int) -> None:
+        geometry = self.geometry
+        k = geometry.k
+        weights = geometry.line_weights
+        own, other = self.counts[side], self.counts[1 - side]
+        own_threats, other_threats = self.threats[side], self.threats[1 - side]
+        own_open, other_open = self.open_lines[side], self.open_lines[1 - side]
+        sign = 1.0 if side == 0 else -1.0
+        score = self.score
+        for line in geometry.lines_through[cell]:
+            before = own[line]
+            after = own[line] = before + change
+            opposing = other[line]
+            if opposing:
+                # The line was or becomes dead to both sides
+                if before == 0:
+                    score += sign * weights[opposing]
+                    other_threats.discard(line)
+                    other_open.discard(line)
+                elif after == 0:
+                    score -= sign * weights[opposing]
+                    if opposing == k - 1:
+                        other_threats.add(line)
+                    if opposing >= k - 2:
+                        other_open.add(line)
+                continue
+            score += sign * (weights[after] - weights[before])
+            if after == k - 1:
+                own_threats.add(line)
+            elif before == k - 1:
+                own_threats.discard(line)
+            if after >= k - 2 and after:
+                own_open.add(line)
+            else:
+                own_open.discard(line)
+            if after == k:
+                self.winner = side
+        self.score = score
+
+    def threat_cells(self, side: int) -> List[int]:
+        """Empty cells that would complete a line of side's."""
+        empty = ~(self.stones[0] | self.stones[1])
+        masks = self.geometry.line_masks
+        cells = set()
+        for line in self.threats[side]:
+            gap = masks[line] & empty
+            cells.add(gap.bit_length() - 1)
+        return sorted(cells)
+
+    def candidate_moves(self) -> List[int]:
+        """A winning move if there is one, else the blocks of the opponent's wins, else cells near stones."""
+        side = self.turn
+        if self.threats[side]:
+            return self.threat_cells(side)[:1]
+        if self.threats[1 - side]:
+            return self.threat_cells(1 - side)
+        geometry = self.geometry
+        occupied = self.stones[0] | self.stones[1]
+        if not occupied:
+            return [geometry.cell(geometry.rows // 2, geometry.cols // 2)]
+        free = geometry.near(occupied) & ~occupied
+        moves = []
+        while free:
+            bit = free & -free
+            moves.append(bit.bit_length() - 1)
+            free ^= bit
+        return moves
+
+    def terminal_score(self) -> Optional[float]:
+        if self.winner is not None:
+            score = WIN_SCORE - len(self.moves)
+            return score if self.winner == 0 else -score
+        if self.is_full():
+            return 0.0
+        return None
+
+    def __str__(self) -> str:
+        geometry = self.geometry
+        rows = []
+        for row in range(geometry.rows):
+            marks = []
+            for col in range(geometry.cols):
+                bit = 1 << geometry.cell(row, col)
+                marks.append("X" if self.stones[0] & bit else "O" if self.stones[1] & bit else ".")
+            rows.append(" ".join(marks))
+        return "\n".join(rows)
+
+
+# Functions with the minimax callback signatures, X maximizing
+
+
+def get_possible_moves(board: MNKBoard) -> List[int]:
+    return board.candidate_moves()
+
+
+def make_move(board: MNKBoard, move: int, is_maximizing: bool) -> None:
+    board.make(move)
+
+
+def undo_move(board: MNKBoard, move: int, is_maximizing: bool) -> None:
+    board.unmake(move)
+
+
+def is_game_over(board: MNKBoard) -> bool:
+    return board.winner is not None or board.is_full()
+
+
+def evaluate_board(board: MNKBoard) -> float:
+    score = board.terminal_score()
+    return board.score if score is None else score
+
+
+def hash_key(board: MNKBoard) -> int:
+    return board.hash
+
+
+def expand(board: MNKBoard) -> Tuple[List[int], Optional[float]]:
+    score = board.terminal_score()
+    if score is not None:
+        return [], score
+    return board.candidate_moves(), None
+
+
+class MNKAdapter(GameAdapter):
+    """The functions of this module as one adapter for negamax.NegamaxSearch."""
+
+    def __init__(self):
+        self.get_possible_moves = get_possible_moves
+        self.make_move = make_move
+        self.undo_move = undo_move
+        self.is_game_over = is_game_over
+        self.evaluate_board = evaluate_board
+        self.hash_key = hash_key
+        self.expand = expand
+
+
+class MNKMoveOrderer(MoveOrderer):
+    """Search moves that extend or block lines one stone short of a threat first.
+
+    Other moves score 0 and are left to the killer and history tables. The
+    scores of a position's cells come from its open lines and are worked
+    out once, on the first move scored there.
+    """
+
+    def __init__(self, max_ply: int = 128):
+        super().__init__(max_ply)
+        self._scored_hash: Optional[int] = None
+        self._scores: Dict[int, int] = {}
+
+    def score_move(self, board: MNKBoard, move: int) -> int:
+        if board.hash != self._scored_hash:
+            self._scored_hash = board.hash
+            self._scores = self.cell_scores(board)
+        return self._scores.get(move, 0)
+
+    def cell_scores(self, board: MNKBoard) -> Dict[int, int]:
+        # Extending an own line counts double, blocking one of the opponent's once
+        geometry = board.geometry
+        empty = ~(board.stones[0] | board.stones[1])
+        scores: Dict[int, int] = {}
+        for side, weight in ((board.turn, 2), (1 - board.turn, 1)):
+            counts = board.counts[side]
+            for line in board.open_lines[side]:
+                value = weight * counts[line]
+                for cell in geometry.line_cells[line]:
+                    if empty >> cell & 1:
+                        scores[cell] = scores.get(cell, 0) + value
+        return scores
+
+
+def new_search(table_entries: int = 1 << 18) -> NegamaxSearch:
+    return NegamaxSearch(MNKAdapter(), TranspositionTable(table_entries), MNKMoveOrderer())
+
+
+def parse_cell(board: MNKBoard, text: str) -> Optional[int]:
+    # "row col", counted from 1
+    try:
+        row, col = (int(part) - 1 for part in text.split())
+    except ValueError:
+        return None
+    geometry = board.geometry
+    if not (0 <= row < geometry.rows and 0 <= col < geometry.cols):
+        return None
+    cell = geometry.cell(row, col)
+    if (board.stones[0] | board.stones[1]) >> cell & 1:
+        return None
+    return cell
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play an m,n,k-game such as gomoku against the engine.")
+    parser.add_argument("--rows", type=int, default=15)
+    parser.add_argument("--cols", type=int, default=15)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--time", type=float, default=2.0, help="seconds per engine move")
+    parser.add_argument("--human", choices=("x", "o", "none"), default="x", help="side you play, none for self-play")
+    args = parser.parse_args()
+
+    board = MNKBoard(args.rows, args.cols, args.k)
+    search = new_search()
+    while not is_game_over(board):
+        print(board)
+        if args.human != "none" and board.turn == "xo".index(args.human):
+            cell = parse_cell(board, input("Your move (row col): "))
+            while cell is None:
+                cell = parse_cell(board, input("Invalid move. Your move (row col): "))
+        else:
+            start = time.perf_counter()
+            score, cell, depth = search.iterate(board, board.turn == 0, args.depth, args.time)
+            row, col = board.geometry.row_col(cell)
+            seconds = time.perf_counter() - start
+            print(f"Engine plays {row + 1} {col + 1} (depth {depth}, score {score:.2f}, {seconds:.2f}s)")
+        board.make(cell)
+    print(board)
+    print({0: "X wins", 1: "O wins", None: "Draw"}[board.winner])
@@ -0,0 +1,63 @@
+from typing import Any, Dict, Hashable, List
+
+# Sort keys of the ordering tiers, each above anything the tier below can reach
+HASH_MOVE_SCORE = 3_000_000_000
+TACTICAL_SCORE = 2_000_000_000
+KILLER_SCORE = 1_000_000_000
+
+
+class MoveOrderer:
+    """Move-ordering hook for minimax.
+
+    Moves are searched hash move first, then tactical moves by score_move,
+    then the killer moves of the ply, then quiet moves by history score.
+    Games plug in their own tactical scoring by overriding score_move and
+    move_key; the killer and history tables live for as long as the orderer,
+    so reusing one across searches keeps what earlier searches learned.
+    """
+
+    def __init__(self, max_ply: int = 128):
+        self.max_ply = max_ply
+        self.killers: List[List[Any]] = [[None, None] for _ in range(max_ply)]
+        self.history: Dict[Hashable, int] = {}
+
+    def clear(self) -> None:
+        self.killers = [[None, None] for _ in range(self.max_ply)]
+        self.history = {}
+
+    def move_key(self, state: Any, move: Any) -> Hashable:
+        return move
+
+    def score_move(self, state: Any, move: Any) -> int:
+        # Positive for captures, promotions and the like; 0 for quiet moves
+        return 0
+
+    def order(self, state: Any, moves: List[Any], hash_move: Any, ply: int) -> List[Any]:
+        killers = self.killers[ply] if ply < self.max_ply else (None, None)
+        history = self.history
+
+        def sort_key(move: Any) -> int:
+            if move == hash_move:
+                return HASH_MOVE_SCORE
+            tactical = self.score_move(state, move)
+            if tactical > 0:
+                return TACTICAL_SCORE + tactical
+            if move == killers[0]:
+                return KILLER_SCORE + 1
+            if move == killers[1]:
+                return KILLER_SCORE
+            return history.get(self.move_key(state, move), 0)
+
+        return sorted(moves, key=sort_key, reverse=True)
+
+    def record_cutoff(self, state: Any, move: Any, depth: int, ply: int) -> None:
+        # Only quiet moves are remembered, tactical moves already sort first
+        if self.score_move(state, move) > 0:
+            return
+        if ply < self.max_ply:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        key = self.move_key(state, move)
+        self.history[key] = self.history.get(key, 0) + depth * depth
@@ -0,0 +1,481 @@
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from move_ordering import MoveOrderer
+from search_control import SearchBudget, SearchTimeout
+from search_stats import SearchStats
+from transposition import EXACT, LOWER_BOUND, UPPER_BOUND, Entry, TranspositionTable
+
+# Mixed into the position key so the same state with a different player to move
+# gets its own table entry (tic-tac-toe keys do not encode the player)
+MINIMIZING_PLAYER_KEY = 0x9D39247E33776D41
+
+# Width of the null window used by principal-variation search to test a move
+PVS_WINDOW = 1e-7
+
+# Null-move pruning: plies skipped by the reduced search, plus one from depth 6 on
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 2
+# Late-move reductions: moves from this index on, at this depth and deeper
+LMR_MIN_DEPTH = 3
+LMR_FIRST_MOVE = 3
+# Moves from this index on are reduced by two plies instead of one
+LMR_DEEP_MOVE = 8
+# Half-width of the aspiration window around the previous iteration's score
+ASPIRATION_WINDOW = 0.5
+
+
+class GameAdapter:
+    """Everything the negamax core needs to know about a game, in one object.
+
+    The methods mirror the callbacks minimax takes, and scores keep their
+    meaning: evaluate_board is from the maximizing player's point of view.
+    Subclasses may assign plain functions to these names in __init__, which
+    saves a method binding per call. hash_key and quiescence are optional and
+    left as None when a game does not provide them.
+
+    So are the hooks of selective search. Null-move pruning needs
+    make_null_move and undo_null_move, which pass the turn, and
+    null_move_allowed, which rules out positions where passing could be the
+    best move. Late-move reductions need can_reduce, true for moves that are
+    safe to search less deeply, such as quiet moves out of check.
+    """
+
+    hash_key: Optional[Callable[[Any], int]] = None
+    quiescence: Optional[Callable[[Any, float, float], float]] = None
+    make_null_move: Optional[Callable[[Any], None]] = None
+    undo_null_move: Optional[Callable[[Any], None]] = None
+    null_move_allowed: Optional[Callable[[Any], bool]] = None
+    can_reduce: Optional[Callable[[Any, Any], bool]] = None
+
+    def start_search(self, state: Any) -> None:
+        # Called once per search with the root state, before any move is made
+        pass
+
+    def get_possible_moves(self, state: Any) -> List[Any]:
+        raise NotImplementedError
+
+    def make_move(self, state: Any, move: Any, is_maximizing_player: bool) -> None:
+        raise NotImplementedError
+
+    def undo_move(self, state: Any, move: Any, is_maximizing_player: bool) -> None:
+        raise NotImplementedError
+
+    def is_game_over(self, state: Any) -> bool:
+        raise NotImplementedError
+
+    def evaluate_board(self, state: Any) -> float:
+        raise NotImplementedError
+
+    def expand(self, state: Any) -> Tuple[List[Any], Optional[float]]:
+        """Return the moves of an interior node and its score if the game is over.
+
+        The default asks is_game_over and get_possible_moves separately; games
+        where both come from the same work should override it to do it once.
+        """
+        if self.is_game_over(state):
+            return [], self.evaluate_board(state)
+        return self.get_possible_moves(state), None
+
+
+class CallbackAdapter(GameAdapter):
+    """Adapter built from the separate callables minimax has always taken."""
+
+    def __init__(
+        self,
+        get_possible_moves: Callable,
+        make_move: Callable,
+        undo_move: Callable,
+        is_game_over: Callable,
+        evaluate_board: Callable,
+        hash_key: Optional[Callable] = None,
+        quiescence: Optional[Callable] = None,
+    ):
+        self.get_possible_moves = get_possible_moves
+        self.make_move = make_move
+        self.undo_move = undo_move
+        self.is_game_over = is_game_over
+        self.evaluate_board = evaluate_board
+        self.hash_key = hash_key
+        self.quiescence = quiescence
+
+
+class ProfiledAdapter(GameAdapter):
+    """Wraps another adapter and times each of its callbacks into a SearchStats.
+
+    Only searches given a ProfiledAdapter pay for the clock calls. When the
+    wrapped adapter overrides expand, as ChessAdapter does, move generation
+    and the game-over test are timed together under "expand".
+    """
+
+    def __init__(self, adapter: GameAdapter, stats: SearchStats):
+        self.adapter = adapter
+        self.stats = stats
+        self.get_possible_moves = self._timed("get_possible_moves", adapter.get_possible_moves)
+        self.make_move = self._timed("make_move", adapter.make_move)
+        self.undo_move = self._timed("undo_move", adapter.undo_move)
+        self.is_game_over = self._timed("is_game_over", adapter.is_game_over)
+        self.evaluate_board = self._timed("evaluate_board", adapter.evaluate_board)
+        if adapter.hash_key is not None:
+            self.hash_key = self._timed("hash_key", adapter.hash_key)
+        if adapter.quiescence is not None:
+            self.quiescence = self._timed("quiescence", adapter.quiescence)
+        for name in ("make_null_move", "undo_null_move", "null_move_allowed", "can_reduce"):
+            if getattr(adapter, name) is not None:
+                setattr(self, name, self._timed(name, getattr(adapter, name)))
+        if "expand" in vars(adapter) or type(adapter).expand is not GameAdapter.expand:
+            self.expand = self._timed("expand", adapter.expand)
+
+    def _timed(self, name: str, function: Callable) -> Callable:
+        record_call = self.stats.record_call
+        clock = time.perf_counter
+
+        def timed(*args):
+            start = clock()
+            try:
+                return function(*args)
+            finally:
+                record_call(name, clock() - start)
+
+        return timed
+
+    def start_search(self, state: Any) -> None:
+        self.adapter.start_search(state)
+
+
+def profile_adapter(adapter: GameAdapter, stats: Optional[SearchStats]) -> GameAdapter:
+    """Wrap adapter in a ProfiledAdapter feeding stats, or return it as is without stats."""
+    if stats is None:
+        return adapter
+    return ProfiledAdapter(adapter, stats)
+
+
+class NegamaxSearch:
+    """Negamax alpha-beta with principal-variation search over a GameAdapter.
+
+    The adapter's methods are bound once here, so a node only passes depth,
+    window and ply down the recursion and both players share one loop. Scores
+    handed in and out of search() and iterate() are from the maximizing
+    player's point of view, as with minimax. Table, orderer, stats and budget
+    are all optional and persist for as long as the search object does.
+
+    Selective search is switched on per technique. pvs tests every move after
+    the first with a null window and re-searches the ones that beat it.
+    null_move lets the side to move pass at reduced depth and prunes the node
+    when even that fails high. reductions searches late moves the adapter can
+    reduce a ply or two shallower, re-searching those that beat alpha.
+    aspiration starts each iteration with a window around the last score and
+    widens it after a fail. null_move and reductions are ignored for
+    adapters without the hooks they need.
+    """
+
+    def __init__(
+        self,
+        adapter: GameAdapter,
+        table: Optional[TranspositionTable] = None,
+        move_orderer: Optional[MoveOrderer] = None,
+        stats: Optional[SearchStats] = None,
+        budget: Optional[SearchBudget] = None,
+        pvs: bool = True,
+        null_move: bool = False,
+        reductions: bool = False,
+        aspiration: bool = False,
+    ):
+        if table is not None and adapter.hash_key is None:
+            raise ValueError("a transposition table needs an adapter with hash_key")
+        self.adapter = adapter
+        self.table = table
+        self.move_orderer = move_orderer
+        self.stats = stats
+        self.budget = budget
+        self.pvs = pvs
+        self.null_move = null_move and adapter.make_null_move is not None
+        self.reductions = reductions and adapter.can_reduce is not None
+        self.aspiration = aspiration
+        self.expand = adapter.expand
+        self.make_move = adapter.make_move
+        self.undo_move = adapter.undo_move
+        self.evaluate_board = adapter.evaluate_board
+        self.hash_key = adapter.hash_key
+        self.quiescence = adapter.quiescence
+        self.make_null_move = adapter.make_null_move
+        self.undo_null_move = adapter.undo_null_move
+        self.null_move_allowed = adapter.null_move_allowed
+        self.can_reduce = adapter.can_reduce
+        self.state: Any = None
+        self.root_ply = 0
+        self.root_move: Any = None
+        # Principal variation of the last iterate() call
+        self.pv: List[Any] = []
+
+    def search(
+        self,
+        state: Any,
+        depth: int,
+        is_maximizing_player: bool,
+        alpha: float = float("-inf"),
+        beta: float = float("inf"),
+        pv: Sequence[Any] = (),
+        pv_line: Optional[List[Any]] = None,
+        ply: int = 0,
+    ) -> Tuple[float, Any]:
+        """Search state to depth and return (score, best move)."""
+        self.state = state
+        self.root_ply = ply
+        self.root_move = None
+        self.adapter.start_search(state)
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+        try:
+            if is_maximizing_player:
+                return self._negamax(depth, alpha, beta, 1, ply, pv, pv_line), self.root_move
+            return -self._negamax(depth, -beta, -alpha, -1, ply, pv, pv_line), self.root_move
+        finally:
+            if stats is not None:
+                stats.record_search(time.perf_counter() - start)
+
+    def aspiration_search(
+        self,
+        state: Any,
+        depth: int,
+        is_maximizing_player: bool,
+        guess: Optional[float] = None,
+        pv: Sequence[Any] = (),
+        pv_line: Optional[List[Any]] = None,
+    ) -> Tuple[float, Any]:
+        """search() within ASPIRATION_WINDOW of guess, opening the side it fails on.
+
+        Without aspiration or a guess this is a full-window search.
+        """
+        if not self.aspiration or guess is None or abs(guess) == float("inf"):
+            return self.search(state, depth, is_maximizing_player, pv=pv, pv_line=pv_line)
+        alpha, beta = guess - ASPIRATION_WINDOW, guess + ASPIRATION_WINDOW
+        while True:
+            line = None if pv_line is None else []
+            score, move = self.search(state, depth, is_maximizing_player, alpha, beta, pv, line)
+            if score <= alpha:
+                alpha = float("-inf")
+            elif score >= beta:
+                beta = float("inf")
+            else:
+                break
+            if self.stats is not None:
+                self.stats.record_aspiration_fail()
+        if pv_line is not None:
+            pv_line[:] = line
+        return score, move
+
+    def iterate(
+        self,
+        state: Any,
+        is_maximizing_player: bool,
+        max_depth: int = 64,
+        time_limit: Optional[float] = None,
+        node_limit: Optional[int] = None,
+        pv: Sequence[Any] = (),
+    ) -> Tuple[float, Any, int]:
+        """Iterative deepening: search depth 1, 2, 3... until max_depth or the budget runs out.
+
+        Each iteration searches the previous principal variation first, and pv
+        seeds the first ones, e.g. with the rest of an earlier search's line
+        after the moves since played. Returns the score and move of the
+        deepest completed iteration together with that depth. Depth 1 always
+        runs to completion so there is always a move. A budget set on the
+        search object takes precedence over the limits.
+        """
+        saved_budget = self.budget
+        budget = saved_budget if saved_budget is not None else SearchBudget(time_limit, node_limit)
+        self.budget = None
+        try:
+            score, move = self.search(state, 1, is_maximizing_player, pv=pv)
+            completed_depth = 1
+            # A seeded line keeps guiding the next iterations while depth 1 agrees with it
+            if not (pv and pv[0] == move):
+                pv = [] if move is None else [move]
+            self.budget = budget
+            for depth in range(2, max_depth + 1):
+                if move is None or budget.stopped:
+                    break
+                line: List[Any] = []
+                try:
+                    score, move = self.aspiration_search(state, depth, is_maximizing_player, score, pv, line)
+                except SearchTimeout:
+                    break
+                completed_depth = depth
+                pv = line
+        finally:
+            self.budget = saved_budget
+        self.pv = list(pv)
+        return score, move, completed_depth
+
+    def table_entry(self, state: Any, is_maximizing_player: bool) -> Optional[Entry]:
+        """The transposition table entry a search of state would start from, if any."""
+        if self.table is None:
+            return None
+        key = self.hash_key(state)
+        if not is_maximizing_player:
+            key ^= MINIMIZING_PLAYER_KEY
+        return self.table.probe(key)
+
+    def _negamax(
+        self,
+        depth: int,
+        alpha: float,
+        beta: float,
+        color: int,
+        ply: int,
+        pv: Sequence[Any],
+        pv_line: Optional[List[Any]],
+    ) -> float:
+        state = self.state
+        if self.budget is not None:
+            self.budget.tick()
+        if self.stats is not None:
+            self.stats.record_node(ply)
+        if depth == 0:
+            if self.stats is not None:
+                self.stats.record_leaf()
+            if self.quiescence is not None:
+                # Let the game resolve tactics below the horizon within our window
+                if color == 1:
+                    return self.quiescence(state, alpha, beta)
+                return -self.quiescence(state, -beta, -alpha)
+            return color * self.evaluate_board(state)
+        moves, terminal = self.expand(state)
+        if terminal is not None:
+            if self.stats is not None:
+                self.stats.record_leaf()
+            return color * terminal
+
+        table = self.table
+        hash_move = None
+        if table is not None:
+            key = self.hash_key(state)
+            if color == -1:
+                key ^= MINIMIZING_PLAYER_KEY
+            entry = table.probe(key)
+            if self.stats is not None:
+                self.stats.record_probe(entry is not None)
+            if entry is not None:
+                _, entry_depth, flag, score, hash_move, _ = entry
+                if entry_depth >= depth and (ply != self.root_ply or hash_move in moves):
+                    if flag == EXACT:
+                        if pv_line is not None:
+                            pv_line[:] = [hash_move]
+                        if ply == self.root_ply:
+                            self.root_move = hash_move
+                        return score
+                    if flag == LOWER_BOUND:
+                        alpha = max(alpha, score)
+                    else:
+                        beta = min(beta, score)
+                    if alpha >= beta:
+                        if ply == self.root_ply:
+                            self.root_move = hash_move
+                        return score
+            alpha_orig, beta_orig = alpha, beta
+        if (
+            self.null_move
+            and depth >= NULL_MOVE_MIN_DEPTH
+            and ply != self.root_ply
+            and beta < float("inf")
+            and self.null_move_allowed(state)
+        ):
+            # If passing still reaches beta, a real move would too
+            reduction = NULL_MOVE_REDUCTION + (depth >= 6)
+            self.make_null_move(state)
+            try:
+                score = -self._negamax(
+                    max(0, depth - 1 - reduction), -beta, -beta + PVS_WINDOW, -color, ply + 1, (), None
+                )
+            finally:
+                self.undo_null_move(state)
+            if self.stats is not None:
+                self.stats.record_null_move(score >= beta)
+            if score >= beta:
+                # Fail hard, a pass proves no exact score
+                return beta
+        if self.move_orderer is not None:
+            moves = self.move_orderer.order(state, moves, hash_move, ply)
+        elif hash_move in moves:
+            # Search the stored best move first, it is the most likely to cut off
+            moves.remove(hash_move)
+            moves.insert(0, hash_move)
+        # The previous iteration's principal variation goes before the hash move
+        if pv and pv[0] in moves:
+            moves.remove(pv[0])
+            moves.insert(0, pv[0])
+
+        is_maximizing_player = color == 1
+        best_score = float("-inf")
+        best_move = None
+        for index, move in enumerate(moves):
+            child_pv = pv[1:] if pv and move == pv[0] else ()
+            child_line = None if pv_line is None else []
+            reduction = 0
+            if self.reductions and depth >= LMR_MIN_DEPTH and index >= LMR_FIRST_MOVE and self.can_reduce(state, move):
+                reduction = min(1 if index < LMR_DEEP_MOVE else 2, depth - 2)
+            self.make_move(state, move, is_maximizing_player)
+            try:
+                if reduction:
+                    # A late move is first tested shallower and kept there unless it beats alpha
+                    score = -self._negamax(
+                        depth - 1 - reduction, -alpha - PVS_WINDOW, -alpha, -color, ply + 1, child_pv, None
+                    )
+                    if self.stats is not None:
+                        self.stats.record_reduction(score > alpha)
+                if not reduction or score > alpha:
+                    if index == 0 or not self.pvs:
+                        score = -self._negamax(depth - 1, -beta, -alpha, -color, ply + 1, child_pv, child_line)
+                    else:
+                        # Prove the move is no better than alpha with a null window first
+                        score = -self._negamax(
+                            depth - 1, -alpha - PVS_WINDOW, -alpha, -color, ply + 1, child_pv, child_line
+                        )
+                        if alpha < score < beta:
+                            child_line = None if pv_line is None else []
+                            score = -self._negamax(
+                                depth - 1, -beta, -alpha, -color, ply + 1, child_pv, child_line
+                            )
+            finally:
+                # Leave the state intact when a budget aborts the search
+                self.undo_move(state, move, is_maximizing_player)
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if pv_line is not None:
+                    pv_line[:] = [move] + child_line
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if self.move_orderer is not None:
+                            self.move_orderer.record_cutoff(state, move, depth, ply)
+                        if self.stats is not None:
+                            self.stats.record_cutoff(index)
+                        break
+
+        if ply == self.root_ply:
+            self.root_move = best_move
+        if table is not None and best_move is not None:
+            if best_score <= alpha_orig:
+                flag = UPPER_BOUND
+            elif best_score >= beta_orig:
+                flag = LOWER_BOUND
+            else:
+                flag = EXACT
+            table.store(key, depth, flag, best_score, best_move)
+        return best_score
+
+
+def negamax(
+    adapter: GameAdapter,
+    state: Any,
+    depth: int,
+    is_maximizing_player: bool,
+    table: Optional[TranspositionTable] = None,
+    move_orderer: Optional[MoveOrderer] = None,
+    stats: Optional[SearchStats] = None,
+) -> Tuple[float, Any]:
+    """One-off fixed-depth search, see NegamaxSearch for repeated use."""
+    return NegamaxSearch(adapter, table, move_orderer, stats).search(state, depth, is_maximizing_player)
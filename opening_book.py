@@ -0,0 +1,180 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+# Polyglot entry: key, move, weight and learn field, big-endian and sorted by key
+ENTRY = struct.Struct(">QHHI")
+KEY = struct.Struct(">Q")
+MOVE_WEIGHT = struct.Struct(">HH")
+MAX_WEIGHT = 0xFFFF
+
+PROMOTION_CODES = {None: 0, chess.KNIGHT: 1, chess.BISHOP: 2, chess.ROOK: 3, chess.QUEEN: 4}
+PROMOTION_PIECES = {code: piece for piece, code in PROMOTION_CODES.items()}
+
+# Weight a book move earns from one game, by the result for the side that played it
+RESULT_WEIGHTS = {"win": 2, "draw": 1, "loss": 0, "unknown": 1}
+
+
+def encode_move(board: chess.Board, move: chess.Move) -> int:
+    """Polyglot move bits: to square, from square, promotion; castling as king takes rook."""
+    to_square = move.to_square
+    if board.is_castling(move):
+        rook_file = 7 if chess.square_file(move.to_square) > chess.square_file(move.from_square) else 0
+        to_square = chess.square(rook_file, chess.square_rank(move.from_square))
+    return to_square | move.from_square << 6 | PROMOTION_CODES[move.promotion] << 12
+
+
+def decode_move(board: chess.Board, raw: int) -> chess.Move:
+    from_square = raw >> 6 & 63
+    to_square = raw & 63
+    promotion = PROMOTION_PIECES.get(raw >> 12 & 7)
+    if board.kings & chess.BB_SQUARES[from_square] and board.color_at(to_square) == board.color_at(from_square):
+        # King takes own rook is castling, the king lands on the g or c file
+        king_file = 6 if to_square > from_square else 2
+        to_square = chess.square(king_file, chess.square_rank(from_square))
+    return chess.Move(from_square, to_square, promotion)
+
+
+def build_book(games: Iterable[chess.pgn.Game], max_plies: int = 20, min_weight: int = 1) -> bytes:
+    """Compile games into the bytes of a Polyglot book.
+
+    Every move of the first max_plies of each game earns the weight of the
+    game's result for the side that played it. Moves whose total stays below
+    min_weight are left out, and weights are scaled down to fit 16 bits.
+    """
+    weights: Dict[Tuple[int, int], int] = {}
+    for game in games:
+        result = game.headers.get("Result", "*")
+        board = game.board()
+        for ply, move in enumerate(game.mainline_moves()):
+            if ply >= max_plies:
+                break
+            if result == "1/2-1/2":
+                outcome = "draw"
+            elif result in ("1-0", "0-1"):
+                outcome = "win" if (result == "1-0") == (board.turn == chess.WHITE) else "loss"
+            else:
+                outcome = "unknown"
+            record = (chess.polyglot.zobrist_hash(board), encode_move(board, move))
+            weights[record] = weights.get(record, 0) + RESULT_WEIGHTS[outcome]
+            board.push(move)
+    scale = max(1, -(-max(weights.values(), default=0) // MAX_WEIGHT))
+    entries = sorted(
+        ((key, move, weight // scale) for (key, move), weight in weights.items() if weight >= min_weight),
+        key=lambda entry: (entry[0], -entry[2]),
+    )
+    return b"".join(ENTRY.pack(key, move, max(1, weight), 0) for key, move, weight in entries)
+
+
+def read_games(path: str) -> Iterable[chess.pgn.Game]:
+    with open(path) as pgn:
+        while True:
+            game = chess.pgn.read_game(pgn)
+            if game is None:
+                return
+            yield game
+
+
+def build_book_file(pgn_paths: List[str], output_path: str, max_plies: int = 20, min_weight: int = 1) -> int:
+    """Write a book built from the PGN files and return its number of entries."""
+    games = (game for path in pgn_paths for game in read_games(path))
+    data = build_book(games, max_plies, min_weight)
+    with open(output_path, "wb") as output:
+        output.write(data)
+    return len(data) // ENTRY.size
+
+
+class OpeningBook:
+    """Read-only Polyglot book, memory-mapped and searched in place.
+
+    A lookup binary-searches the mapped file for the position key and reads
+    the matching entries straight out of the mapping, so nothing is loaded
+    or copied up front and a probe costs a Zobrist hash plus a few dozen
+    reads. Files written by build_book work with other Polyglot readers too.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self.entries = os.fstat(self._file.fileno()).st_size // ENTRY.size
+        # An empty file cannot be mapped, and has nothing to find anyway
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.entries else b""
+
+    def __enter__(self) -> "OpeningBook":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def _first_index(self, key: int) -> int:
+        # Lower bound of key in the sorted entries
+        unpack_key = KEY.unpack_from
+        data = self._map
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            if unpack_key(data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def moves(self, board: chess.Board) -> List[Tuple[chess.Move, int]]:
+        """Legal book moves of the position with their weights, heaviest first."""
+        key = chess.polyglot.zobrist_hash(board)
+        index = self._first_index(key)
+        found = []
+        while index < self.entries:
+            offset = index * ENTRY.size
+            if KEY.unpack_from(self._map, offset)[0] != key:
+                break
+            raw, weight = MOVE_WEIGHT.unpack_from(self._map, offset + KEY.size)
+            move = decode_move(board, raw)
+            if weight and board.is_legal(move):
+                found.append((move, weight))
+            index += 1
+        return found
+
+    def choose_move(self, board: chess.Board, rng: Optional[random.Random] = None) -> Optional[chess.Move]:
+        """A book move picked by weight with rng, the heaviest one without, None when out of book."""
+        found = self.moves(board)
+        if not found:
+            return None
+        if rng is None:
+            return found[0][0]
+        moves, weights = zip(*found)
+        return rng.choices(moves, weights)[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query a Polyglot opening book.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile PGN files into a book")
+    build.add_argument("pgn", nargs="+")
+    build.add_argument("--output", required=True)
+    build.add_argument("--max-plies", type=int, default=20)
+    build.add_argument("--min-weight", type=int, default=1)
+    probe = commands.add_parser("probe", help="list the book moves of a position")
+    probe.add_argument("book")
+    probe.add_argument("fen", nargs="?", default=chess.STARTING_FEN)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_book_file(args.pgn, args.output, args.max_plies, args.min_weight)
+        print(f"{count} entries written to {args.output}")
+    else:
+        board = chess.Board(args.fen)
+        with OpeningBook(args.book) as book:
+            for move, weight in book.moves(board):
+                print(f"{board.san(move)} {weight}")
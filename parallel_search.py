@@ -0,0 +1,253 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from eval_cache import EvalCache
+from minimax import minimax
+from move_ordering import MoveOrderer
+from transposition import TranspositionTable
+
+# How far below the shared bound a worker's window starts, so an equal score
+# comes back exact rather than as a bound
+TIE_MARGIN = 1e-6
+
+# Per-process state set up by the pool initializer
+_shared_bound = None
+_worker_table: Optional[TranspositionTable] = None
+_worker_eval_cache: Optional[EvalCache] = None
+
+
+def _init_worker(shared_bound, table_entries: int, eval_cache: Optional[EvalCache]) -> None:
+    global _shared_bound, _worker_table, _worker_eval_cache
+    _shared_bound = shared_bound
+    _worker_table = TranspositionTable(table_entries)
+    _worker_eval_cache = eval_cache
+
+
+def _search_root_move(
+    state: Any,
+    move: Any,
+    callbacks: Tuple[Callable, ...],
+    depth: int,
+    is_maximizing_player: bool,
+    hash_key: Optional[Callable[[Any], int]],
+    move_orderer: Optional[MoveOrderer],
+    eval_key: Optional[Callable[[Any], Optional[int]]],
+) -> float:
+    get_possible_moves, make_move, undo_move, is_game_over, evaluate_board = callbacks
+    if _worker_eval_cache is not None and eval_key is not None:
+        evaluate_board = _worker_eval_cache.wrap(evaluate_board, eval_key)
+    # Only a move that matches or beats the best score found so far by any
+    # worker matters; the margin keeps a tie exact so the earliest move wins it
+    bound = _shared_bound.value
+    if is_maximizing_player:
+        alpha, beta = bound - TIE_MARGIN, float("inf")
+    else:
+        alpha, beta = float("-inf"), bound + TIE_MARGIN
+    make_move(state, move, is_maximizing_player)
+    score, _ = minimax(
+        state,
+        get_possible_moves,
+        make_move,
+        undo_move,
+        is_game_over,
+        evaluate_board,
+        depth - 1,
+        not is_maximizing_player,
+        alpha,
+        beta,
+        hash_key=hash_key,
+        table=_worker_table if hash_key is not None else None,
+        move_orderer=move_orderer,
+        ply=1,
+    )
+    undo_move(state, move, is_maximizing_player)
+    with _shared_bound.get_lock():
+        if is_maximizing_player:
+            _shared_bound.value = max(_shared_bound.value, score)
+        else:
+            _shared_bound.value = min(_shared_bound.value, score)
+    return score
+
+
+class ParallelSearch:
+    """Root-splitting minimax over a process pool.
+
+    The first root move is searched in this process to get a score to beat,
+    then the remaining root moves are searched by the workers, each starting
+    from the best score any worker has reported so far. A move that cannot
+    match that score fails low and returns a bound below it, so the best
+    score is exact and ties go to the earliest move in the root order.
+
+    Without a hash_key this returns the same score and move as minimax at the
+    same depth. With one, every worker keeps its own transposition table
+    across searches; the score is still the minimax score but the move may
+    be a different one of equal score.
+
+    All callbacks and the state must be picklable, so pass module-level
+    functions such as those in chess_game, not lambdas.
+
+    With eval_cache_entries every process, this one included, shares one
+    evaluation cache in shared memory. It is used by searches given an
+    eval_key, such as chess_game.eval_cache_key.
+    """
+
+    def __init__(self, workers: Optional[int] = None, table_entries: int = 1 << 18, eval_cache_entries: int = 0):
+        self.workers = workers or os.cpu_count() or 1
+        self._shared_bound = multiprocessing.Value("d", 0.0)
+        self.eval_cache = EvalCache.create_shared(eval_cache_entries) if eval_cache_entries else None
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self._shared_bound, table_entries, self.eval_cache),
+        )
+
+    def __enter__(self) -> "ParallelSearch":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._pool.shutdown()
+        if self.eval_cache is not None:
+            self.eval_cache.close()
+
+    def search(
+        self,
+        state: Any,
+        get_possible_moves: Callable,
+        make_move: Callable,
+        undo_move: Callable,
+        is_game_over: Callable,
+        evaluate_board: Callable,
+        depth: int,
+        is_maximizing_player: bool,
+        hash_key: Optional[Callable[[Any], int]] = None,
+        move_orderer: Optional[MoveOrderer] = None,
+        eval_key: Optional[Callable[[Any], Optional[int]]] = None,
+    ) -> Tuple[float, Any]:
+        if depth == 0 or is_game_over(state):
+            return evaluate_board(state), None
+        callbacks = (get_possible_moves, make_move, undo_move, is_game_over, evaluate_board)
+        if self.eval_cache is not None and eval_key is not None:
+            evaluate_board = self.eval_cache.wrap(evaluate_board, eval_key)
+        moves = get_possible_moves(state)
+        if move_orderer is not None:
+            moves = move_orderer.order(state, moves, None, 0)
+
+        # Young brothers wait: the first move sets the bound the others must beat
+        make_move(state, moves[0], is_maximizing_player)
+        first_score, _ = minimax(
+            state,
+            get_possible_moves,
+            make_move,
+            undo_move,
+            is_game_over,
+            evaluate_board,
+            depth - 1,
+            not is_maximizing_player,
+            move_orderer=move_orderer,
+            ply=1,
+        )
+        undo_move(state, moves[0], is_maximizing_player)
+        self._shared_bound.value = first_score
+
+        futures = {
+            self._pool.submit(
+                _search_root_move,
+                state,
+                move,
+                callbacks,
+                depth,
+                is_maximizing_player,
+                hash_key,
+                move_orderer,
+                eval_key,
+            ): index
+            for index, move in enumerate(moves[1:], start=1)
+        }
+        scores = [first_score] + [0.0] * (len(moves) - 1)
+        for future in as_completed(futures):
+            scores[futures[future]] = future.result()
+
+        sign = 1 if is_maximizing_player else -1
+        best_index = max(range(len(moves)), key=lambda index: (sign * scores[index], -index))
+        return scores[best_index], moves[best_index]
+
+
+def measure_speedup(
+    state: Any,
+    get_possible_moves: Callable,
+    make_move: Callable,
+    undo_move: Callable,
+    is_game_over: Callable,
+    evaluate_board: Callable,
+    depth: int,
+    is_maximizing_player: bool,
+    worker_counts: List[int],
+) -> List[Dict[str, Any]]:
+    """Time the serial search and the parallel search for each worker count."""
+    start = time.perf_counter()
+    score, move = minimax(
+        state,
+        get_possible_moves,
+        make_move,
+        undo_move,
+        is_game_over,
+        evaluate_board,
+        depth,
+        is_maximizing_player,
+    )
+    serial_time = time.perf_counter() - start
+    results = [{"workers": 0, "seconds": serial_time, "speedup": 1.0, "score": score, "move": str(move)}]
+    for workers in worker_counts:
+        with ParallelSearch(workers) as search:
+            start = time.perf_counter()
+            score, move = search.search(
+                state,
+                get_possible_moves,
+                make_move,
+                undo_move,
+                is_game_over,
+                evaluate_board,
+                depth,
+                is_maximizing_player,
+            )
+            elapsed = time.perf_counter() - start
+        results.append(
+            {
+                "workers": workers,
+                "seconds": elapsed,
+                "speedup": serial_time / elapsed,
+                "score": score,
+                "move": str(move),
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    import chess
+
+    import chess_game
+
+    board = chess.Board(sys.argv[1]) if len(sys.argv) > 1 else chess.Board()
+    counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    for row in measure_speedup(
+        board,
+        chess_game.get_possible_moves,
+        chess_game.make_move,
+        chess_game.undo_move,
+        chess_game.is_game_over,
+        chess_game.evaluate_board,
+        3,
+        board.turn,
+        counts,
+    ):
+        label = "serial" if row["workers"] == 0 else f"{row['workers']} workers"
+        print(f"{label}: {row['seconds']:.2f}s speedup {row['speedup']:.2f}x {row['move']} {row['score']}")
@@ -0,0 +1,49 @@
+import time
+from typing import Optional
+
+
+class SearchTimeout(Exception):
+    """Raised inside a search when its budget runs out or it is stopped."""
+
+
+class SearchBudget:
+    """Wall-clock and node budget shared by every iteration of one search.
+
+    The search calls tick() once per node. The clock is only read every
+    check_every nodes to keep the per-node cost down, and stop() can be called
+    from another thread to abort the search at its next tick.
+    """
+
+    def __init__(
+        self,
+        time_limit: Optional[float] = None,
+        node_limit: Optional[int] = None,
+        check_every: int = 256,
+    ):
+        self.start_time = time.monotonic()
+        self.deadline = None if time_limit is None else self.start_time + time_limit
+        self.node_limit = node_limit
+        self.check_every = check_every
+        self.nodes = 0
+        self.stopped = False
+
+    def tick(self) -> None:
+        self.nodes += 1
+        if self.stopped:
+            raise SearchTimeout()
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            self.stopped = True
+            raise SearchTimeout()
+        if (
+            self.deadline is not None
+            and self.nodes % self.check_every == 0
+            and time.monotonic() >= self.deadline
+        ):
+            self.stopped = True
+            raise SearchTimeout()
+
+    def stop(self) -> None:
+        self.stopped = True
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start_time
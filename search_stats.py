@@ -0,0 +1,137 @@
+from typing import Any, Dict, List
+
+
+class SearchStats:
+    """Counters filled in by minimax when a stats object is passed in.
+
+    Callback timings are only recorded when the game adapter is wrapped in a
+    negamax.ProfiledAdapter sharing this object; the search itself never
+    reads the clock per node.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.nodes = 0
+        self.nodes_per_ply: List[int] = []
+        self.leaves = 0
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.hash_probes = 0
+        self.hash_hits = 0
+        self.searches = 0
+        self.search_seconds = 0.0
+        # Selective search: null moves tried and cut off, late moves reduced and re-searched
+        self.null_moves = 0
+        self.null_move_cutoffs = 0
+        self.reductions = 0
+        self.reduction_re_searches = 0
+        self.aspiration_fails = 0
+        # Seconds and call counts by callback name
+        self.callback_seconds: Dict[str, float] = {}
+        self.callback_calls: Dict[str, int] = {}
+
+    def record_node(self, ply: int) -> None:
+        self.nodes += 1
+        # Searches rooted below ply 0, such as ParallelSearch's, start mid-list
+        while len(self.nodes_per_ply) <= ply:
+            self.nodes_per_ply.append(0)
+        self.nodes_per_ply[ply] += 1
+
+    def record_leaf(self) -> None:
+        self.leaves += 1
+
+    def record_cutoff(self, move_index: int) -> None:
+        self.beta_cutoffs += 1
+        if move_index == 0:
+            self.first_move_cutoffs += 1
+
+    def record_probe(self, hit: bool) -> None:
+        self.hash_probes += 1
+        if hit:
+            self.hash_hits += 1
+
+    def record_null_move(self, cutoff: bool) -> None:
+        self.null_moves += 1
+        if cutoff:
+            self.null_move_cutoffs += 1
+
+    def record_reduction(self, re_searched: bool) -> None:
+        self.reductions += 1
+        if re_searched:
+            self.reduction_re_searches += 1
+
+    def record_aspiration_fail(self) -> None:
+        self.aspiration_fails += 1
+
+    def record_search(self, seconds: float) -> None:
+        self.searches += 1
+        self.search_seconds += seconds
+
+    def record_call(self, name: str, seconds: float) -> None:
+        self.callback_seconds[name] = self.callback_seconds.get(name, 0.0) + seconds
+        self.callback_calls[name] = self.callback_calls.get(name, 0) + 1
+
+    def effective_branching_factor(self) -> float:
+        # Geometric mean growth of the node count from the root to the deepest ply
+        root = next((ply for ply, nodes in enumerate(self.nodes_per_ply) if nodes), 0)
+        depth = len(self.nodes_per_ply) - 1 - root
+        if depth <= 0:
+            return 0.0
+        return (self.nodes_per_ply[-1] / self.nodes_per_ply[root]) ** (1 / depth)
+
+    def first_move_cutoff_rate(self) -> float:
+        if self.beta_cutoffs == 0:
+            return 0.0
+        return self.first_move_cutoffs / self.beta_cutoffs
+
+    def hash_hit_rate(self) -> float:
+        if self.hash_probes == 0:
+            return 0.0
+        return self.hash_hits / self.hash_probes
+
+    def nodes_per_second(self) -> float:
+        if self.search_seconds == 0.0:
+            return 0.0
+        return self.nodes / self.search_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "nodes": self.nodes,
+            "nodes_per_ply": list(self.nodes_per_ply),
+            "leaves": self.leaves,
+            "beta_cutoffs": self.beta_cutoffs,
+            "first_move_cutoff_rate": self.first_move_cutoff_rate(),
+            "hash_probes": self.hash_probes,
+            "hash_hits": self.hash_hits,
+            "null_moves": self.null_moves,
+            "null_move_cutoffs": self.null_move_cutoffs,
+            "reductions": self.reductions,
+            "reduction_re_searches": self.reduction_re_searches,
+            "aspiration_fails": self.aspiration_fails,
+            "ebf": self.effective_branching_factor(),
+            "seconds": self.search_seconds,
+            "nps": self.nodes_per_second(),
+            "callback_seconds": dict(self.callback_seconds),
+            "callback_calls": dict(self.callback_calls),
+        }
+
+    def summary(self) -> str:
+        text = (
+            f"nodes={self.nodes} leaves={self.leaves} ebf={self.effective_branching_factor():.2f} "
+            f"cutoffs={self.beta_cutoffs} first_move={self.first_move_cutoff_rate():.0%}"
+        )
+        if self.hash_probes:
+            text += f" hash_hits={self.hash_hit_rate():.0%}"
+        if self.null_moves:
+            text += f" null_cutoffs={self.null_move_cutoffs}/{self.null_moves}"
+        if self.reductions:
+            text += f" reductions={self.reductions} re_searched={self.reduction_re_searches}"
+        if self.aspiration_fails:
+            text += f" aspiration_fails={self.aspiration_fails}"
+        if self.searches:
+            text += f" time={self.search_seconds:.2f}s nps={self.nodes_per_second():.0f}"
+        for name, seconds in sorted(self.callback_seconds.items(), key=lambda item: -item[1]):
+            text += f" {name}={seconds:.2f}s"
+        return text
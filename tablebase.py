@@ -0,0 +1,376 @@
+import argparse
+import mmap
+import os
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import chess
+
+DEFAULT_DIRECTORY = "tablebases"
+# Matches the score chess_game gives a checkmate
+MATE_SCORE = 1000.0
+
+PIECE_LETTERS = "QRBNP"
+PIECE_TYPES = {"K": chess.KING, "Q": chess.QUEEN, "R": chess.ROOK, "B": chess.BISHOP, "N": chess.KNIGHT, "P": chess.PAWN}
+
+
+def _transform(square: int, flip_file: bool, flip_rank: bool, swap: bool) -> int:
+    file, rank = chess.square_file(square), chess.square_rank(square)
+    if flip_file:
+        file = 7 - file
+    if flip_rank:
+        rank = 7 - rank
+    if swap:
+        file, rank = rank, file
+    return chess.square(file, rank)
+
+
+# The eight symmetries of the board, as square maps
+SYMMETRIES = [
+    [_transform(square, flip_file, flip_rank, swap) for square in chess.SQUARES]
+    for swap in (False, True)
+    for flip_rank in (False, True)
+    for flip_file in (False, True)
+]
+# Without pawns the strong king is brought into the a1-d1-d4 triangle
+TRIANGLE = [
+    square for square in chess.SQUARES if chess.square_file(square) <= 3 and chess.square_rank(square) <= chess.square_file(square)
+]
+KING_SYMMETRY = [next(s for s in SYMMETRIES if s[square] in TRIANGLE) for square in chess.SQUARES]
+TRIANGLE_SLOTS = {square: slot for slot, square in enumerate(TRIANGLE)}
+# With pawns only the left-right mirror applies, bringing the king to files a-d
+MIRROR = SYMMETRIES[1]
+HALF_BOARD = [square for square in chess.SQUARES if chess.square_file(square) <= 3]
+HALF_BOARD_SLOTS = {square: slot for slot, square in enumerate(HALF_BOARD)}
+
+
+def parse_material(name: str) -> Tuple[List[int], List[int]]:
+    """Piece types of each side of a name such as "KRvK", kings first."""
+    strong, weak = name.upper().split("V")
+    return [PIECE_TYPES[letter] for letter in strong], [PIECE_TYPES[letter] for letter in weak]
+
+
+def side_letters(board: chess.Board, color: chess.Color) -> str:
+    return "K" + "".join(
+        letter * chess.popcount(board.pieces_mask(PIECE_TYPES[letter], color)) for letter in PIECE_LETTERS
+    )
+
+
+def is_drawn_material(name: str) -> bool:
+    # Bare kings, or a lone minor piece, can never mate
+    pieces = name.upper().replace("K", "").replace("V", "")
+    return pieces in ("", "B", "N")
+
+
+def dtm_plies(value: int) -> int:
+    return abs(value) - 1
+
+
+class EndgameTable:
+    """Distance to mate for every position of one material balance.
+
+    Values are int16, one per index: 0 for a draw, otherwise the number of
+    plies to mate plus one, positive when the side to move mates and
+    negative when it is mated. The strong side's king is mapped into the
+    a1-d1-d4 triangle, or files a-d when there are pawns, so a table holds
+    2 * 10 (or 32) * 64 ** (pieces - 1) entries.
+    """
+
+    def __init__(self, name: str, values=None):
+        self.name = name
+        self.strong, self.weak = parse_material(name)
+        self.has_pawns = chess.PAWN in self.strong + self.weak
+        self.king_slots = len(HALF_BOARD) if self.has_pawns else len(TRIANGLE)
+        self.size = 2 * self.king_slots * 64 ** (len(self.strong) + len(self.weak) - 1)
+        self.values = values
+
+    def index(self, squares: List[int], strong_to_move: bool) -> int:
+        """Index of the position with the pieces on squares, in the order of the name."""
+        if self.has_pawns:
+            symmetry = MIRROR if chess.square_file(squares[0]) > 3 else SYMMETRIES[0]
+            index = (0 if strong_to_move else self.king_slots) + HALF_BOARD_SLOTS[symmetry[squares[0]]]
+        else:
+            symmetry = KING_SYMMETRY[squares[0]]
+            index = (0 if strong_to_move else self.king_slots) + TRIANGLE_SLOTS[symmetry[squares[0]]]
+        for square in squares[1:]:
+            index = index * 64 + symmetry[square]
+        return index
+
+    def position(self, index: int) -> Tuple[List[int], bool]:
+        """Inverse of index(): the squares and whether the strong side is to move."""
+        squares = []
+        for _ in range(len(self.strong) + len(self.weak) - 1):
+            index, square = divmod(index, 64)
+            squares.append(square)
+        turn, slot = divmod(index, self.king_slots)
+        squares.append((HALF_BOARD if self.has_pawns else TRIANGLE)[slot])
+        squares.reverse()
+        return squares, turn == 0
+
+    def board(self, squares: List[int], strong_to_move: bool) -> Optional[chess.Board]:
+        """The position with White as the strong side, None if it is not a legal one."""
+        if len(set(squares)) < len(squares):
+            return None
+        board = chess.Board(None)
+        for number, (piece_type, square) in enumerate(zip(self.strong + self.weak, squares)):
+            board.set_piece_at(square, chess.Piece(piece_type, number < len(self.strong)))
+        board.turn = chess.WHITE if strong_to_move else chess.BLACK
+        return board if board.is_valid() else None
+
+
+class Tablebase:
+    """Endgame tables in a directory, each one memory-mapped on first use.
+
+    A table file is the array of EndgameTable values in native byte order,
+    named after its material, e.g. KQvK.tbl. Positions with the colors
+    reversed are probed through the mirrored table. Positions with castling
+    rights or a possible en passant capture are not covered.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.tables: Dict[str, Optional[EndgameTable]] = {}
+        self._maps: List[mmap.mmap] = []
+        names = os.listdir(directory) if os.path.isdir(directory) else []
+        pieces = [len(name) - len(".tbl") - 1 for name in names if name.endswith(".tbl")]
+        # Positions with more pieces than the largest table are skipped after a popcount
+        self.max_pieces = max(pieces, default=0)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name + ".tbl")
+
+    def close(self) -> None:
+        for table in self.tables.values():
+            if table is not None:
+                table.values.release()
+        for mapping in self._maps:
+            mapping.close()
+        self.tables.clear()
+        self._maps.clear()
+
+    def __enter__(self) -> "Tablebase":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def table(self, name: str) -> Optional[EndgameTable]:
+        if name not in self.tables:
+            table = None
+            if os.path.exists(self.path(name)):
+                with open(self.path(name), "rb") as file:
+                    mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps.append(mapping)
+                table = EndgameTable(name, memoryview(mapping).cast("h"))
+            self.tables[name] = table
+        return self.tables[name]
+
+    def probe(self, board: chess.Board) -> Optional[int]:
+        """Table value of the position (see EndgameTable), None when it is not covered."""
+        if chess.popcount(board.occupied) > self.max_pieces or board.castling_rights:
+            return None
+        if board.ep_square is not None and board.has_legal_en_passant():
+            return None
+        white, black = side_letters(board, chess.WHITE), side_letters(board, chess.BLACK)
+        strong = chess.WHITE
+        table = self.table(f"{white}v{black}")
+        if table is None:
+            strong = chess.BLACK
+            table = self.table(f"{black}v{white}")
+            if table is None:
+                return None
+        squares = []
+        for color, piece_types in ((strong, table.strong), (not strong, table.weak)):
+            for piece_type in dict.fromkeys(piece_types):
+                squares.extend(chess.scan_forward(board.pieces_mask(piece_type, color)))
+        if strong == chess.BLACK:
+            # Mirror top to bottom so the black pieces play White's part
+            squares = [square ^ 56 for square in squares]
+        return table.values[table.index(squares, board.turn == strong)]
+
+    def score(self, board: chess.Board) -> Optional[float]:
+        """Search score from White's view, nearer mates scoring higher; None when not covered."""
+        value = self.probe(board)
+        if value is None:
+            return None
+        if value == 0:
+            return 0.0
+        score = MATE_SCORE - dtm_plies(value)
+        if (value > 0) != (board.turn == chess.WHITE):
+            score = -score
+        return score
+
+    def best_move(self, board: chess.Board) -> Optional[chess.Move]:
+        """The quickest mate, else a drawing move, else the slowest loss; None when not covered."""
+        if self.probe(board) is None:
+            return None
+        best_move, best_score = None, float("-inf")
+        sign = 1 if board.turn == chess.WHITE else -1
+        for move in board.legal_moves:
+            board.push(move)
+            if board.is_checkmate():
+                score = MATE_SCORE
+            else:
+                child = self.score(board)
+                score = 0.0 if child is None else sign * child
+            board.pop()
+            if score > best_score:
+                best_move, best_score = move, score
+        return best_move
+
+    def generate(self, name: str, verbose: bool = False) -> EndgameTable:
+        """Build the table for name by retrograde analysis and write it to the directory.
+
+        Tables reached by a capture or promotion are built first. Every
+        position is expanded once into its successor indices; checkmates are
+        then propagated backwards a ply at a time, so each position gets the
+        shortest mate for the winner and the longest for the loser. Pure
+        Python, so three pieces take seconds and four pieces take hours.
+        """
+        name = "v".join(side.upper() for side in name.upper().split("V"))
+        for dependency in successor_materials(name):
+            if not is_drawn_material(dependency) and self.table(dependency) is None and self.table(flip_name(dependency)) is None:
+                self.generate(dependency, verbose)
+        start = time.perf_counter()
+        table = EndgameTable(name)
+        values = build_values(table, self)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(name), "wb") as file:
+            values.tofile(file)
+        self.tables.pop(name, None)
+        self.max_pieces = max(self.max_pieces, len(table.strong) + len(table.weak))
+        if verbose:
+            wins = sum(value > 0 for value in values)
+            longest = max((dtm_plies(value) for value in values if value), default=0)
+            print(f"{name}: {table.size} entries, {wins} wins, longest mate {longest} plies, {time.perf_counter() - start:.1f}s")
+        return self.table(name)
+
+
+def flip_name(name: str) -> str:
+    strong, weak = name.split("v")
+    return f"{weak}v{strong}"
+
+
+def successor_materials(name: str) -> List[str]:
+    """Material balances one capture or promotion away, named strongest side first where known."""
+    strong, weak = name.split("v")
+    results = set()
+    for side, other, is_strong in ((strong, weak, True), (weak, strong, False)):
+        for index, letter in enumerate(side):
+            if letter == "K":
+                continue
+            rest = side[:index] + side[index + 1:]
+            results.add(f"{rest}v{other}" if is_strong else f"{other}v{rest}")
+            if letter == "P":
+                for promoted in "QRBN":
+                    new_side = "K" + "".join(sorted(rest[1:] + promoted, key=PIECE_LETTERS.index))
+                    results.add(f"{new_side}v{other}" if is_strong else f"{other}v{new_side}")
+    return sorted(results)
+
+
+def build_values(table: EndgameTable, tablebase: Tablebase) -> array:
+    # Successor edges within the table, from and to index
+    sources, targets = array("l"), array("l")
+    remaining = array("l", [0]) * table.size
+    # Positions with a move that at least draws outside the table cannot be lost
+    safe = bytearray(table.size)
+    exit_loss = array("h", bytes(2 * table.size))
+    # Positions to resolve by distance in plies, each as (index, is a win)
+    buckets: Dict[int, List[Tuple[int, bool]]] = {}
+
+    for index in range(table.size):
+        squares, strong_to_move = table.position(index)
+        board = table.board(squares, strong_to_move)
+        if board is None:
+            continue
+        moves = list(board.legal_moves)
+        if not moves:
+            if board.is_check():
+                buckets.setdefault(0, []).append((index, False))
+            continue
+        for move in moves:
+            if move.promotion is not None or board.is_capture(move):
+                board.push(move)
+                value = 0 if board.is_insufficient_material() else tablebase.probe(board)
+                board.pop()
+                if value is None:
+                    raise ValueError(f"no table for the position after {move} in {board.fen()}")
+                if value < 0:
+                    # The opponent is mated after this move
+                    buckets.setdefault(dtm_plies(value) + 1, []).append((index, True))
+                    safe[index] = 1
+                elif value == 0:
+                    safe[index] = 1
+                else:
+                    exit_loss[index] = max(exit_loss[index], dtm_plies(value) + 1)
+                continue
+            moved = list(squares)
+            moved[moved.index(move.from_square)] = move.to_square
+            sources.append(index)
+            targets.append(table.index(moved, not strong_to_move))
+            remaining[index] += 1
+        if remaining[index] == 0 and not safe[index]:
+            buckets.setdefault(exit_loss[index], []).append((index, False))
+
+    # Predecessors of each index, grouped by counting sort on the edge targets
+    starts = array("l", [0]) * (table.size + 1)
+    for target in targets:
+        starts[target + 1] += 1
+    for index in range(table.size):
+        starts[index + 1] += starts[index]
+    fill = array("l", starts)
+    predecessors = array("l", [0]) * len(targets)
+    for source, target in zip(sources, targets):
+        predecessors[fill[target]] = source
+        fill[target] += 1
+    del sources, targets, fill
+
+    values = array("h", bytes(2 * table.size))
+    resolved = bytearray(table.size)
+    plies = 0
+    while buckets:
+        for index, is_win in buckets.pop(plies, []):
+            if resolved[index]:
+                continue
+            resolved[index] = 1
+            values[index] = plies + 1 if is_win else -(plies + 1)
+            for predecessor in predecessors[starts[index]:starts[index + 1]]:
+                if resolved[predecessor]:
+                    continue
+                if not is_win:
+                    buckets.setdefault(plies + 1, []).append((predecessor, True))
+                    continue
+                remaining[predecessor] -= 1
+                if remaining[predecessor] == 0 and not safe[predecessor]:
+                    loss = max(plies + 1, exit_loss[predecessor])
+                    buckets.setdefault(loss, []).append((predecessor, False))
+        plies += 1
+    return values
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate or probe endgame tablebases.")
+    parser.add_argument("--directory", default=DEFAULT_DIRECTORY)
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate = commands.add_parser("generate", help="build tables by retrograde analysis")
+    generate.add_argument("materials", nargs="+", help='material balances such as "KQvK"')
+    probe = commands.add_parser("probe", help="look up a position")
+    probe.add_argument("fen")
+    args = parser.parse_args()
+
+    tablebase = Tablebase(args.directory)
+    if args.command == "generate":
+        for material in args.materials:
+            tablebase.generate(material, verbose=True)
+    else:
+        board = chess.Board(args.fen)
+        value = tablebase.probe(board)
+        if value is None:
+            print("not in the tablebase")
+        elif value == 0:
+            print("draw")
+        else:
+            outcome = "wins" if value > 0 else "loses"
+            print(f"side to move {outcome}, mate in {dtm_plies(value)} plies, best move {tablebase.best_move(board)}")
+    tablebase.close()
@@ -1,9 +1,17 @@
 import random
-from typing import List, Tuple
-from minimax import minimax
-from tqdm import tqdm
+from typing import List, Optional, Tuple
+from negamax import GameAdapter
 from functools import lru_cache
 
+# Random 64-bit Zobrist keys per cell and mark, fixed seed so keys are stable
+_zobrist_rng = random.Random(0x7EC7AC70E)
+ZOBRIST_KEYS = {
+    (i, j, player): _zobrist_rng.getrandbits(64)
+    for i in range(3)
+    for j in range(3)
+    for player in "XO"
+}
+
 # Function to print the Tic-Tac-Toe board
 def print_board(board: List[List[str]]) -> None:
     for row in board:
@@ -57,6 +65,16 @@ def get_possible_moves(board: List[List[str]]) -> List[Tuple[int, int]]:
     return moves
 
 
+# Function to compute the Zobrist key of the board for the transposition table
+def hash_key(board: List[List[str]]) -> int:
+    key = 0
+    for i in range(3):
+        for j in range(3):
+            if board[i][j] != " ":
+                key ^= ZOBRIST_KEYS[i, j, board[i][j]]
+    return key
+
+
 # Function to make a move
 def make_move(
     board: List[List[str]], move: Tuple[int, int], is_maximizing: bool
@@ -91,48 +109,255 @@ def is_winner(board: List[List[str]], player: str) -> bool:
     return False
 
 
-def test_minimax() -> None:
-    wins = 0
-    losses = 0
-    ties = 0
-
-    for _ in tqdm(range(100)):
-        board = [[" ", " ", " "] for _ in range(3)]
-        player = "X"
-
-        while not is_game_over(board):
-            print(board)
-            if player == "X":
-                # Your turn
-                _, move = minimax(
-                    board,
-                    get_possible_moves,
-                    make_move,
-                    undo_move,
-                    is_game_over,
-                    evaluate_board,
-                    9,
-                    True,
-                )
-                make_move(board, move, True)
-                player = "O"
-            else:
-                # Random opponent's turn
-                moves = get_possible_moves(board)
-                move = random.choice(moves)
-                make_move(board, move, False)
-                player = "X"
-
-        if is_winner(board, "X"):
-            wins += 1
-        elif is_winner(board, "O"):
-            losses += 1
-        else:
-            ties += 1
-
-    print(f"Wins: {wins}")
-    print(f"Losses: {losses}")
-    print(f"Ties: {ties}")
+# Bitmask representation: cell (i, j) is bit 3 * i + j, one mask per player
+FULL_MASK = 0b111111111
+LINE_MASKS = (
+    0b000000111, 0b000111000, 0b111000000,  # rows
+    0b001001001, 0b010010010, 0b100100100,  # columns
+    0b100010001, 0b001010100,  # diagonals
+)
+
+
+# Cell permutations of the 8 board symmetries (rotations and reflections)
+def _symmetries() -> List[Tuple[int, ...]]:
+    cells = tuple(range(9))
+    result = []
+    for _ in range(4):
+        result.append(cells)
+        result.append(tuple(cells[3 * i + 2 - j] for i in range(3) for j in range(3)))
+        cells = tuple(cells[3 * (2 - j) + i] for i in range(3) for j in range(3))
+    return result
+
+
+SYMMETRIES = _symmetries()
+
+# SYMMETRY_MAPS[s][mask] is mask with its cells moved by symmetry s
+SYMMETRY_MAPS = [
+    [
+        sum(1 << target for target, source in enumerate(permutation) if mask >> source & 1)
+        for mask in range(FULL_MASK + 1)
+    ]
+    for permutation in SYMMETRIES
+]
+
+
+# Function to convert the list board into (X mask, O mask)
+def to_bitboards(board: List[List[str]]) -> Tuple[int, int]:
+    x = o = 0
+    for i in range(3):
+        for j in range(3):
+            if board[i][j] == "X":
+                x |= 1 << (3 * i + j)
+            elif board[i][j] == "O":
+                o |= 1 << (3 * i + j)
+    return x, o
+
+
+def has_line(mask: int) -> bool:
+    for line in LINE_MASKS:
+        if mask & line == line:
+            return True
+    return False
+
+
+# Lookup tables for the search, indexed by mask: whether it holds a line,
+# and the (row, col) moves of its empty cells
+WINNING_MASKS = [has_line(mask) for mask in range(FULL_MASK + 1)]
+EMPTY_CELL_MOVES = [
+    [divmod(cell, 3) for cell in range(9) if empty >> cell & 1] for empty in range(FULL_MASK + 1)
+]
+MOVE_BITS = {divmod(cell, 3): 1 << cell for cell in range(9)}
+
+
+class TicTacToeBoard:
+    """X and O marks as two bitmasks, the state TicTacToeAdapter searches.
+
+    Moves are (row, col) pairs as on the list board, so a move found on a
+    TicTacToeBoard can be played on the list board it was made from.
+    """
+
+    __slots__ = ("x", "o")
+
+    def __init__(self, x: int = 0, o: int = 0):
+        self.x = x
+        self.o = o
+
+    @classmethod
+    def from_list(cls, board: List[List[str]]) -> "TicTacToeBoard":
+        return cls(*to_bitboards(board))
+
+
+# Functions with the minimax callback signatures on a TicTacToeBoard
+def bitboard_moves(state: TicTacToeBoard) -> List[Tuple[int, int]]:
+    # A copy, since the search may reorder the list it is given
+    return list(EMPTY_CELL_MOVES[FULL_MASK & ~(state.x | state.o)])
+
+
+def bitboard_make_move(state: TicTacToeBoard, move: Tuple[int, int], is_maximizing: bool) -> None:
+    if is_maximizing:
+        state.x |= MOVE_BITS[move]
+    else:
+        state.o |= MOVE_BITS[move]
+
+
+def bitboard_undo_move(state: TicTacToeBoard, move: Tuple[int, int], is_maximizing: bool) -> None:
+    if is_maximizing:
+        state.x &= ~MOVE_BITS[move]
+    else:
+        state.o &= ~MOVE_BITS[move]
+
+
+def bitboard_game_over(state: TicTacToeBoard) -> bool:
+    return WINNING_MASKS[state.x] or WINNING_MASKS[state.o] or state.x | state.o == FULL_MASK
+
+
+def bitboard_score(state: TicTacToeBoard) -> float:
+    if WINNING_MASKS[state.x]:
+        return 1.0
+    if WINNING_MASKS[state.o]:
+        return -1.0
+    return 0.0
+
+
+# The two masks side by side identify the position exactly
+def bitboard_key(state: TicTacToeBoard) -> int:
+    return state.x | state.o << 9
+
+
+def bitboard_expand(state: TicTacToeBoard) -> Tuple[List[Tuple[int, int]], Optional[float]]:
+    if WINNING_MASKS[state.x]:
+        return [], 1.0
+    if WINNING_MASKS[state.o]:
+        return [], -1.0
+    moves = list(EMPTY_CELL_MOVES[FULL_MASK & ~(state.x | state.o)])
+    return moves, None if moves else 0.0
+
+
+# Smallest (X, O) pair over the 8 symmetries, shared by all equivalent positions
+def canonical(x: int, o: int) -> Tuple[int, int]:
+    return min((mapping[x], mapping[o]) for mapping in SYMMETRY_MAPS)
+
+
+# Value of a position with X maximizing: 1 X wins, -1 O wins, 0 draw.
+# X is to move when both have played the same number of marks.
+def solve(x: int, o: int) -> int:
+    return _solve_canonical(*canonical(x, o))
+
+
+@lru_cache(maxsize=None)
+def _solve_canonical(x: int, o: int) -> int:
+    if has_line(x):
+        return 1
+    if has_line(o):
+        return -1
+    empty = FULL_MASK & ~(x | o)
+    if not empty:
+        return 0
+    x_to_move = bin(x).count("1") == bin(o).count("1")
+    values = []
+    while empty:
+        bit = empty & -empty
+        empty ^= bit
+        values.append(solve(x | bit, o) if x_to_move else solve(x, o | bit))
+    return max(values) if x_to_move else min(values)
+
+
+# Best cell for the side to move, the first one in row-major order among equals
+def best_cell(x: int, o: int) -> int:
+    x_to_move = bin(x).count("1") == bin(o).count("1")
+    best, best_value = -1, None
+    for cell in range(9):
+        bit = 1 << cell
+        if (x | o) & bit:
+            continue
+        value = solve(x | bit, o) if x_to_move else solve(x, o | bit)
+        if best_value is None or (value > best_value if x_to_move else value < best_value):
+            best, best_value = cell, value
+    return best
+
+
+# Solved table of every reachable position, indexed by the base-3 board code
+# (0 empty, 1 X, 2 O per cell). Each byte holds value + 1 in the high bits
+# and the best cell in the low four bits, 15 when the game is over.
+SOLVED_TABLE = bytearray()
+
+
+def board_code(x: int, o: int) -> int:
+    code = 0
+    for cell in range(8, -1, -1):
+        code = code * 3 + (x >> cell & 1) + 2 * (o >> cell & 1)
+    return code
+
+
+def build_solved_table() -> bytearray:
+    table = bytearray(3 ** 9)
+
+    def visit(x: int, o: int) -> None:
+        code = board_code(x, o)
+        if table[code]:
+            return
+        value = solve(x, o)
+        over = has_line(x) or has_line(o) or (x | o) == FULL_MASK
+        table[code] = (value + 1) << 4 | (15 if over else best_cell(x, o))
+        if over:
+            return
+        x_to_move = bin(x).count("1") == bin(o).count("1")
+        for cell in range(9):
+            bit = 1 << cell
+            if not (x | o) & bit:
+                visit(x | bit, o) if x_to_move else visit(x, o | bit)
+
+    visit(0, 0)
+    return table
+
+
+# Function to look up the optimal move, building the solved table on first use
+def optimal_move(board: List[List[str]]) -> Tuple[int, int]:
+    global SOLVED_TABLE
+    if not SOLVED_TABLE:
+        SOLVED_TABLE = build_solved_table()
+    entry = SOLVED_TABLE[board_code(*to_bitboards(board))]
+    if not entry:
+        raise ValueError("position cannot arise in a game")
+    cell = entry & 15
+    if cell == 15:
+        raise ValueError("game is already over")
+    return divmod(cell, 3)
+
+
+class TicTacToeAdapter(GameAdapter):
+    """The bitboard functions of this module as one adapter for negamax.NegamaxSearch.
+
+    Searches take a TicTacToeBoard, e.g. TicTacToeBoard.from_list(board).
+    """
+
+    def __init__(self):
+        self.get_possible_moves = bitboard_moves
+        self.make_move = bitboard_make_move
+        self.undo_move = bitboard_undo_move
+        self.is_game_over = bitboard_game_over
+        self.evaluate_board = bitboard_score
+        self.hash_key = bitboard_key
+        self.expand = bitboard_expand
+
+
+def test_minimax(games: int = 100, workers=None, seed: int = 0) -> None:
+    # Imported here because the match runner itself builds on this module
+    from match_runner import EngineConfig, run_match
+
+    summary = run_match(
+        "tictactoe",
+        EngineConfig(name="minimax", depth=9),
+        EngineConfig(name="random", random=True),
+        games,
+        workers=workers,
+        seed=seed,
+        alternate_colors=False,
+    )
+
+    print(f"Wins: {summary['wins']}")
+    print(f"Losses: {summary['losses']}")
+    print(f"Ties: {summary['draws']}")
 
 
 # Test the minimax strategy
@@ -0,0 +1,79 @@
+from typing import Any, List, Optional, Tuple
+
+# Bound types stored alongside each score
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Rough size of one stored entry (key, depth, flag, score, move, generation) in CPython
+ENTRY_BYTES = 200
+
+Entry = Tuple[int, int, int, float, Any, int]
+
+
+class TranspositionTable:
+    """Fixed-size hash table of search results keyed by a 64-bit position key.
+
+    Every bucket has two slots: a depth-preferred slot that only gives way to
+    an equal or deeper search of any position, and an always-replace slot that
+    takes everything else. Memory is capped by the number of buckets, which is
+    fixed at construction.
+
+    Entries are stamped with the generation that stored them. Calling
+    new_generation() between the searches of a game lets deep entries of
+    earlier searches give way, and counts hits on them in reused_hits.
+    """
+
+    def __init__(self, max_entries: int = 1 << 18):
+        self.num_buckets = max(1, max_entries // 2)
+        self._deep: List[Optional[Entry]] = [None] * self.num_buckets
+        self._recent: List[Optional[Entry]] = [None] * self.num_buckets
+        self.probes = 0
+        self.hits = 0
+        self.generation = 0
+        self.reused_hits = 0
+
+    @classmethod
+    def from_megabytes(cls, megabytes: float) -> "TranspositionTable":
+        return cls(int(megabytes * 1024 * 1024) // ENTRY_BYTES)
+
+    def __len__(self) -> int:
+        return sum(entry is not None for entry in self._deep) + sum(
+            entry is not None for entry in self._recent
+        )
+
+    def clear(self) -> None:
+        self._deep = [None] * self.num_buckets
+        self._recent = [None] * self.num_buckets
+        self.probes = 0
+        self.hits = 0
+        self.generation = 0
+        self.reused_hits = 0
+
+    def new_generation(self) -> None:
+        self.generation += 1
+
+    def probe(self, key: int) -> Optional[Entry]:
+        self.probes += 1
+        index = key % self.num_buckets
+        entry = self._deep[index]
+        if entry is None or entry[0] != key:
+            entry = self._recent[index]
+            if entry is None or entry[0] != key:
+                return None
+        self.hits += 1
+        if entry[5] != self.generation:
+            self.reused_hits += 1
+        return entry
+
+    def store(self, key: int, depth: int, flag: int, score: float, move: Any) -> None:
+        index = key % self.num_buckets
+        entry = (key, depth, flag, score, move, self.generation)
+        deep = self._deep[index]
+        if deep is None or deep[0] == key or depth >= deep[1] or deep[5] != self.generation:
+            # The displaced deep entry still gets a second chance in the other slot
+            if deep is not None and deep[0] != key:
+                self._recent[index] = deep
+            self._deep[index] = entry
+        else:
+            self._recent[index] = entry
@@ -0,0 +1,260 @@
+import sys
+import threading
+from typing import Any, Dict, List, Optional, TextIO
+
+import chess
+
+import chess_game
+from background_search import BackgroundSearch, SearchResult
+from negamax import NegamaxSearch
+from tablebase import MATE_SCORE
+from transposition import TranspositionTable
+
+ENGINE_NAME = "chess-minimax"
+DEFAULT_HASH_MB = 64
+# Depth of a "go" without any limits, and the cap on every other search
+DEFAULT_DEPTH = 4
+MAX_DEPTH = 64
+# Moves assumed left in the game when the GUI only gives the remaining time
+DEFAULT_MOVES_TO_GO = 30
+# Seconds kept back per move for the GUI and the process
+MOVE_OVERHEAD = 0.05
+# Scores further than this from zero are mates, less the plies a tablebase still needs
+MATE_BOUND = MATE_SCORE / 2
+
+GO_INTEGER_OPTIONS = ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes")
+
+
+def parse_go(tokens: List[str]) -> Dict[str, Any]:
+    """Turn the arguments of a go command into a dict; flags such as infinite map to True."""
+    options: Dict[str, Any] = {}
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if token in GO_INTEGER_OPTIONS and index + 1 < len(tokens):
+            options[token] = int(tokens[index + 1])
+            index += 2
+        else:
+            options[token] = True
+            index += 1
+    return options
+
+
+def time_for_move(board: chess.Board, options: Dict[str, Any]) -> Optional[float]:
+    """Seconds to spend on this move, None to search until the depth is reached or stop."""
+    if "movetime" in options:
+        return max(0.01, options["movetime"] / 1000 - MOVE_OVERHEAD)
+    white = board.turn == chess.WHITE
+    remaining = options.get("wtime" if white else "btime")
+    if remaining is None:
+        return None
+    increment = options.get("winc" if white else "binc", 0)
+    moves_to_go = options.get("movestogo", DEFAULT_MOVES_TO_GO)
+    seconds = remaining / max(1, moves_to_go) + 0.75 * increment
+    # Never plan to use more than half of what is left on the clock
+    return max(0.01, min(seconds, remaining / 2) / 1000 - MOVE_OVERHEAD)
+
+
+def format_score(score: float, pv_length: int) -> str:
+    """UCI score of a search result from the side to move's point of view.
+
+    Mates found by the search score MATE_SCORE at the end of the principal
+    variation, and tablebase wins MATE_SCORE less their remaining distance.
+    """
+    if abs(score) < MATE_BOUND:
+        return f"cp {round(100 * score)}"
+    plies = pv_length + round(MATE_SCORE - abs(score))
+    moves = (plies + 1) // 2
+    return f"mate {moves if score > 0 else -moves}"
+
+
+class UCIEngine:
+    """UCI front end around the chess_game adapter that lives as long as the process.
+
+    The transposition table and move orderer are kept across position/go
+    cycles, and the principal variation of the last search seeds the next
+    one when the game followed it. Searches run in a BackgroundSearch worker
+    so commands keep being read, and stop takes effect at the next node.
+    """
+
+    def __init__(self, output: TextIO = sys.stdout, hash_mb: float = DEFAULT_HASH_MB):
+        self.output = output
+        self._output_lock = threading.Lock()
+        self.board = chess.Board()
+        self.move_orderer = chess_game.ChessMoveOrderer()
+        self.set_hash(hash_mb)
+        # Rest of the last principal variation, by Zobrist key of the position it starts from
+        self.pv_lines: Dict[int, List[chess.Move]] = {}
+        self.searching_board: Optional[chess.Board] = None
+        # Pondering and infinite searches hold their move back until ponderhit or stop
+        self.hold_result = False
+        self.held_result: Optional[SearchResult] = None
+        self._result_lock = threading.Lock()
+
+    def set_hash(self, megabytes: float) -> None:
+        self.table = TranspositionTable.from_megabytes(megabytes)
+        self.search = NegamaxSearch(chess_game.ChessAdapter(), self.table, self.move_orderer)
+        self.background = BackgroundSearch(self.search, on_result=self.finish_search)
+
+    def send(self, line: str) -> None:
+        with self._output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def handle(self, line: str) -> bool:
+        """Act on one command line; returns False once the engine should quit."""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+        try:
+            return self.dispatch(command, arguments)
+        except ValueError as error:
+            # Malformed arguments or an illegal move; the engine state is left as it was
+            self.send(f"info string error: {line}: {error}")
+            return True
+
+    def dispatch(self, command: str, arguments: List[str]) -> bool:
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send("id author chess-minimax")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max 4096")
+            self.send("option name Ponder type check default false")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.set_option(arguments)
+        elif command == "ucinewgame":
+            self.background.cancel()
+            self.table.clear()
+            self.move_orderer.clear()
+            self.pv_lines.clear()
+        elif command == "position":
+            self.set_position(arguments)
+        elif command == "go":
+            self.go(parse_go(arguments))
+        elif command == "stop":
+            self.stop()
+        elif command == "ponderhit":
+            self.ponder_hit()
+        elif command == "quit":
+            self.background.cancel()
+            return False
+        return True
+
+    def set_option(self, arguments: List[str]) -> None:
+        text = " ".join(arguments)
+        name, _, value = text.partition(" value ")
+        if name.replace("name", "", 1).strip().lower() == "hash":
+            megabytes = float(value)
+            self.background.cancel()
+            self.set_hash(megabytes)
+
+    def set_position(self, arguments: List[str]) -> None:
+        if not arguments:
+            return
+        if arguments[0] == "startpos":
+            board = chess.Board()
+            rest = arguments[1:]
+        elif arguments[0] == "fen":
+            fen_end = arguments.index("moves") if "moves" in arguments else len(arguments)
+            board = chess.Board(" ".join(arguments[1:fen_end]))
+            rest = arguments[fen_end:]
+        else:
+            return
+        if rest and rest[0] == "moves":
+            for uci_move in rest[1:]:
+                board.push_uci(uci_move)
+        self.board = board
+
+    def go(self, options: Dict[str, Any]) -> None:
+        board = self.board.copy()
+        if "depth" in options:
+            max_depth = min(options["depth"], MAX_DEPTH)
+        elif any(option in options for option in ("infinite", "movetime", "wtime", "btime", "nodes")):
+            max_depth = MAX_DEPTH
+        else:
+            max_depth = DEFAULT_DEPTH
+        self.background.cancel()
+        self.searching_board = board
+        self.hold_result = bool(options.get("ponder") or options.get("infinite"))
+        self.held_result = None
+        pv = self.pv_lines.get(chess_game.hash_key(board), [])
+        self.background.start(
+            board,
+            board.turn == chess.WHITE,
+            max_depth,
+            time_for_move(board, options),
+            ponder=bool(options.get("ponder")),
+            pv=pv,
+            node_limit=options.get("nodes"),
+        )
+
+    def finish_search(self, result: SearchResult) -> None:
+        # Called from the search thread
+        with self._result_lock:
+            if self.hold_result:
+                self.held_result = result
+                return
+        self.report(result)
+
+    def report(self, result: SearchResult) -> None:
+        board = self.searching_board
+        if result.error is not None:
+            self.send(f"info string search failed: {result.error}")
+        self.remember_pv(board, result.pv)
+        score = format_score(result.score * (1 if board.turn == chess.WHITE else -1), len(result.pv))
+        pv = " ".join(move.uci() for move in result.pv)
+        self.send(f"info depth {result.depth} score {score} nodes {result.nodes} pv {pv}")
+        if result.move is None:
+            self.send("bestmove 0000")
+        elif len(result.pv) > 1:
+            self.send(f"bestmove {result.move.uci()} ponder {result.pv[1].uci()}")
+        else:
+            self.send(f"bestmove {result.move.uci()}")
+
+    def remember_pv(self, board: chess.Board, pv: List[chess.Move]) -> None:
+        self.pv_lines.clear()
+        board = board.copy()
+        for index, move in enumerate(pv):
+            if not board.is_legal(move):
+                break
+            board.push(move)
+            if index + 1 < len(pv):
+                self.pv_lines[chess_game.hash_key(board)] = pv[index + 1:]
+
+    def stop(self) -> None:
+        self.release_result()
+        self.background.stop()
+        self.background.wait()
+
+    def ponder_hit(self) -> None:
+        self.background.ponder_hit()
+        self.release_result()
+
+    def release_result(self) -> None:
+        # From here on the search reports as soon as it is done, or now if it already is
+        with self._result_lock:
+            self.hold_result = False
+            result, self.held_result = self.held_result, None
+        if result is not None:
+            self.report(result)
+
+
+def main(input: TextIO = sys.stdin, output: TextIO = sys.stdout) -> None:
+    """Read UCI commands from input until quit or end of input.
+
+    The search runs in its own thread, so this loop is always free to read
+    the next command. At the end of input the running search is finished
+    rather than abandoned, which lets a script of commands drive the engine.
+    """
+    engine = UCIEngine(output)
+    for line in input:
+        if not engine.handle(line.strip()):
+            return
+    engine.background.wait()
+
+
+if __name__ == "__main__":
+    main()